@@ -0,0 +1,61 @@
+"""
+Benchmark: incident detection, legacy bucket rescan vs sliding window.
+
+Run from the repo root:
+    python -m benchmarks.bench_incident_detector
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import incident_detector
+from log_index import LogIndex
+from benchmarks.generators import make_api_logs
+
+
+def legacy_detect(logs, time_window_minutes=10, threshold=10):
+    """The original O(B^2)-per-error-code algorithm, kept for comparison."""
+    error_patterns = defaultdict(lambda: defaultdict(set))
+    for log in logs:
+        timestamp = datetime.fromisoformat(log["timestamp"].replace("Z", "+00:00"))
+        error_patterns[log["error_code"]][timestamp.replace(second=0, microsecond=0)].add(log["merchant_id"])
+
+    found = 0
+    for time_buckets in error_patterns.values():
+        for time_bucket, merchants in time_buckets.items():
+            if len(merchants) >= threshold:
+                window_end = time_bucket + timedelta(minutes=time_window_minutes)
+                merchants_in_window = set()
+                for tb, merch_set in time_buckets.items():
+                    if time_bucket <= tb <= window_end:
+                        merchants_in_window.update(merch_set)
+                if len(merchants_in_window) >= threshold:
+                    found += 1
+    return found
+
+
+def main():
+    print(f"{'logs':>10} {'legacy (s)':>11} {'sliding (s)':>12} {'incidents':>10}")
+    for n_logs in (100_000, 1_000_000, 3_000_000):
+        # A week of logs, every line at a random second
+        logs = make_api_logs(n_logs, n_merchants=5000, span_minutes=7 * 24 * 60)
+        index = LogIndex(logs)
+
+        # Legacy cost grows with buckets^2; skip it where it would take minutes
+        if n_logs <= 1_000_000:
+            start = time.perf_counter()
+            legacy_detect(logs)
+            legacy = time.perf_counter() - start
+        else:
+            legacy = float("nan")
+
+        start = time.perf_counter()
+        info = incident_detector.detect_patterns(index)
+        sliding = time.perf_counter() - start
+
+        print(f"{n_logs:>10} {legacy:>11.2f} {sliding:>12.2f} {len(info['incidents']):>10}")
+
+
+if __name__ == "__main__":
+    main()
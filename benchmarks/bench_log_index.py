@@ -0,0 +1,48 @@
+"""
+Benchmark: per-ticket merchant log lookup, linear scan vs LogIndex.
+
+Run from the repo root:
+    python -m benchmarks.bench_log_index
+"""
+
+import time
+
+from log_index import LogIndex
+from benchmarks.generators import make_api_logs, make_inbox
+
+
+def bench_scan(tickets, logs):
+    start = time.perf_counter()
+    for ticket in tickets:
+        merchant = ticket["merchant_id"]
+        merchant_logs = [l for l in logs if l["merchant_id"] == merchant]
+    return time.perf_counter() - start
+
+
+def bench_index(tickets, logs):
+    start = time.perf_counter()
+    index = LogIndex(logs)
+    for ticket in tickets:
+        merchant_logs = index.merchant_logs(ticket["merchant_id"])
+    return time.perf_counter() - start
+
+
+def main():
+    n_merchants = 1000
+    print(f"{'tickets':>8} {'logs':>10} {'scan (s)':>10} {'index (s)':>10} {'speedup':>8}")
+    for n_tickets in (10, 100, 1000):
+        for n_logs in (10_000, 100_000, 1_000_000):
+            logs = make_api_logs(n_logs, n_merchants, span_minutes=60)
+            tickets = make_inbox(n_tickets, n_merchants)
+            # Cap the quadratic case so the benchmark finishes in reasonable time
+            if n_tickets * n_logs > 10**8:
+                scan = float("nan")
+            else:
+                scan = bench_scan(tickets, logs)
+            index = bench_index(tickets, logs)
+            speedup = scan / index if index else float("inf")
+            print(f"{n_tickets:>8} {n_logs:>10} {scan:>10.3f} {index:>10.3f} {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
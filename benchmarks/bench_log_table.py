@@ -0,0 +1,56 @@
+"""
+Benchmark: memory and filter cost of list-of-dicts logs vs columnar LogTable.
+
+Run from the repo root:
+    python -m benchmarks.bench_log_table
+"""
+
+import json
+import time
+import tracemalloc
+
+from log_index import LogTable
+from benchmarks.generators import make_api_logs
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    n_logs = 1_000_000
+    # Round-trip through JSON so every dict owns its own strings, as after json.load
+    raw = json.dumps(make_api_logs(n_logs, n_merchants=1000, span_minutes=60))
+
+    logs, dict_bytes = measure(lambda: json.loads(raw))
+    table, table_bytes = measure(lambda: LogTable(logs))
+
+    print(f"rows:            {n_logs}")
+    print(f"list of dicts:   {dict_bytes / 1e6:8.1f} MB")
+    print(f"LogTable:        {table_bytes / 1e6:8.1f} MB ({dict_bytes / table_bytes:.1f}x smaller)")
+
+    start = time.perf_counter()
+    scanned = [i for i, l in enumerate(logs) if l["merchant_id"] == "M-7" and l["error_code"] >= 500]
+    scan = time.perf_counter() - start
+
+    # The per-merchant row index is built once, on first lookup
+    start = time.perf_counter()
+    table.merchant_rows("M-7")
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    selected = table.select(merchant_id="M-7", min_error_code=500)
+    select = time.perf_counter() - start
+    assert scanned == selected
+
+    print(f"dict filter:     {scan * 1000:8.1f} ms")
+    print(f"row index build: {build * 1000:8.1f} ms (once)")
+    print(f"LogTable.select: {select * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
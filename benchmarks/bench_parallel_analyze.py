@@ -0,0 +1,42 @@
+"""
+Benchmark: brain.analyze vs brain.analyze_parallel at increasing worker counts.
+
+Run without GEMINI_API_KEY so only the CPU-bound part of the stage is
+measured. Run from the repo root:
+    python -m benchmarks.bench_parallel_analyze
+"""
+
+import os
+import time
+
+from brain import analyze, analyze_parallel
+from confidence_calibrator import MemoryStore
+from log_index import LogIndex
+from benchmarks.generators import make_api_logs, make_inbox
+
+
+def main():
+    n_merchants = 2000
+    logs = make_api_logs(1_000_000, n_merchants, span_minutes=60)
+    tickets = make_inbox(5000, n_merchants)
+    index = LogIndex(logs)
+    store = MemoryStore()
+
+    start = time.perf_counter()
+    analyze(tickets, index, "", memory_store=store)
+    serial = time.perf_counter() - start
+
+    print(f"{len(tickets)} tickets, {len(logs)} logs, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'time (s)':>9} {'speedup':>8}")
+    print(f"{'serial':>8} {serial:>9.2f} {1.0:>7.1f}x")
+    for workers in (2, 4, 8, 16, 32):
+        if workers > 2 * (os.cpu_count() or 1):
+            break
+        start = time.perf_counter()
+        analyze_parallel(tickets, index, "", workers=workers, memory_store=store)
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>8} {elapsed:>9.2f} {serial / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Benchmark: the full observe -> analyze -> decide -> execute pipeline and
+each of its stages, on synthetic data at increasing scale.
+
+Inputs come from benchmarks.generators (fixed seeds), the LLM is a
+StubBackend with no response cache, and memory is an in-memory
+MemoryStore, so nothing touches the network or the repo's data files.
+Every scale runs in its own forked process so its peak RSS is its own.
+
+analyze runs with a RoutingPolicy that sends every ticket to the LLM,
+the worst case: at these volumes the background errors alone cross the
+detector's 10-merchant threshold, and most merchants have a decisive rule
+match, so the default policy would skip the LLM for nearly all of them.
+
+Run from the repo root:
+    python -m benchmarks.bench_pipeline                      # small + medium
+    python -m benchmarks.bench_pipeline --scales small,medium,large
+    python -m benchmarks.bench_pipeline --save               # store a baseline
+    python -m benchmarks.bench_pipeline --compare benchmarks/baselines/<commit>.json
+
+Baselines are JSON files keyed by git commit; --compare exits non-zero
+when a stage is slower than the baseline by more than --tolerance.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from contextlib import redirect_stdout
+from pathlib import Path
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+import brain
+import confidence_calibrator
+import incident_detector
+import llm_reasoner
+import routing_policy
+from action import execute
+from decision_engine import decide
+from llm_backends import StubBackend
+from log_index import LogTable
+from observer import iter_logs
+from rule_engine import RuleEngine
+from benchmarks.generators import make_api_logs, make_burst, make_inbox, make_memory
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+DOCS_FILE = Path(".") / "docs" / "headless_guide.md"
+
+# tickets, merchants, ordinary log lines and memory actions per scale
+SCALES = {
+    "small": {"tickets": 100, "merchants": 500, "logs": 20_000, "memory": 1_000},
+    "medium": {"tickets": 1_000, "merchants": 5_000, "logs": 200_000, "memory": 10_000},
+    "large": {"tickets": 5_000, "merchants": 20_000, "logs": 1_000_000, "memory": 50_000},
+}
+
+STUB_RESPONSE = {
+    "hypotheses": [
+        {"cause": "Merchant missing X-SDK-Version header", "evidence": "401 Missing Header", "confidence": 0.8},
+        {"cause": "Possible platform instability", "evidence": "5xx errors", "confidence": 0.3},
+    ],
+    "selected_cause": "Merchant missing X-SDK-Version header",
+    "confidence": 0.8,
+    "reasoning_chain": ["Step 1: Stubbed reasoning"],
+    "evidence_logs": ["Missing Header: X-SDK-Version"],
+    "evidence_docs": ["Rule #1"],
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_rss_mb():
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def worst_case_policy():
+    """Route every ticket to the LLM, whatever the rules or incidents say."""
+    return routing_policy.RoutingPolicy(skip_confidence=float("inf"), skip_platform_incidents=False)
+
+
+def best_of(repeat, func):
+    """Fastest of `repeat` calls, with the last call's return value."""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_scale(sizes, repeat, llm_latency):
+    """Time every stage for one scale; runs inside its own process."""
+    logs = make_api_logs(sizes["logs"], sizes["merchants"], bursts=[
+        make_burst(500, "Internal Server Error", start_minute=600, merchants=max(20, sizes["merchants"] // 50)),
+    ])
+    tickets = make_inbox(sizes["tickets"], sizes["merchants"])
+    memory = make_memory(sizes["memory"], sizes["merchants"])
+    with open(DOCS_FILE, "r") as f:
+        rules_text = f.read()
+
+    def respond(prompt):
+        if llm_latency:
+            time.sleep(llm_latency)
+        return STUB_RESPONSE
+
+    reasoner = llm_reasoner.Reasoner(StubBackend(respond), use_cache=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logs_path = Path(tmp) / "api_activity.ndjson"
+        with open(logs_path, "w") as f:
+            for log in logs:
+                f.write(json.dumps(log) + "\n")
+        del logs
+
+        stages = {}
+
+        def record(stage, seconds, items):
+            stages[stage] = {"seconds": seconds, "items": items, "per_second": items / seconds if seconds else 0.0}
+
+        n_logs, n_tickets = sizes["logs"], sizes["tickets"]
+
+        seconds, table = best_of(repeat, lambda: LogTable(iter_logs(logs_path)))
+        n_logs = len(table)
+        record("load_logs", seconds, n_logs)
+
+        seconds, store = best_of(repeat, lambda: confidence_calibrator.MemoryStore(memory))
+        record("load_memory", seconds, sizes["memory"])
+
+        seconds, incident_info = best_of(repeat, lambda: incident_detector.detect_patterns(table))
+        record("detect_patterns", seconds, n_logs)
+
+        rule_engine = RuleEngine()
+        seconds, _ = best_of(repeat, lambda: rule_engine.evaluate(table))
+        record("rule_engine", seconds, n_logs)
+
+        logs_by_merchant = {t["merchant_id"]: table.merchant_logs(t["merchant_id"]) for t in tickets}
+        seconds, _ = best_of(repeat, lambda: reasoner.reason_many(tickets, logs_by_merchant, rules_text))
+        record("llm_reason", seconds, n_tickets)
+
+        seconds, _ = best_of(repeat, lambda: [
+            confidence_calibrator.adjust_confidence(t["merchant_id"], STUB_RESPONSE["selected_cause"], 0.8,
+                                                    store=store)
+            for t in tickets
+        ])
+        record("calibrate", seconds, n_tickets)
+
+        def analyze():
+            return brain.analyze(tickets, table, rules_text, memory_store=store, rule_engine=rule_engine,
+                                 reasoner=reasoner, policy=worst_case_policy())
+
+        seconds, findings = best_of(repeat, analyze)
+        record("analyze", seconds, n_tickets)
+
+        seconds, decisions = best_of(repeat, lambda: decide(findings))
+        record("decide", seconds, n_tickets)
+
+        def quiet_execute():
+            with redirect_stdout(io.StringIO()):
+                execute(decisions)
+
+        seconds, _ = best_of(repeat, quiet_execute)
+        record("execute", seconds, n_tickets)
+
+        def full():
+            full_table = LogTable(iter_logs(logs_path))
+            full_store = confidence_calibrator.MemoryStore(memory)
+            full_findings = brain.analyze(tickets, full_table, rules_text, memory_store=full_store,
+                                          reasoner=reasoner, policy=worst_case_policy())
+            with redirect_stdout(io.StringIO()):
+                execute(decide(full_findings))
+
+        seconds, _ = best_of(repeat, full)
+        record("full_pipeline", seconds, n_tickets)
+
+    policy = worst_case_policy()
+    brain.analyze(tickets, table, rules_text, memory_store=store, reasoner=reasoner, policy=policy)
+    return {
+        "sizes": dict(sizes, log_lines=n_logs),
+        "stages": stages,
+        "llm_calls": policy.stats()["llm_calls"],
+        "incident_type": incident_info["incident_type"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _child(conn, sizes, repeat, llm_latency):
+    try:
+        conn.send(run_scale(sizes, repeat, llm_latency))
+    except Exception as e:
+        conn.send({"error": repr(e)})
+    finally:
+        conn.close()
+
+
+def run_isolated(sizes, repeat, llm_latency):
+    """run_scale in a fresh forked process (in-process where fork is unavailable)."""
+    try:
+        context = multiprocessing.get_context("fork")
+    except ValueError:
+        return run_scale(sizes, repeat, llm_latency)
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(child, sizes, repeat, llm_latency))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+
+def print_scale(name, result):
+    sizes = result["sizes"]
+    rss = result["peak_rss_mb"]
+    print(f"\n[{name}] {sizes['tickets']} tickets, {sizes['merchants']} merchants, "
+          f"{sizes['log_lines']} log lines, {sizes['memory']} memory actions; "
+          f"{result['llm_calls']} LLM calls; peak RSS {f'{rss:.0f} MB' if rss is not None else 'n/a'}")
+    print(f"{'stage':>16} {'time (s)':>10} {'items':>9} {'items/s':>12}")
+    for stage, s in result["stages"].items():
+        print(f"{stage:>16} {s['seconds']:>10.4f} {s['items']:>9} {s['per_second']:>12.0f}")
+
+
+def print_scaling(results):
+    """Seconds per ticket for the full pipeline; flat means linear scaling."""
+    names = list(results)
+    if len(names) < 2:
+        return
+    base = results[names[0]]["stages"]["full_pipeline"]
+    base_per_ticket = base["seconds"] / base["items"]
+    print(f"\n{'scale':>8} {'tickets':>8} {'full (s)':>9} {'ms/ticket':>10} {'vs ' + names[0]:>10}")
+    for name in names:
+        full = results[name]["stages"]["full_pipeline"]
+        per_ticket = full["seconds"] / full["items"]
+        print(f"{name:>8} {full['items']:>8} {full['seconds']:>9.3f} {per_ticket * 1000:>10.3f} "
+              f"{per_ticket / base_per_ticket:>9.2f}x")
+
+
+def compare(results, baseline, tolerance):
+    """Print per-stage ratios against a baseline; returns the regressed (scale, stage) pairs."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit', '?')} (tolerance {tolerance:.0%}):")
+    print(f"{'scale':>8} {'stage':>16} {'baseline (s)':>13} {'now (s)':>10} {'ratio':>7}")
+    for name, result in results.items():
+        old = baseline.get("scales", {}).get(name)
+        if old is None:
+            continue
+        for stage, s in result["stages"].items():
+            if stage not in old["stages"]:
+                continue
+            ratio = s["seconds"] / old["stages"][stage]["seconds"] if old["stages"][stage]["seconds"] else 1.0
+            flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+            if flag:
+                regressions.append((name, stage))
+            print(f"{name:>8} {stage:>16} {old['stages'][stage]['seconds']:>13.4f} {s['seconds']:>10.4f} "
+                  f"{ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline benchmark on synthetic data")
+    parser.add_argument("--scales", default="small,medium", help=f"comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is kept")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds per stub LLM call")
+    parser.add_argument("--save", nargs="?", const="", default=None,
+                        help="write results as a baseline (default benchmarks/baselines/<commit>.json)")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a stage regresses")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scales.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(unknown)}")
+
+    commit = git_commit()
+    print(f"commit {commit}, Python {platform.python_version()}, {os.cpu_count()} CPUs")
+    results = {}
+    for name in names:
+        results[name] = run_isolated(SCALES[name], args.repeat, args.llm_latency)
+        print_scale(name, results[name])
+    print_scaling(results)
+
+    report = {
+        "commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "llm_latency": args.llm_latency,
+        "scales": results,
+    }
+    if args.save is not None:
+        path = Path(args.save) if args.save else BASELINE_DIR / f"{commit}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {path}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
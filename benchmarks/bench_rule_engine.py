@@ -0,0 +1,52 @@
+"""
+Benchmark: per-log if/elif rule chain vs RuleEngine single sweep.
+
+Run from the repo root:
+    python -m benchmarks.bench_rule_engine
+"""
+
+import time
+
+from log_index import LogIndex, LogTable
+from rule_engine import RuleEngine
+from benchmarks.generators import make_api_logs
+
+
+def legacy_rules(merchant_logs):
+    cause = "Unknown"
+    for log in merchant_logs:
+        if "X-SDK-Version" in log["message"]:
+            cause = "Merchant missing X-SDK-Version header"
+        elif "webhook" in log["message"].lower() or "secret" in log["message"].lower():
+            cause = "Merchant using wrong webhook secret (should be B)"
+        elif log["error_code"] >= 500:
+            cause = "Possible platform instability"
+    return cause
+
+
+def main():
+    n_merchants = 1000
+    print(f"{'logs':>10} {'if/elif (s)':>12} {'engine (s)':>11} {'engine on LogTable (s)':>23}")
+    for n_logs in (100_000, 1_000_000):
+        logs = make_api_logs(n_logs, n_merchants, span_minutes=60)
+        index = LogIndex(logs)
+        table = LogTable(logs)
+
+        start = time.perf_counter()
+        for merchant_id in index.merchants():
+            legacy_rules(index.merchant_logs(merchant_id))
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        RuleEngine().evaluate(index)
+        engine = time.perf_counter() - start
+
+        start = time.perf_counter()
+        RuleEngine().evaluate(table)
+        columnar = time.perf_counter() - start
+
+        print(f"{n_logs:>10} {legacy:>12.2f} {engine:>11.2f} {columnar:>23.2f}")
+
+
+if __name__ == "__main__":
+    main()
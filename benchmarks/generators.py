@@ -0,0 +1,138 @@
+"""
+Deterministic synthetic inputs at production scale: inbox tickets, API
+logs and memory.json histories. The same arguments and seed always give
+the same data, so benchmark runs on different commits are comparable.
+
+    from benchmarks.generators import make_api_logs, make_inbox, make_memory
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+START = datetime(2026, 2, 1)
+
+# (error_code, message) -> relative weight of background errors; like
+# api_activity.json, the logs only carry failed calls
+DEFAULT_ERROR_MIX = {
+    (401, "Missing Header: X-SDK-Version"): 12,
+    (401, "Invalid webhook secret"): 10,
+    (429, "Rate limit exceeded"): 10,
+    (500, "Internal Server Error"): 8,
+    (502, "Bad Gateway"): 5,
+    (404, "Order not found"): 5,
+}
+
+TICKET_TEMPLATES = [
+    ("Checkout Broken", "We migrated to headless today and now clicking Pay Now does nothing."),
+    ("Webhooks Not Working", "After switching to headless none of our order webhooks are firing."),
+    ("Random 500 Errors", "Our storefront intermittently fails with server errors since the migration."),
+    ("Orders Missing", "Orders placed on the new storefront are not showing up in the admin."),
+    ("Rate Limited", "We keep getting told to slow down even with low traffic."),
+]
+
+# Causes as the rule table and LLM produce them, with the actions decide() proposes
+MEMORY_CAUSES = [
+    ("Merchant missing X-SDK-Version header", "Send setup instructions to merchant"),
+    ("Merchant using wrong webhook secret (should be B)", "Send webhook secret fix guide (REQUIRES APPROVAL)"),
+    ("Possible platform instability", "Escalate to engineering for investigation"),
+    ("Unknown issue", "Request more information from merchant"),
+]
+
+
+def merchant_id(i: int) -> str:
+    return f"M-{i}"
+
+
+def make_burst(error_code: int, message: str, start_minute: int, merchants: int,
+               minutes: int = 5, lines_per_merchant: int = 3) -> Dict:
+    """A platform incident: `merchants` distinct merchants hit the same error within `minutes`."""
+    return {"error_code": error_code, "message": message, "start_minute": start_minute,
+            "minutes": minutes, "merchants": merchants, "lines_per_merchant": lines_per_merchant}
+
+
+def make_api_logs(n_logs: int, n_merchants: int, span_minutes: int = 24 * 60,
+                  error_mix: Optional[Dict[Tuple[int, str], float]] = None,
+                  bursts: Sequence[Dict] = (), seed: int = 0) -> List[Dict]:
+    """
+    API activity logs in api_activity.json shape, sorted by timestamp.
+
+    Args:
+        n_logs: Background error lines, spread uniformly over `span_minutes`
+        n_merchants: Distinct merchants (M-0 .. M-{n-1}); traffic is skewed
+            so a few merchants are much noisier than the rest
+        span_minutes: Time covered, starting at 2026-02-01T00:00:00
+        error_mix: (error_code, message) -> weight (DEFAULT_ERROR_MIX)
+        bursts: Incident bursts from make_burst(), added on top of n_logs
+        seed: Random seed
+
+    Returns:
+        List of {merchant_id, timestamp, error_code, message} dicts
+    """
+    rng = random.Random(seed)
+    mix = error_mix or DEFAULT_ERROR_MIX
+    kinds, weights = list(mix), list(mix.values())
+
+    # Zipf-like skew: a merchant's traffic weight falls off with its rank
+    merchant_weights = [1.0 / (rank + 1) ** 0.8 for rank in range(n_merchants)]
+    merchants = rng.choices(range(n_merchants), weights=merchant_weights, k=n_logs)
+    codes = rng.choices(kinds, weights=weights, k=n_logs)
+
+    rows = []
+    for m, (error_code, message) in zip(merchants, codes):
+        rows.append((rng.randrange(span_minutes * 60), m, error_code, message))
+
+    for burst in bursts:
+        hit = rng.sample(range(n_merchants), min(burst["merchants"], n_merchants))
+        for m in hit:
+            for _ in range(burst.get("lines_per_merchant", 1)):
+                second = (burst["start_minute"] * 60) + rng.randrange(burst.get("minutes", 5) * 60)
+                rows.append((second, m, burst["error_code"], burst["message"]))
+
+    rows.sort(key=lambda row: row[0])
+    return [
+        {
+            "merchant_id": merchant_id(m),
+            "timestamp": (START + timedelta(seconds=second)).isoformat(),
+            "error_code": error_code,
+            "message": message,
+        }
+        for second, m, error_code, message in rows
+    ]
+
+
+def make_inbox(n_tickets: int, n_merchants: int, seed: int = 1) -> List[Dict]:
+    """Inbox tickets ({merchant_id, subject, message}) from distinct merchants where possible."""
+    rng = random.Random(seed)
+    if n_tickets <= n_merchants:
+        ids = rng.sample(range(n_merchants), n_tickets)
+    else:
+        ids = [rng.randrange(n_merchants) for _ in range(n_tickets)]
+    tickets = []
+    for m in ids:
+        subject, message = rng.choice(TICKET_TEMPLATES)
+        tickets.append({"merchant_id": merchant_id(m), "subject": subject, "message": message})
+    return tickets
+
+
+def make_memory(n_actions: int, n_merchants: int, success_rate: float = 0.7, seed: int = 2) -> Dict:
+    """
+    A memory.json history of `n_actions` recorded outcomes, oldest first,
+    one every few minutes over the weeks before the logs start.
+    """
+    rng = random.Random(seed)
+    start = START - timedelta(minutes=5 * n_actions)
+    actions = []
+    for i in range(n_actions):
+        cause, action = rng.choice(MEMORY_CAUSES)
+        confidence = round(rng.uniform(0.5, 0.95), 2)
+        actions.append({
+            "timestamp": (start + timedelta(minutes=5 * i)).isoformat(),
+            "merchant_id": merchant_id(rng.randrange(n_merchants)),
+            "cause": cause,
+            "action": action,
+            "outcome": "success" if rng.random() < success_rate else "failure",
+            "confidence_before": confidence,
+            "confidence_after": confidence,
+        })
+    return {"actions": actions}
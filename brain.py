@@ -1,115 +1,328 @@
+import os
 import json
+import multiprocessing
 import llm_reasoner
 import incident_detector
 import confidence_calibrator
+import routing_policy
+import metrics
+from log_index import LogIndex, ensure_index
+from rule_engine import get_rule_engine
 
-def analyze(tickets, logs, rules_text):
+def analyze(tickets, logs, rules_text, memory_store=None, rule_engine=None,
+            llm_concurrency=llm_reasoner.DEFAULT_CONCURRENCY,
+            llm_timeout=llm_reasoner.DEFAULT_TIMEOUT_SECONDS, reasoner=None, llm_batch_size=None,
+            policy=None, incident_info=None):
     """
     Enhanced analysis with dual intelligence: rule-based + LLM reasoning.
     Includes cross-merchant incident detection and memory-weighted confidence.
+
+    `logs` may be a plain list, a prebuilt LogIndex or a LogTable; a list is
+    indexed once up front so each ticket only touches its own merchant's logs.
+    Memory is likewise loaded once into a MemoryStore shared by every ticket,
+    the deterministic rules are evaluated over all logs in one sweep, and LLM
+    calls run concurrently (at most `llm_concurrency` in flight; a call still
+    running `llm_timeout` seconds after it started is abandoned in favor of
+    the rule-based result, without holding up the calls queued behind it)
+    through `reasoner`, the process-wide llm_reasoner.Reasoner by default.
+    With `llm_batch_size` > 1 (or KAVACH_LLM_BATCH_SIZE), tickets whose
+    merchants share an error signature share one prompt of up to that many
+    tickets.
+
+    Before any LLM call, `policy` (the process-wide
+    routing_policy.RoutingPolicy by default) routes tickets with a decisive
+    rule match or a PLATFORM-WIDE incident straight to the rule-based
+    result; only the rest are sent to the LLM.
+
+    `incident_info` lets a caller that already ran
+    incident_detector.detect_patterns over all logs (see analyze_parallel)
+    skip the cross-merchant pass.
+    """
+    plan = plan_analysis(tickets, logs, memory_store=memory_store, rule_engine=rule_engine,
+                         reasoner=reasoner, policy=policy, incident_info=incident_info)
+    
+    # LLM calls for the routed tickets, fanned out over a bounded pool
+    llm_indexes = [i for i, route in enumerate(plan["routes"]) if route == routing_policy.ROUTE_LLM]
+    llm_results = [None] * len(tickets)
+    routed_results = plan["reasoner"].reason_many(
+        [tickets[i] for i in llm_indexes], plan["logs_by_merchant"], rules_text,
+        max_concurrency=llm_concurrency, timeout=llm_timeout, batch_size=llm_batch_size
+    )
+    for i, llm_result in zip(llm_indexes, routed_results):
+        llm_results[i] = llm_result
+    
+    return [build_finding(plan, i, llm_result) for i, llm_result in enumerate(llm_results)]
+
+
+def plan_analysis(tickets, logs, memory_store=None, rule_engine=None, reasoner=None, policy=None,
+                  incident_info=None):
+    """
+    Everything analyze() computes before the LLM stage, for a whole batch:
+    the log index, cross-merchant incidents, rule results, platform
+    membership and LLM route per ticket. Pass the plan to build_finding()
+    with each ticket's LLM result (or None) to get its finding.
     """
-    findings = []
+    log_index = ensure_index(logs)
+    if memory_store is None:
+        memory_store = confidence_calibrator.open_memory_store()
     
     # First, detect cross-merchant patterns
-    incident_info = incident_detector.detect_patterns(logs)
+    if incident_info is None:
+        incident_info = incident_detector.detect_patterns(log_index)
+    
+    # Deterministic rule matches for every merchant, in one batched pass
+    if rule_engine is None:
+        rule_engine = get_rule_engine()
+    rule_results = rule_engine.evaluate(log_index)
+    
+    rule_by_ticket = [rule_results.get(t["merchant_id"]) or rule_engine.no_match() for t in tickets]
+    platform_by_ticket = [incident_detector.check_merchant_in_incident(t["merchant_id"], incident_info)
+                          for t in tickets]
+    
+    # Only tickets the rules can't settle on their own are worth an LLM call
+    if reasoner is None:
+        reasoner = llm_reasoner.get_reasoner()
+    if policy is None:
+        policy = routing_policy.get_routing_policy()
+    routes = [routing_policy.ROUTE_LLM_UNAVAILABLE] * len(tickets)
+    if reasoner.available:
+        # A POTENTIAL-PLATFORM-ISSUE is not established enough to skip the LLM
+        platform_wide = incident_info["incident_type"] == "PLATFORM-WIDE"
+        routes = [policy.route(rule_result, platform_wide and is_platform)
+                  for rule_result, is_platform in zip(rule_by_ticket, platform_by_ticket)]
     
-    for ticket in tickets:
-        merchant = ticket["merchant_id"]
-        issue = ticket["subject"]
-        message = ticket["message"]
-
-        merchant_logs = [l for l in logs if l["merchant_id"] == merchant]
-
-        # === RULE-BASED REASONING (Deterministic) ===
-        rule_based_cause = "Unknown"
-        rule_based_confidence = 0.3
-        evidence_logs = []
-        evidence_docs = []
-
-        for log in merchant_logs:
-            if "X-SDK-Version" in log["message"]:
-                rule_based_cause = "Merchant missing X-SDK-Version header"
-                rule_based_confidence = 0.95
-                evidence_logs.append(log["message"])
-                evidence_docs.append("Rule #1: All checkout API requests must include X-SDK-Version header")
-
-            elif "webhook" in log["message"].lower() or "secret" in log["message"].lower():
-                rule_based_cause = "Merchant using wrong webhook secret (should be B)"
-                rule_based_confidence = 0.9
-                evidence_logs.append(log["message"])
-                evidence_docs.append("Rule #2: Headless webhooks use Secret Key B (not A)")
-
-            elif log["error_code"] >= 500:
-                rule_based_cause = "Possible platform instability"
-                rule_based_confidence = 0.6
-                evidence_logs.append(f"Error {log['error_code']}: {log['message']}")
-                evidence_docs.append("Rule #4: Headless API has stricter rate limits, 500 errors may indicate platform issues")
-
-        # === LLM REASONING (Probabilistic) ===
-        llm_result = llm_reasoner.reason(ticket, merchant_logs, rules_text)
+    return {
+        "tickets": tickets,
+        "memory_store": memory_store,
+        "incident_info": incident_info,
+        "rule_by_ticket": rule_by_ticket,
+        "platform_by_ticket": platform_by_ticket,
+        "routes": routes,
+        "logs_by_merchant": {t["merchant_id"]: log_index.merchant_logs(t["merchant_id"]) for t in tickets},
+        "reasoner": reasoner,
+        "policy": policy
+    }
+
+
+def build_finding(plan, i, llm_result):
+    """Merge rule-based and LLM reasoning for ticket `i` of a plan, then calibrate against memory."""
+    ticket = plan["tickets"][i]
+    rule_result = plan["rule_by_ticket"][i]
+    is_platform_incident = plan["platform_by_ticket"][i]
+    route = plan["routes"][i]
+    incident_info = plan["incident_info"]
+    memory_store = plan["memory_store"]
+    policy = plan["policy"]
+
+    merchant = ticket["merchant_id"]
+    issue = ticket["subject"]
+    message = ticket["message"]
+
+    merchant_logs = plan["logs_by_merchant"][merchant]
+
+    # === RULE-BASED REASONING (Deterministic) ===
+    rule_based_cause = rule_result["cause"]
+    rule_based_confidence = rule_result["confidence"]
+    evidence_logs = list(rule_result["evidence_logs"])
+    evidence_docs = list(rule_result["evidence_docs"])
+
+    # === LLM REASONING (Probabilistic) ===
+    # Merge rule-based and LLM reasoning
+    if llm_result:
+        # LLM provided additional insights
+        suspected_cause = llm_result["selected_cause"]
+        base_confidence = llm_result["confidence"]
+        reasoning_chain = llm_result["reasoning_chain"]
         
-        # Merge rule-based and LLM reasoning
-        if llm_result:
-            # LLM provided additional insights
-            suspected_cause = llm_result["selected_cause"]
-            base_confidence = llm_result["confidence"]
-            reasoning_chain = llm_result["reasoning_chain"]
-            
-            # Merge evidence
-            evidence_logs.extend(llm_result.get("evidence_logs", []))
-            evidence_docs.extend(llm_result.get("evidence_docs", []))
-            
-            # Add LLM hypotheses to reasoning
-            llm_hypotheses = llm_result.get("hypotheses", [])
-        else:
-            # Fall back to rule-based reasoning
-            suspected_cause = rule_based_cause
-            base_confidence = rule_based_confidence
-            reasoning_chain = [
-                "Step 1: Analyzed logs using deterministic rules",
-                f"Step 2: Matched pattern: {rule_based_cause}",
-                f"Step 3: Confidence based on rule certainty: {rule_based_confidence}"
-            ]
-            llm_hypotheses = []
-
-        # === MEMORY-WEIGHTED CONFIDENCE CALIBRATION ===
-        calibration = confidence_calibrator.adjust_confidence(
-            merchant, 
-            suspected_cause, 
-            base_confidence
-        )
+        # Merge evidence
+        evidence_logs.extend(llm_result.get("evidence_logs", []))
+        evidence_docs.extend(llm_result.get("evidence_docs", []))
         
-        final_confidence = calibration["adjusted_confidence"]
-        memory_evidence = calibration.get("memory_evidence", [])
+        # Add LLM hypotheses to reasoning
+        llm_hypotheses = llm_result.get("hypotheses", [])
+    else:
+        # Fall back to rule-based reasoning
+        suspected_cause = rule_based_cause
+        base_confidence = rule_based_confidence
+        reasoning_chain = [
+            "Step 1: Analyzed logs using deterministic rules",
+            f"Step 2: Matched pattern: {rule_based_cause}",
+            f"Step 3: Confidence based on rule certainty: {rule_based_confidence}"
+        ]
+        if route in (routing_policy.ROUTE_RULE_CONFIDENT, routing_policy.ROUTE_PLATFORM_INCIDENT):
+            reasoning_chain.append(f"Step 4: {policy.explain(route, rule_result)}")
+        llm_hypotheses = []
+
+    # === MEMORY-WEIGHTED CONFIDENCE CALIBRATION ===
+    calibration = confidence_calibrator.adjust_confidence(
+        merchant, 
+        suspected_cause, 
+        base_confidence,
+        store=memory_store
+    )
+    
+    final_confidence = calibration["adjusted_confidence"]
+    memory_evidence = calibration.get("memory_evidence", [])
+    
+    return {
+        "merchant_id": merchant,
+        "ticket": issue,
+        "suspected_cause": suspected_cause,
+        "confidence": final_confidence,
+        "confidence_before_calibration": base_confidence,
+        "confidence_adjustment": calibration["adjustment"],
+        "confidence_adjustment_reason": calibration["reason"],
+        "log_count": len(merchant_logs),
         
-        # === CHECK IF MERCHANT IS IN PLATFORM-WIDE INCIDENT ===
-        is_platform_incident = incident_detector.check_merchant_in_incident(merchant, incident_info)
+        # Explainability
+        "evidence_logs": list(set(evidence_logs)),  # Remove duplicates
+        "evidence_docs": list(set(evidence_docs)),
+        "evidence_memory": memory_evidence,
+        "reasoning_chain": reasoning_chain,
+        "llm_hypotheses": llm_hypotheses,
+        "rule_hits": rule_result["rule_hits"],
+        "llm_route": route,
         
-        findings.append({
-            "merchant_id": merchant,
-            "ticket": issue,
-            "suspected_cause": suspected_cause,
-            "confidence": final_confidence,
-            "confidence_before_calibration": base_confidence,
-            "confidence_adjustment": calibration["adjustment"],
-            "confidence_adjustment_reason": calibration["reason"],
-            "log_count": len(merchant_logs),
-            
-            # Explainability
-            "evidence_logs": list(set(evidence_logs)),  # Remove duplicates
-            "evidence_docs": list(set(evidence_docs)),
-            "evidence_memory": memory_evidence,
-            "reasoning_chain": reasoning_chain,
-            "llm_hypotheses": llm_hypotheses,
-            
-            # Incident detection
-            "incident_type": incident_info["incident_type"] if is_platform_incident else "MERCHANT-SPECIFIC",
-            "is_platform_incident": is_platform_incident,
-            "platform_incident_info": incident_info if is_platform_incident else None,
-            
-            # Safety flags
-            "should_escalate_early": calibration["should_escalate_early"],
-            "should_block_auto_fix": incident_info["should_block_auto_fix"] if is_platform_incident else False
-        })
+        # Incident detection
+        "incident_type": incident_info["incident_type"] if is_platform_incident else "MERCHANT-SPECIFIC",
+        "is_platform_incident": is_platform_incident,
+        "platform_incident_info": incident_info if is_platform_incident else None,
+        
+        # Safety flags
+        "should_escalate_early": calibration["should_escalate_early"],
+        "should_block_auto_fix": incident_info["should_block_auto_fix"] if is_platform_incident else False
+    }
+
+
+def recalibrate(finding, memory_store=None):
+    """
+    Re-apply memory-weighted calibration to an existing finding in place.
+
+    Only the calibration-derived fields change; the diagnosis (cause, base
+    confidence, evidence from logs and docs, reasoning) is kept, so a
+    memory update never costs another LLM call.
+    """
+    calibration = confidence_calibrator.adjust_confidence(
+        finding["merchant_id"],
+        finding["suspected_cause"],
+        finding["confidence_before_calibration"],
+        store=memory_store
+    )
+    finding.update({
+        "confidence": calibration["adjusted_confidence"],
+        "confidence_adjustment": calibration["adjustment"],
+        "confidence_adjustment_reason": calibration["reason"],
+        "evidence_memory": calibration.get("memory_evidence", []),
+        "should_escalate_early": calibration["should_escalate_early"]
+    })
+    return finding
+
+
+# Read-only state for analyze_parallel workers, inherited through fork
+_shard_state = None
+
+def _init_shard_worker():
+    # LLM client and cache connections must not be shared with the parent
+    llm_reasoner.reset_after_fork()
+    # So must a caller-supplied Reasoner; this child's copy of the state gets its own
+    reasoner = _shard_state["analyze_kwargs"].get("reasoner")
+    if reasoner is not None:
+        _shard_state["analyze_kwargs"]["reasoner"] = reasoner.reopen()
+    # Samples inherited from the parent would be counted twice
+    metrics.get_metrics().reset()
+
+
+def _analyze_shard(shard):
+    state = _shard_state
+    merchants = dict.fromkeys(state["tickets"][i]["merchant_id"] for i in shard)
+    shard_logs = LogIndex([log for m in merchants for log in state["log_index"].merchant_logs(m)])
+    findings = analyze([state["tickets"][i] for i in shard], shard_logs, state["rules_text"],
+                       incident_info=state["incident_info"], **state["analyze_kwargs"])
+    return list(zip(shard, findings)), metrics.get_metrics().drain()
+
+
+def shard_by_merchant(tickets, log_index, shards):
+    """
+    Split ticket indexes into at most `shards` groups, keeping each
+    merchant's tickets together. Merchants are placed largest-first (by log
+    and ticket count) on the lightest shard so work is evenly balanced.
+    """
+    by_merchant = {}
+    for i, ticket in enumerate(tickets):
+        by_merchant.setdefault(ticket["merchant_id"], []).append(i)
+
+    weights = {m: len(log_index.merchant_logs(m)) + len(idx) for m, idx in by_merchant.items()}
+    groups = [[] for _ in range(max(1, min(shards, len(by_merchant))))]
+    loads = [0] * len(groups)
+    for merchant in sorted(by_merchant, key=weights.get, reverse=True):
+        lightest = loads.index(min(loads))
+        groups[lightest].extend(by_merchant[merchant])
+        loads[lightest] += weights[merchant]
+    return [sorted(group) for group in groups if group]
+
+
+def analyze_parallel(tickets, logs, rules_text, workers=None, memory_store=None, policy=None,
+                     incident_info=None, **analyze_kwargs):
+    """
+    analyze() sharded by merchant across a fork-based process pool.
+
+    Cross-merchant incident detection runs once in the parent; each worker
+    then evaluates the rules over its own merchants' logs only, calibrates
+    against a read-only memory snapshot and consults the LLM (the
+    process-wide or passed-in Reasoner is reopened in each worker after the
+    fork, with its own client and cache connection). The log index and memory snapshot are
+    inherited through fork rather than pickled. Findings are returned in
+    the original ticket order and route counts are merged into `policy`.
+
+    `workers` defaults to KAVACH_ANALYZE_WORKERS (1). With one worker, few
+    tickets, or no fork support on the platform, this is plain analyze().
+    """
+    global _shard_state
+
+    if workers is None:
+        workers = int(os.getenv("KAVACH_ANALYZE_WORKERS", "1"))
+    log_index = ensure_index(logs)
+    if memory_store is None:
+        memory_store = confidence_calibrator.open_memory_store()
+    if policy is None:
+        policy = routing_policy.get_routing_policy()
+
+    shards = shard_by_merchant(tickets, log_index, workers) if workers > 1 else []
+    try:
+        context = multiprocessing.get_context("fork")
+    except ValueError:
+        context = None
+    if incident_info is None:
+        incident_info = incident_detector.detect_patterns(log_index)
+    if len(shards) < 2 or context is None:
+        return analyze(tickets, log_index, rules_text, memory_store=memory_store, policy=policy,
+                       incident_info=incident_info, **analyze_kwargs)
+
+    # Workers read a plain in-memory snapshot, never the parent's backend handle
+    snapshot = confidence_calibrator.MemoryStore(
+        memory_store.to_dict() if hasattr(memory_store, "to_dict") else memory_store.load()
+    )
+    _shard_state = {
+        "tickets": tickets,
+        "log_index": log_index,
+        "rules_text": rules_text,
+        "incident_info": incident_info,
+        "analyze_kwargs": dict(analyze_kwargs, memory_store=snapshot, policy=policy),
+    }
+    try:
+        with context.Pool(len(shards), initializer=_init_shard_worker) as pool:
+            shard_results = pool.map(_analyze_shard, shards)
+    finally:
+        _shard_state = None
+
+    findings = [None] * len(tickets)
+    for shard_result, shard_metrics in shard_results:
+        for i, finding in shard_result:
+            findings[i] = finding
+        metrics.get_metrics().merge(shard_metrics)
 
+    # Workers counted routes on their own copies of the policy
+    for finding in findings:
+        if finding["llm_route"] != routing_policy.ROUTE_LLM_UNAVAILABLE:
+            policy.counters[finding["llm_route"]] += 1
     return findings
@@ -1,32 +1,182 @@
-import json
+import os
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
+from collections import defaultdict
+
+import metrics
+from memory_backends import JsonMemoryBackend, JournalMemoryBackend, SqliteMemoryBackend
 
 MEMORY_FILE = Path(".") / "memory.json"
+MEMORY_JOURNAL_FILE = Path(".") / "memory.journal.jsonl"
+MEMORY_SNAPSHOT_FILE = Path(".") / "memory.snapshot.json"
+MEMORY_DB_FILE = Path(".") / "memory.db"
+
+def get_memory_backend():
+    """
+    Select the persistence backend from KAVACH_MEMORY_BACKEND.
+
+    "json" (default) rewrites memory.json on every write; "journal" appends
+    to a JSON Lines journal and "sqlite" uses memory.db. Both seed themselves
+    from memory.json on first use.
+    """
+    backend = os.getenv("KAVACH_MEMORY_BACKEND", "json").lower()
+    if backend == "journal":
+        return JournalMemoryBackend(MEMORY_JOURNAL_FILE, MEMORY_SNAPSHOT_FILE, import_path=MEMORY_FILE)
+    if backend == "sqlite":
+        return SqliteMemoryBackend(MEMORY_DB_FILE, import_path=MEMORY_FILE)
+    return JsonMemoryBackend(MEMORY_FILE)
+
+
+def memory_version() -> tuple:
+    """
+    Cheap change token for the configured backend's files (path, mtime, size).
+
+    Any write by this or another process changes it, so callers can cache
+    anything derived from memory and reload only when the token moves.
+    """
+    backend = os.getenv("KAVACH_MEMORY_BACKEND", "json").lower()
+    if backend == "journal":
+        paths = [MEMORY_JOURNAL_FILE, MEMORY_SNAPSHOT_FILE]
+    elif backend == "sqlite":
+        paths = [MEMORY_DB_FILE, MEMORY_DB_FILE.with_name(MEMORY_DB_FILE.name + "-wal")]
+    else:
+        paths = [MEMORY_FILE]
+
+    version = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            version.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append((str(path), None, None))
+    return tuple(version)
+
+
+def open_memory_store(backend=None):
+    """
+    Open the store used for calibration lookups.
+
+    Backends that can answer calibration queries themselves (SQLite) are
+    used directly; the file backends are loaded into an indexed MemoryStore.
+    """
+    if backend is None:
+        backend = get_memory_backend()
+    if hasattr(backend, "calibration_view"):
+        return backend
+    return MemoryStore.load(backend)
+
 
 def load_memory() -> Dict:
-    """Load memory from memory.json"""
-    if not MEMORY_FILE.exists():
-        return {"actions": []}
-    
-    try:
-        with open(MEMORY_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {"actions": []}
+    """Load memory from the configured backend (memory.json by default)"""
+    return get_memory_backend().load()
+
+
+class MemoryStore:
+    """
+    In-memory view of memory.json with hash indexes for calibration lookups.
+
+    Loads the file once and keeps actions indexed by (merchant_id, cause),
+    merchant_id and cause, split by outcome, so a calibration lookup costs
+    O(1) instead of a file parse plus a full scan. Share one store across a
+    batch of tickets; record() keeps the indexes and the backend in sync.
+    """
+
+    def __init__(self, memory: Optional[Dict] = None, backend=None):
+        self.backend = backend
+        self.actions: List[Dict] = []
+        self.by_pair: Dict[tuple, List[Dict]] = defaultdict(list)
+        self.by_merchant: Dict[str, List[Dict]] = defaultdict(list)
+        self.by_cause: Dict[str, List[Dict]] = defaultdict(list)
+        self.pair_outcomes: Dict[tuple, List[Dict]] = defaultdict(list)
+        self.cause_outcomes: Dict[tuple, List[Dict]] = defaultdict(list)
 
+        for action in (memory or {}).get("actions", []):
+            self.add(action)
 
-def save_memory(memory: Dict):
-    """Save memory to memory.json"""
-    try:
-        with open(MEMORY_FILE, "w") as f:
-            json.dump(memory, indent=2, fp=f)
-    except Exception as e:
-        print(f"Failed to save memory: {e}")
+    @classmethod
+    def load(cls, backend=None) -> "MemoryStore":
+        """Build a store from the configured memory backend"""
+        if backend is None:
+            backend = get_memory_backend()
+        return cls(backend.load(), backend)
 
+    def add(self, action: Dict):
+        """Index an action without persisting it."""
+        merchant_id = action["merchant_id"]
+        cause = action["cause"].lower()
+        outcome = action.get("outcome")
 
-def adjust_confidence(merchant_id: str, suspected_cause: str, base_confidence: float) -> Dict:
+        self.actions.append(action)
+        self.by_pair[(merchant_id, cause)].append(action)
+        self.by_merchant[merchant_id].append(action)
+        self.by_cause[cause].append(action)
+        self.pair_outcomes[(merchant_id, cause, outcome)].append(action)
+        self.cause_outcomes[(cause, outcome)].append(action)
+
+    def record(self, action: Dict):
+        """Index an action and persist it through the backend"""
+        self.add(action)
+        if self.backend is not None:
+            self.backend.append(action)
+
+    def record_many(self, actions: List[Dict]):
+        """Index several actions and persist them in one backend write"""
+        for action in actions:
+            self.add(action)
+        if self.backend is not None and actions:
+            self.backend.append_many(actions)
+
+    def to_dict(self) -> Dict:
+        return {"actions": self.actions}
+
+    def outcome_counts(self, merchant_id: str, cause: str) -> Dict[str, int]:
+        """Running success/failure counters for a merchant + cause pair."""
+        cause = cause.lower()
+        return {
+            "success": len(self.pair_outcomes.get((merchant_id, cause, "success"), [])),
+            "failure": len(self.pair_outcomes.get((merchant_id, cause, "failure"), [])),
+        }
+
+    def calibration_view(self, merchant_id: str, suspected_cause: str) -> Dict:
+        """
+        Counts and recent-action windows adjust_confidence needs for one merchant + cause.
+
+        Mirrors the exact / same-merchant / same-cause priority order, so
+        only the first non-empty tier is populated.
+        """
+        cause = suspected_cause.lower()
+        exact = self.by_pair.get((merchant_id, cause), [])
+
+        if exact:
+            successes = self.pair_outcomes.get((merchant_id, cause, "success"), [])
+            failures = self.pair_outcomes.get((merchant_id, cause, "failure"), [])
+            return {
+                "tier": "exact",
+                "success_count": len(successes),
+                "failure_count": len(failures),
+                "total": len(exact),
+                "recent_successes": successes[-3:],
+                "recent_failures": failures[-3:],
+                "recent": exact[-3:],
+            }
+
+        # No exact match, so every action for this merchant has a different cause
+        merchant_actions = self.by_merchant.get(merchant_id, [])
+        if merchant_actions:
+            return {"tier": "merchant", "recent": merchant_actions[-5:]}
+
+        # No actions for this merchant at all, so every cause match is another merchant
+        if self.by_cause.get(cause):
+            successes = self.cause_outcomes.get((cause, "success"), [])
+            return {"tier": "cause", "success_count": len(successes), "recent_successes": successes[-2:]}
+
+        return {"tier": None}
+
+
+@metrics.timed("adjust_confidence")
+def adjust_confidence(merchant_id: str, suspected_cause: str, base_confidence: float,
+                      store: Optional[MemoryStore] = None) -> Dict:
     """
     Adjusts confidence based on historical memory.
     
@@ -34,6 +184,7 @@ def adjust_confidence(merchant_id: str, suspected_cause: str, base_confidence: f
         merchant_id: Merchant ID
         suspected_cause: Root cause hypothesis
         base_confidence: Initial confidence (0-1)
+        store: Shared MemoryStore / SqliteMemoryBackend for a batch (opened if omitted)
     
     Returns:
         Dictionary with:
@@ -44,21 +195,11 @@ def adjust_confidence(merchant_id: str, suspected_cause: str, base_confidence: f
         - memory_evidence: List of relevant past actions
     """
     
-    memory = load_memory()
-    actions = memory.get("actions", [])
+    if store is None:
+        store = open_memory_store()
     
     # Find relevant past actions for this merchant + cause combination
-    exact_matches = []
-    merchant_matches = []
-    cause_matches = []
-    
-    for action in actions:
-        if action["merchant_id"] == merchant_id and action["cause"].lower() == suspected_cause.lower():
-            exact_matches.append(action)
-        elif action["merchant_id"] == merchant_id:
-            merchant_matches.append(action)
-        elif action["cause"].lower() == suspected_cause.lower():
-            cause_matches.append(action)
+    view = store.calibration_view(merchant_id, suspected_cause)
     
     adjustment = 0.0
     reason = "No historical data"
@@ -66,38 +207,38 @@ def adjust_confidence(merchant_id: str, suspected_cause: str, base_confidence: f
     memory_evidence = []
     
     # Priority 1: Exact merchant + cause matches
-    if exact_matches:
-        successes = [a for a in exact_matches if a["outcome"] == "success"]
-        failures = [a for a in exact_matches if a["outcome"] == "failure"]
+    if view["tier"] == "exact":
+        successes = view["success_count"]
+        failures = view["failure_count"]
         
         if successes and not failures:
             # Previously successful - boost confidence significantly
             adjustment = 0.3
-            reason = f"Previously successful {len(successes)} time(s) for this merchant + cause"
-            memory_evidence = successes[-3:]  # Last 3 successes
+            reason = f"Previously successful {successes} time(s) for this merchant + cause"
+            memory_evidence = view["recent_successes"]  # Last 3 successes
             
         elif failures and not successes:
             # Previously failed - reduce confidence and escalate
             adjustment = -0.2
-            reason = f"Previously failed {len(failures)} time(s) for this merchant + cause"
+            reason = f"Previously failed {failures} time(s) for this merchant + cause"
             should_escalate_early = True
-            memory_evidence = failures[-3:]  # Last 3 failures
+            memory_evidence = view["recent_failures"]  # Last 3 failures
             
         elif successes and failures:
             # Mixed results - slight boost if more successes
-            success_rate = len(successes) / len(exact_matches)
+            success_rate = successes / view["total"]
             if success_rate > 0.6:
                 adjustment = 0.15
-                reason = f"Mixed results: {len(successes)} successes, {len(failures)} failures (60%+ success rate)"
+                reason = f"Mixed results: {successes} successes, {failures} failures (60%+ success rate)"
             else:
                 adjustment = -0.1
-                reason = f"Mixed results: {len(successes)} successes, {len(failures)} failures (<60% success rate)"
+                reason = f"Mixed results: {successes} successes, {failures} failures (<60% success rate)"
                 should_escalate_early = True
-            memory_evidence = exact_matches[-3:]
+            memory_evidence = view["recent"]
     
     # Priority 2: Same merchant, different cause
-    elif merchant_matches:
-        recent_failures = [a for a in merchant_matches[-5:] if a["outcome"] == "failure"]
+    elif view["tier"] == "merchant":
+        recent_failures = [a for a in view["recent"] if a["outcome"] == "failure"]
         if len(recent_failures) >= 3:
             # This merchant has had multiple recent failures - be cautious
             adjustment = -0.1
@@ -106,13 +247,13 @@ def adjust_confidence(merchant_id: str, suspected_cause: str, base_confidence: f
             memory_evidence = recent_failures[-2:]
     
     # Priority 3: Same cause, different merchant
-    elif cause_matches:
-        successes = [a for a in cause_matches if a["outcome"] == "success"]
-        if len(successes) >= 3:
+    elif view["tier"] == "cause":
+        successes = view["success_count"]
+        if successes >= 3:
             # This cause has been successfully resolved before - slight boost
             adjustment = 0.1
-            reason = f"This cause successfully resolved {len(successes)} times for other merchants"
-            memory_evidence = successes[-2:]
+            reason = f"This cause successfully resolved {successes} times for other merchants"
+            memory_evidence = view["recent_successes"]
     
     # Calculate adjusted confidence
     adjusted_confidence = max(0.0, min(1.0, base_confidence + adjustment))
@@ -127,7 +268,8 @@ def adjust_confidence(merchant_id: str, suspected_cause: str, base_confidence: f
 
 
 def record_action(merchant_id: str, cause: str, action: str, outcome: str, 
-                  confidence_before: float, confidence_after: float):
+                  confidence_before: float, confidence_after: float,
+                  store: Optional[MemoryStore] = None):
     """
     Records an action outcome to memory for future learning.
     
@@ -138,11 +280,13 @@ def record_action(merchant_id: str, cause: str, action: str, outcome: str,
         outcome: "success" or "failure"
         confidence_before: Confidence before calibration
         confidence_after: Confidence after calibration
+        store: Shared MemoryStore / SqliteMemoryBackend to record into (opened if omitted)
     """
     
-    memory = load_memory()
+    if store is None:
+        store = open_memory_store()
     
-    memory["actions"].append({
+    store.record({
         "timestamp": datetime.now().isoformat(),
         "merchant_id": merchant_id,
         "cause": cause,
@@ -151,5 +295,32 @@ def record_action(merchant_id: str, cause: str, action: str, outcome: str,
         "confidence_before": confidence_before,
         "confidence_after": confidence_after
     })
-    
-    save_memory(memory)
+
+
+def record_actions(outcomes: List[Dict], store: Optional[MemoryStore] = None):
+    """
+    Records several action outcomes in one batched write.
+
+    Args:
+        outcomes: Dicts with merchant_id, cause, action, outcome,
+            confidence_before and confidence_after (as for record_action)
+        store: Shared MemoryStore / SqliteMemoryBackend to record into (opened if omitted)
+    """
+    if not outcomes:
+        return
+
+    if store is None:
+        store = open_memory_store()
+
+    timestamp = datetime.now().isoformat()
+    actions = [{
+        "timestamp": timestamp,
+        "merchant_id": o["merchant_id"],
+        "cause": o["cause"],
+        "action": o["action"],
+        "outcome": o["outcome"],
+        "confidence_before": o["confidence_before"],
+        "confidence_after": o["confidence_after"]
+    } for o in outcomes]
+
+    store.record_many(actions)
@@ -1,42 +1,114 @@
 import streamlit as st
-import json
 import csv
 from pathlib import Path
-from brain import analyze
-from decision_engine import decide
+from log_index import LogTable
+from observer import iter_logs
+from incremental import IncrementalAnalyzer
+import confidence_calibrator
 import action
+import metrics
+import routing_policy
 
 BASE = Path(".")
+DOCS_FILE = BASE / "docs" / "headless_guide.md"
+LOGS_FILE = BASE / "logs" / "api_activity.json"
+TICKETS_FILE = BASE / "tickets" / "inbox.csv"
 
-def load_docs():
-    with open(BASE / "docs" / "headless_guide.md", "r") as f:
+def file_version(path):
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Loaders are cached across reruns and sessions, keyed by the file's mtime/size;
+# only the current version is kept, so an edited file doesn't pin the old copy
+@st.cache_data(max_entries=1)
+def load_docs(version):
+    with open(DOCS_FILE, "r") as f:
         return f.read()
 
-def load_logs():
-    with open(BASE / "logs" / "api_activity.json", "r") as f:
-        return json.load(f)
+@st.cache_resource(max_entries=1)
+def load_logs(version):
+    # Stream records straight into a columnar table instead of json.load-ing the whole file
+    return LogTable(iter_logs(LOGS_FILE))
 
-def load_tickets():
+@st.cache_data(max_entries=1)
+def load_tickets(version):
     tickets = []
-    with open(BASE / "tickets" / "inbox.csv", newline='', encoding="utf-8") as f:
+    with open(TICKETS_FILE, newline='', encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
             tickets.append(row)
     return tickets
 
+@st.cache_resource
+def get_analyzer():
+    return IncrementalAnalyzer()
+
+@st.cache_resource
+def get_memory_holder():
+    return {"store": None, "version": None}
+
+def get_memory_store():
+    """Shared memory store, reloaded only when memory changed outside this app."""
+    holder = get_memory_holder()
+    version = confidence_calibrator.memory_version()
+    if holder["version"] != version:
+        holder["store"] = confidence_calibrator.open_memory_store()
+        holder["version"] = version
+    return holder["store"]
+
+def run_pipeline():
+    """
+    Findings and decisions for the inbox, kept in the session between
+    reruns and recomputed only when an input file or memory changed.
+    """
+    inputs = (file_version(DOCS_FILE), file_version(LOGS_FILE), file_version(TICKETS_FILE),
+              confidence_calibrator.memory_version())
+    if st.session_state.get("pipeline_inputs") != inputs:
+        tickets = load_tickets(inputs[2])
+        findings, decisions = get_analyzer().run(
+            tickets, load_logs(inputs[1]), load_docs(inputs[0]), memory_store=get_memory_store(),
+            logs_version=inputs[1]
+        )
+        st.session_state["pipeline"] = (tickets, findings, decisions)
+        st.session_state["pipeline_inputs"] = inputs
+    return st.session_state["pipeline"]
+
+def filter_decisions(decisions, risks, incident_types, flags):
+    """Decisions matching every selected filter (an empty selection matches all)."""
+    return [
+        d for d in decisions
+        if (not risks or d['risk'] in risks)
+        and (not incident_types or d.get('incident_type', 'MERCHANT-SPECIFIC') in incident_types)
+        and (not flags or any(flag in flags for flag in d.get('safety_flags', [])))
+    ]
+
+def record_and_refresh(selected, outcome):
+    """
+    Record one human verdict for the selected decisions in a single batched
+    memory write, then recompute only the decisions it affects.
+    """
+    store = get_memory_store()
+    action.record_outcomes(selected, outcome, store=store)
+    get_memory_holder()["version"] = confidence_calibrator.memory_version()
+
+    analyzer = get_analyzer()
+    if not analyzer.last_keys:
+        # Analyzer was evicted from the resource cache: fall back to a full run
+        st.session_state.pop("pipeline_inputs", None)
+        return
+    findings, decisions = analyzer.refresh(store)
+    tickets = st.session_state["pipeline"][0]
+    st.session_state["pipeline"] = (tickets, findings, decisions)
+    inputs = st.session_state["pipeline_inputs"]
+    st.session_state["pipeline_inputs"] = inputs[:3] + (confidence_calibrator.memory_version(),)
+
 st.set_page_config(page_title="Advanced Self-Healing Agent", layout="wide")
 
 st.title("Kavach-AI: Advanced Self-Healing Support Control Room")
 st.subheader("AI-Powered Headless Migration Intelligence")
 
-# Load data
-rules = load_docs()
-logs = load_logs()
-tickets = load_tickets()
-
-# Analyze
-findings = analyze(tickets, logs, rules)
-decisions = decide(findings)
+# Load data and analyze (cached; only changed tickets are recomputed)
+tickets, findings, decisions = run_pipeline()
 
 # === PLATFORM-WIDE INCIDENT OVERVIEW ===
 platform_incidents = [d for d in decisions if d.get('is_platform_incident', False)]
@@ -53,10 +125,57 @@ if platform_incidents:
     st.info("Auto-fixes have been BLOCKED for all affected merchants. Engineering escalation required.")
     st.divider()
 
+# === FILTERS & PAGINATION ===
+# Only the selected page of decisions is rendered on each rerun
+st.sidebar.markdown("## Filters")
+selected_risks = st.sidebar.multiselect("Risk", ["Critical", "High", "Medium", "Low"])
+selected_types = st.sidebar.multiselect(
+    "Incident Type", sorted({d.get('incident_type', 'MERCHANT-SPECIFIC') for d in decisions})
+)
+selected_flags = st.sidebar.multiselect(
+    "Safety Guardrails", sorted({flag for d in decisions for flag in d.get('safety_flags', [])})
+)
+page_size = st.sidebar.selectbox("Incidents per page", [10, 25, 50, 100], index=1)
+
+filtered = filter_decisions(decisions, selected_risks, selected_types, selected_flags)
+page_count = max(1, -(-len(filtered) // page_size))
+page_number = st.sidebar.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+page_start = (page_number - 1) * page_size
+page = filtered[page_start:page_start + page_size]
+
+# === BULK TRIAGE ===
+with st.expander("Bulk Approve / Reject"):
+    action_options = ["All proposed actions"] + sorted({d['action'] for d in filtered})
+    bulk_action = st.selectbox("Proposed action", action_options)
+    candidates = [d for d in filtered if bulk_action == action_options[0] or d['action'] == bulk_action]
+    chosen = st.multiselect(
+        "Decisions (matching the sidebar filters)",
+        list(range(len(candidates))),
+        default=list(range(len(candidates))),
+        format_func=lambda i: f"{candidates[i]['merchant_id']} - {candidates[i]['issue']} ({candidates[i]['risk']})"
+    )
+    selected = [candidates[i] for i in chosen]
+
+    col_bulk_approve, col_bulk_reject = st.columns(2)
+    with col_bulk_approve:
+        if st.button(f"Approve {len(selected)} selected", key="bulk_approve", disabled=not selected):
+            record_and_refresh(selected, "success")
+            st.success(f"Approved {len(selected)} actions and recorded them to memory")
+            st.rerun()
+    with col_bulk_reject:
+        if st.button(f"Reject {len(selected)} selected", key="bulk_reject", disabled=not selected):
+            record_and_refresh(selected, "failure")
+            st.error(f"Rejected {len(selected)} actions and recorded them to memory")
+            st.rerun()
+
 # === MERCHANT INCIDENTS ===
 st.markdown("## Active Merchant Incidents")
+st.caption(
+    f"Showing {page_start + 1 if page else 0}-{page_start + len(page)} of {len(filtered)} "
+    f"matching incidents ({len(decisions)} total), page {page_number} of {page_count}"
+)
 
-for d in decisions:
+for d in page:
     with st.container():
         # Header with key metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -100,8 +219,8 @@ for d in decisions:
         if safety_flags:
             st.warning(f"Safety Guardrails: {', '.join(safety_flags)}")
         
-        # === EXPLAINABLE REASONING (Expandable) ===
-        with st.expander(" View Reasoning & Evidence"):
+        # === EXPLAINABLE REASONING (rendered only when opened) ===
+        if st.checkbox(" View Reasoning & Evidence", key=f"details_{d['merchant_id']}_{d['issue']}"):
             # Reasoning chain
             st.markdown("Reasoning Chain: ")
             reasoning = d.get('reasoning_chain', [])
@@ -176,28 +295,14 @@ for d in decisions:
         with col_approve:
             if st.button(f"Approve {d['merchant_id']}", key=f"approve_{d['merchant_id']}"):
                 # Record success to memory
-                action.record_outcome(
-                    d['merchant_id'],
-                    d['cause'],
-                    d['action'],
-                    "success",
-                    d.get('confidence_before_calibration', d['confidence']),
-                    d['confidence']
-                )
+                record_and_refresh([d], "success")
                 st.success(f"Action approved for {d['merchant_id']} and recorded to memory")
                 st.rerun()
         
         with col_reject:
             if st.button(f"Reject {d['merchant_id']}", key=f"reject_{d['merchant_id']}"):
                 # Record failure to memory
-                action.record_outcome(
-                    d['merchant_id'],
-                    d['cause'],
-                    d['action'],
-                    "failure",
-                    d.get('confidence_before_calibration', d['confidence']),
-                    d['confidence']
-                )
+                record_and_refresh([d], "failure")
                 st.error(f"Action rejected for {d['merchant_id']} and recorded to memory")
                 st.rerun()
         
@@ -212,3 +317,30 @@ col1.metric("Active Tickets", len(tickets))
 col2.metric("Total Decisions", len(decisions))
 col3.metric("High Risk", len([d for d in decisions if d['risk'] in ['Critical', 'High']]))
 col4.metric("Platform Incidents", len(platform_incidents))
+
+# === PIPELINE METRICS ===
+with st.expander("Pipeline Metrics"):
+    snapshot = metrics.get_metrics().snapshot()
+    counters = snapshot["counters"]
+    routing = routing_policy.route_stats_from_metrics(counters)
+    col_req, col_hits, col_tokens, col_saved = st.columns(4)
+    col_req.metric("LLM Requests", counters.get("llm_requests", 0))
+    col_hits.metric("LLM Cache Hits", counters.get("llm_cache_hits", 0))
+    col_tokens.metric("LLM Tokens (est.)",
+                      counters.get("llm_prompt_tokens", 0) + counters.get("llm_response_tokens", 0))
+    col_saved.metric("LLM Calls Saved", routing["llm_calls_saved"],
+                     help=", ".join(f"{route}: {n}" for route, n in routing["routes"].items()) or None)
+    if snapshot["stages"]:
+        st.table([
+            {
+                "Stage": stage,
+                "Calls": s["count"],
+                "p50 (ms)": round(s["p50"] * 1000, 2),
+                "p95 (ms)": round(s["p95"] * 1000, 2),
+                "p99 (ms)": round(s["p99"] * 1000, 2),
+                "Total (s)": round(s["total_seconds"], 3)
+            }
+            for stage, s in snapshot["stages"].items()
+        ])
+    else:
+        st.caption("No stage has run in this server process yet")
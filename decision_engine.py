@@ -1,8 +1,124 @@
-def decide(findings):
+import os
+import re
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+# Safety guardrails, checked in priority order against the suspected cause;
+# the first one that applies sets the action, risk and safety flag.
+#   keywords:         matched case-insensitively
+#   match:            "substring" (default) fires on a keyword anywhere in the
+#                     cause, so compounds like "repayment" or "autodelete"
+#                     count; "word" only fires at the start of a word, so
+#                     "discharge" would not trigger "charge"
+#   confidence_above: only applies when the finding's confidence exceeds this
+DEFAULT_GUARDRAILS = [
+    {
+        "id": "payment",
+        "keywords": ["payment", "charge", "refund", "transaction", "billing"],
+        "action": "REQUIRES MANUAL REVIEW - Payment system affected",
+        "risk": "Critical",
+        "flag": "PAYMENT-RELATED"
+    },
+    {
+        "id": "webhook",
+        "keywords": ["webhook", "secret", "callback", "notification"],
+        "confidence_above": 0.8,
+        "action": "Send webhook secret fix guide (REQUIRES APPROVAL)",
+        "risk": "Critical",
+        "flag": "WEBHOOK-RELATED"
+    },
+    {
+        "id": "destructive",
+        "keywords": ["delete", "remove", "disable", "revoke", "terminate"],
+        "action": "REQUIRES MANUAL REVIEW - Destructive action detected",
+        "risk": "Critical",
+        "flag": "DESTRUCTIVE ACTION"
+    }
+]
+
+
+def load_guardrails(path: Optional[Path] = None) -> List[Dict]:
+    """Load a guardrail table from a JSON file (a list of guardrail dicts), or the built-in defaults."""
+    if path is None:
+        return DEFAULT_GUARDRAILS
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class GuardrailPolicy:
+    """
+    Classifies suspected causes against the guardrail table.
+
+    Each guardrail is compiled once into a matcher for its `match` mode.
+    Causes repeat heavily across a batch, so the guardrails a cause
+    triggers are memoized per distinct cause string and a decision costs
+    one dictionary lookup.
+    """
+
+    def __init__(self, guardrails: Optional[List[Dict]] = None):
+        self.guardrails = guardrails if guardrails is not None else DEFAULT_GUARDRAILS
+        self._matchers = [self._compile(guardrail) for guardrail in self.guardrails]
+        self._cache: Dict[str, Tuple[int, ...]] = {}
+
+    @staticmethod
+    def _compile(guardrail: Dict):
+        keywords = [keyword.lower() for keyword in guardrail.get("keywords", [])]
+        if not keywords:
+            return lambda cause_lower: False
+        match = guardrail.get("match", "substring")
+        if match == "substring":
+            return lambda cause_lower: any(keyword in cause_lower for keyword in keywords)
+        if match == "word":
+            pattern = re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + ")")
+            return lambda cause_lower: pattern.search(cause_lower) is not None
+        raise ValueError(f"Guardrail {guardrail.get('id')!r}: unknown match mode {match!r}")
+
+    def classify(self, cause: str) -> Tuple[int, ...]:
+        """Indexes of the guardrails whose keywords occur in `cause`, in priority order."""
+        matched = self._cache.get(cause)
+        if matched is None:
+            cause_lower = cause.lower()
+            matched = tuple(i for i, matcher in enumerate(self._matchers) if matcher(cause_lower))
+            self._cache[cause] = matched
+        return matched
+
+    def check(self, cause: str, confidence: float) -> Optional[Dict]:
+        """The highest-priority guardrail that applies to a finding, or None."""
+        for i in self.classify(cause):
+            guardrail = self.guardrails[i]
+            if confidence > guardrail.get("confidence_above", float("-inf")):
+                return guardrail
+        return None
+
+
+_default_policy: Optional[GuardrailPolicy] = None
+_policy_lock = threading.Lock()
+
+def get_guardrail_policy() -> GuardrailPolicy:
+    """Process-wide GuardrailPolicy, from KAVACH_GUARDRAILS_FILE or the built-in table."""
+    global _default_policy
+    with _policy_lock:
+        if _default_policy is None:
+            path = os.getenv("KAVACH_GUARDRAILS_FILE")
+            _default_policy = GuardrailPolicy(load_guardrails(Path(path) if path else None))
+    return _default_policy
+
+
+@metrics.timed("decide")
+def decide(findings, policy: Optional[GuardrailPolicy] = None):
     """
     Enhanced decision engine with safety guardrails and risk assessment.
     Validates LLM outputs and enforces human approval for critical actions.
+
+    `policy` defaults to the process-wide GuardrailPolicy (see
+    get_guardrail_policy).
     """
+    if policy is None:
+        policy = get_guardrail_policy()
     decisions = []
 
     for f in findings:
@@ -12,19 +128,7 @@ def decide(findings):
         safety_flags = []
         
         # === SAFETY GUARDRAILS ===
-        
-        # Check for payment-related actions
-        cause_lower = f["suspected_cause"].lower()
-        is_payment_related = any(keyword in cause_lower for keyword in 
-                                  ["payment", "charge", "refund", "transaction", "billing"])
-        
-        # Check for webhook-related actions
-        is_webhook_related = any(keyword in cause_lower for keyword in 
-                                 ["webhook", "secret", "callback", "notification"])
-        
-        # Check for destructive actions
-        is_destructive = any(keyword in cause_lower for keyword in 
-                            ["delete", "remove", "disable", "revoke", "terminate"])
+        guardrail = policy.check(f["suspected_cause"], f["confidence"])
         
         # Check evidence strength
         evidence_count = (
@@ -46,23 +150,11 @@ def decide(findings):
                 safety_flags.append("AUTO-FIX BLOCKED")
         
         # === CRITICAL ACTION DETECTION ===
-        elif is_payment_related:
-            action = "REQUIRES MANUAL REVIEW - Payment system affected"
-            risk = "Critical"
-            requires_human_approval = True
-            safety_flags.append("PAYMENT-RELATED")
-        
-        elif is_webhook_related and f["confidence"] > 0.8:
-            action = "Send webhook secret fix guide (REQUIRES APPROVAL)"
-            risk = "Critical"
-            requires_human_approval = True
-            safety_flags.append("WEBHOOK-RELATED")
-        
-        elif is_destructive:
-            action = "REQUIRES MANUAL REVIEW - Destructive action detected"
-            risk = "Critical"
+        elif guardrail is not None:
+            action = guardrail["action"]
+            risk = guardrail["risk"]
             requires_human_approval = True
-            safety_flags.append("DESTRUCTIVE ACTION")
+            safety_flags.append(guardrail["flag"])
         
         # === CONFIDENCE-BASED DECISIONS ===
         elif f["confidence"] > 0.9 and not weak_evidence:
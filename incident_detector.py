@@ -1,13 +1,94 @@
 from datetime import datetime, timedelta
-from typing import List, Dict
-from collections import defaultdict
+from typing import List, Dict, Optional
+from bisect import insort
+from collections import Counter, defaultdict
+import metrics
+from log_index import LogTable, MISSING_TIMESTAMP, ensure_index, minute_bucket
 
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _minute_to_iso(minute: int) -> str:
+    return (_EPOCH + timedelta(minutes=minute)).isoformat()
+
+
+def _find_incident_windows(buckets: Dict[int, List[str]], time_window_minutes: int, threshold: int) -> List[Dict]:
+    """
+    Sliding window over minute buckets of merchant IDs.
+
+    Visits the buckets in time order with two pointers, keeping per-merchant
+    counts for the window [t - window, t], so every log line enters and
+    leaves the window once. Overlapping qualifying windows are merged into a
+    single incident; a minute's merchants join it only if the window ending
+    at that minute still qualifies.
+    """
+    incidents = []
+    counts = {}
+    current = None
+    minutes = sorted(buckets)
+    left = 0
+
+    for minute in minutes:
+        for merchant_id in buckets[minute]:
+            counts[merchant_id] = counts.get(merchant_id, 0) + 1
+
+        # Expire buckets older than the window
+        while minutes[left] < minute - time_window_minutes:
+            for merchant_id in buckets[minutes[left]]:
+                remaining = counts[merchant_id] - 1
+                if remaining:
+                    counts[merchant_id] = remaining
+                else:
+                    del counts[merchant_id]
+            left += 1
+
+        window_start = minutes[left]
+        if len(counts) >= threshold:
+            if current is None or window_start > current["end"]:
+                current = {"start": window_start, "merchants": set(counts), "peak_count": 0}
+                incidents.append(current)
+            else:
+                current["merchants"].update(buckets[minute])
+            current["end"] = window_start + time_window_minutes
+            current["peak_count"] = max(current["peak_count"], len(counts))
+        else:
+            current = None
+
+    return incidents
+
+
+def _error_code_buckets(index) -> Dict[int, Dict[int, List[str]]]:
+    """Merchant IDs per epoch-minute bucket, per error code (in first-seen order)."""
+    error_buckets = {}
+
+    if isinstance(index, LogTable):
+        # Columnar input: timestamps are already epoch seconds, no parsing needed
+        merchant_ids = index.merchant_ids
+        for error_code, seconds, merchant in zip(index.error_code, index.timestamp, index.merchant):
+            buckets = error_buckets.get(error_code)
+            if buckets is None:
+                buckets = error_buckets[error_code] = defaultdict(list)
+            if seconds != MISSING_TIMESTAMP:
+                buckets[seconds // 60].append(merchant_ids[merchant])
+        return error_buckets
+
+    # Logs are already grouped by error code in the index
+    for error_code, error_logs in index.by_error_code.items():
+        buckets = error_buckets[error_code] = defaultdict(list)
+        for log in error_logs:
+            minute = minute_bucket(log.get("timestamp", ""))
+            if minute is not None:
+                buckets[minute].append(log.get("merchant_id", "unknown"))
+    return error_buckets
+
+
+@metrics.timed("detect_patterns")
 def detect_patterns(logs: List[Dict], time_window_minutes: int = 10, threshold: int = 10) -> Dict:
     """
     Detects cross-merchant incident patterns.
     
     Args:
-        logs: All log entries across all merchants
+        logs: All log entries across all merchants (list, LogIndex or LogTable)
         time_window_minutes: Time window for pattern detection (default 10 min)
         threshold: Minimum number of merchants to trigger platform-wide alert (default 10)
     
@@ -18,6 +99,10 @@ def detect_patterns(logs: List[Dict], time_window_minutes: int = 10, threshold:
         - pattern: Description of the pattern
         - time_range: Start and end timestamps
         - should_block_auto_fix: Boolean
+        - incidents: Every qualifying incident window (most severe first)
+    
+    Runs in O(N + B log B) for N logs in B minute buckets: logs are bucketed
+    per error code and the sorted buckets are swept once with a sliding window.
     """
     
     if not logs:
@@ -26,76 +111,50 @@ def detect_patterns(logs: List[Dict], time_window_minutes: int = 10, threshold:
             "affected_merchants": [],
             "pattern": "No logs available",
             "time_range": None,
-            "should_block_auto_fix": False
+            "should_block_auto_fix": False,
+            "incidents": []
         }
     
-    # Parse timestamps and group by error type and time window
-    error_patterns = defaultdict(lambda: defaultdict(set))
-    
-    for log in logs:
-        try:
-            timestamp = datetime.fromisoformat(log["timestamp"].replace("Z", "+00:00"))
-            error_code = log.get("error_code", 0)
-            merchant_id = log.get("merchant_id", "unknown")
-            message = log.get("message", "")
-            
-            # Group by error code
-            time_bucket = timestamp.replace(second=0, microsecond=0)
-            error_patterns[error_code][time_bucket].add(merchant_id)
-            
-        except Exception as e:
-            continue
-    
-    # Check for platform-wide incidents
     platform_incidents = []
+    error_merchants = {}
     
-    for error_code, time_buckets in error_patterns.items():
-        for time_bucket, merchants in time_buckets.items():
-            # Check if enough merchants affected in this time window
-            if len(merchants) >= threshold:
-                # Check within the time window
-                window_start = time_bucket
-                window_end = time_bucket + timedelta(minutes=time_window_minutes)
-                
-                # Count unique merchants in this window
-                merchants_in_window = set()
-                for tb, merch_set in time_buckets.items():
-                    if window_start <= tb <= window_end:
-                        merchants_in_window.update(merch_set)
-                
-                if len(merchants_in_window) >= threshold:
-                    platform_incidents.append({
-                        "error_code": error_code,
-                        "merchants": list(merchants_in_window),
-                        "count": len(merchants_in_window),
-                        "time_start": window_start.isoformat(),
-                        "time_end": window_end.isoformat()
-                    })
+    for error_code, buckets in _error_code_buckets(ensure_index(logs)).items():
+        if not buckets:
+            continue
+        error_merchants[error_code] = {merchant_id for merchants in buckets.values() for merchant_id in merchants}
+        
+        # Check for platform-wide incidents
+        for window in _find_incident_windows(buckets, time_window_minutes, threshold):
+            platform_incidents.append({
+                "error_code": error_code,
+                "merchants": sorted(window["merchants"]),
+                "count": len(window["merchants"]),
+                "peak_count": window["peak_count"],
+                "time_start": _minute_to_iso(window["start"]),
+                "time_end": _minute_to_iso(window["end"])
+            })
     
     # Return platform-wide incident if detected
     if platform_incidents:
-        # Get the most severe incident (most merchants affected)
-        worst_incident = max(platform_incidents, key=lambda x: x["count"])
+        # Most severe incident (most merchants affected) first
+        platform_incidents.sort(key=lambda x: x["count"], reverse=True)
+        worst_incident = platform_incidents[0]
         
         return {
             "incident_type": "PLATFORM-WIDE",
             "affected_merchants": worst_incident["merchants"],
-            "pattern": f"{worst_incident['count']} merchants experiencing error {worst_incident['error_code']} within {time_window_minutes} minutes",
+            "pattern": f"{worst_incident['peak_count']} merchants experiencing error {worst_incident['error_code']} within {time_window_minutes} minutes",
             "time_range": {
                 "start": worst_incident["time_start"],
                 "end": worst_incident["time_end"]
             },
             "should_block_auto_fix": True,
-            "escalation_priority": "CRITICAL"
+            "escalation_priority": "CRITICAL",
+            "incidents": platform_incidents
         }
     
     # Check for repeated errors across multiple merchants (lower threshold)
-    error_counts = defaultdict(set)
-    for error_code, time_buckets in error_patterns.items():
-        for merchants in time_buckets.values():
-            error_counts[error_code].update(merchants)
-    
-    for error_code, merchants in error_counts.items():
+    for error_code, merchants in error_merchants.items():
         if len(merchants) >= 5:  # 5+ merchants with same error (but not in same time window)
             return {
                 "incident_type": "POTENTIAL-PLATFORM-ISSUE",
@@ -103,7 +162,8 @@ def detect_patterns(logs: List[Dict], time_window_minutes: int = 10, threshold:
                 "pattern": f"{len(merchants)} merchants experiencing error {error_code} (not time-clustered)",
                 "time_range": None,
                 "should_block_auto_fix": False,
-                "escalation_priority": "HIGH"
+                "escalation_priority": "HIGH",
+                "incidents": []
             }
     
     # Default: merchant-specific
@@ -113,10 +173,206 @@ def detect_patterns(logs: List[Dict], time_window_minutes: int = 10, threshold:
         "pattern": "Individual merchant issues",
         "time_range": None,
         "should_block_auto_fix": False,
-        "escalation_priority": "NORMAL"
+        "escalation_priority": "NORMAL",
+        "incidents": []
     }
 
 
+class _MerchantWindow:
+    """
+    Distinct merchants seen in the last `minutes` minute buckets.
+
+    Each bucket counts lines per merchant and `counts` holds, per merchant,
+    the number of buckets it appears in, so memory grows with the distinct
+    merchants per minute rather than with the log lines in the window.
+    """
+
+    def __init__(self, minutes: int):
+        self.minutes = minutes
+        self.bucket_minutes: List[int] = []
+        self.buckets: Dict[int, Counter] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, minute: int, merchant_id: str, watermark: int) -> bool:
+        if minute < watermark - self.minutes:
+            return False  # Too late: this bucket has already expired
+        bucket = self.buckets.get(minute)
+        if bucket is None:
+            insort(self.bucket_minutes, minute)
+            bucket = self.buckets[minute] = Counter()
+        if merchant_id not in bucket:
+            self.counts[merchant_id] = self.counts.get(merchant_id, 0) + 1
+        bucket[merchant_id] += 1
+        return True
+
+    def expire(self, watermark: int):
+        while self.bucket_minutes and self.bucket_minutes[0] < watermark - self.minutes:
+            for merchant_id in self.buckets.pop(self.bucket_minutes.pop(0)):
+                remaining = self.counts[merchant_id] - 1
+                if remaining:
+                    self.counts[merchant_id] = remaining
+                else:
+                    del self.counts[merchant_id]
+
+    def distinct(self) -> int:
+        return len(self.counts)
+
+    def start(self) -> Optional[int]:
+        return self.bucket_minutes[0] if self.bucket_minutes else None
+
+
+class IncidentStream:
+    """
+    Online cross-merchant incident detection over a live log feed.
+
+    Ingests log events one at a time or in micro-batches and keeps, per error
+    code, a bounded window of minute buckets for the platform-wide rule and a
+    longer one for the potential-platform-issue rule. Old buckets expire as
+    the stream's watermark (latest minute seen) advances, so memory depends
+    on the window sizes rather than the log history.
+
+    ingest() returns the state transitions it caused, e.g. an error code
+    moving from MERCHANT-SPECIFIC to PLATFORM-WIDE the moment the tenth
+    merchant shows up inside the window, and back again once it drains.
+    """
+
+    def __init__(self, time_window_minutes: int = 10, threshold: int = 10,
+                 potential_window_minutes: int = 60, potential_threshold: int = 5):
+        self.time_window_minutes = time_window_minutes
+        self.threshold = threshold
+        self.potential_window_minutes = potential_window_minutes
+        self.potential_threshold = potential_threshold
+        self.watermark: Optional[int] = None
+        self.windows: Dict[int, _MerchantWindow] = {}
+        self.potential_windows: Dict[int, _MerchantWindow] = {}
+        self.states: Dict[int, str] = {}
+
+    def _state(self, error_code: int) -> str:
+        if self.windows[error_code].distinct() >= self.threshold:
+            return "PLATFORM-WIDE"
+        if self.potential_windows[error_code].distinct() >= self.potential_threshold:
+            return "POTENTIAL-PLATFORM-ISSUE"
+        return "MERCHANT-SPECIFIC"
+
+    def _transition(self, error_code: int) -> Optional[Dict]:
+        """Re-evaluate an error code and describe the change, if any."""
+        previous = self.states.get(error_code, "MERCHANT-SPECIFIC")
+        current = self._state(error_code)
+        if current == previous:
+            return None
+
+        self.states[error_code] = current
+        event = self._describe(error_code, current)
+        event.update({
+            "previous_incident_type": previous,
+            "error_code": error_code,
+            "count": len(event["affected_merchants"]),
+            "detected_at": _minute_to_iso(self.watermark)
+        })
+        return event
+
+    def ingest(self, log: Dict) -> List[Dict]:
+        """Add one log event; return any incident transitions it triggered."""
+        minute = minute_bucket(log.get("timestamp", ""))
+        if minute is None:
+            return []
+
+        events = []
+        if self.watermark is None or minute > self.watermark:
+            events.extend(self.advance(minute))
+
+        error_code = log.get("error_code", 0)
+        if error_code not in self.windows:
+            self.windows[error_code] = _MerchantWindow(self.time_window_minutes)
+            self.potential_windows[error_code] = _MerchantWindow(self.potential_window_minutes)
+
+        merchant_id = log.get("merchant_id", "unknown")
+        self.windows[error_code].add(minute, merchant_id, self.watermark)
+        self.potential_windows[error_code].add(minute, merchant_id, self.watermark)
+
+        event = self._transition(error_code)
+        if event:
+            events.append(event)
+        return events
+
+    def ingest_many(self, logs) -> List[Dict]:
+        """Add a micro-batch of log events; return transitions in order."""
+        events = []
+        for log in logs:
+            events.extend(self.ingest(log))
+        return events
+
+    def advance(self, minute: int) -> List[Dict]:
+        """
+        Move the watermark forward (e.g. on a clock tick with no traffic),
+        expiring old buckets and reporting incidents that have drained.
+        """
+        if self.watermark is not None and minute <= self.watermark:
+            return []
+        self.watermark = minute
+
+        events = []
+        for error_code in list(self.windows):
+            self.windows[error_code].expire(minute)
+            self.potential_windows[error_code].expire(minute)
+            event = self._transition(error_code)
+            if event:
+                events.append(event)
+            if not self.windows[error_code].distinct() and not self.potential_windows[error_code].distinct():
+                # Nothing left in either window; drop the error code entirely
+                del self.windows[error_code], self.potential_windows[error_code]
+                self.states.pop(error_code, None)
+        return events
+
+    def snapshot(self) -> Dict:
+        """Current state in the same shape as detect_patterns()."""
+        platform = [code for code, state in self.states.items() if state == "PLATFORM-WIDE"]
+        if platform:
+            worst = max(platform, key=lambda code: self.windows[code].distinct())
+            return self._describe(worst, "PLATFORM-WIDE")
+
+        potential = [code for code, state in self.states.items() if state == "POTENTIAL-PLATFORM-ISSUE"]
+        if potential:
+            worst = max(potential, key=lambda code: self.potential_windows[code].distinct())
+            return self._describe(worst, "POTENTIAL-PLATFORM-ISSUE")
+
+        return self._describe(None, "MERCHANT-SPECIFIC")
+
+    def _describe(self, error_code: Optional[int], incident_type: str) -> Dict:
+        """detect_patterns()-style description of one error code's current window."""
+        if incident_type == "MERCHANT-SPECIFIC":
+            return {
+                "incident_type": incident_type,
+                "affected_merchants": [],
+                "pattern": "Individual merchant issues",
+                "time_range": None,
+                "should_block_auto_fix": False,
+                "escalation_priority": "NORMAL",
+                "incidents": []
+            }
+
+        platform = incident_type == "PLATFORM-WIDE"
+        window = self.windows[error_code] if platform else self.potential_windows[error_code]
+        start = window.start()
+        end = start + window.minutes
+        merchants = sorted(window.counts)
+        return {
+            "incident_type": incident_type,
+            "affected_merchants": merchants,
+            "pattern": f"{len(merchants)} merchants experiencing error {error_code} within {window.minutes} minutes",
+            "time_range": {"start": _minute_to_iso(start), "end": _minute_to_iso(end)},
+            "should_block_auto_fix": platform,
+            "escalation_priority": "CRITICAL" if platform else "HIGH",
+            "incidents": [{
+                "error_code": error_code,
+                "merchants": merchants,
+                "count": len(merchants),
+                "time_start": _minute_to_iso(start),
+                "time_end": _minute_to_iso(end)
+            }] if platform else []
+        }
+
+
 def check_merchant_in_incident(merchant_id: str, incident_info: Dict) -> bool:
     """
     Checks if a specific merchant is part of a detected platform-wide incident.
@@ -128,6 +384,10 @@ def check_merchant_in_incident(merchant_id: str, incident_info: Dict) -> bool:
     Returns:
         True if merchant is part of platform-wide incident
     """
-    if incident_info["incident_type"] in ["PLATFORM-WIDE", "POTENTIAL-PLATFORM-ISSUE"]:
+    if incident_info["incident_type"] == "PLATFORM-WIDE":
+        # A merchant may belong to any detected incident, not just the worst one
+        return any(merchant_id in incident["merchants"] for incident in incident_info.get("incidents", [])) \
+            or merchant_id in incident_info["affected_merchants"]
+    if incident_info["incident_type"] == "POTENTIAL-PLATFORM-ISSUE":
         return merchant_id in incident_info["affected_merchants"]
     return False
@@ -0,0 +1,263 @@
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import brain
+import llm_reasoner
+import incident_detector
+import routing_policy
+import confidence_calibrator
+from decision_engine import decide, get_guardrail_policy
+from log_index import ensure_index
+from memory_backends import _write_json_atomic
+from rule_engine import RuleEngine, get_rule_engine
+
+ANALYSIS_STATE_FILE = Path(".") / "analysis_state.json"
+# Bump whenever analyze/decide output changes so saved findings are not reused
+STATE_VERSION = 3
+
+
+def _digest(value) -> str:
+    payload = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IncrementalAnalyzer:
+    """
+    analyze + decide that only recomputes tickets whose inputs changed.
+
+    Every ticket gets two fingerprints:
+      - analysis key: the ticket fields, its merchant's log slice, the
+        rules (guide text and rule table), the LLM model, prompt version,
+        token budget and batch size, the routing policy thresholds, and
+        the platform incident the merchant belongs to, if any. A change here re-runs analysis (brain.analyze_parallel) for
+        that ticket.
+      - memory key: the calibration view for the finding's
+        (merchant, cause), i.e. exactly the memory records
+        adjust_confidence reads. A change here only re-applies
+        calibration and decide, so recording an outcome invalidates just
+        the findings for that merchant and cause.
+    Decisions also record the guardrail table they were made under; when
+    it changes (KAVACH_GUARDRAILS_FILE) every decision is re-made from
+    its saved finding, without re-analysis.
+    Findings and decisions are persisted in analysis_state.json between
+    runs, each platform incident stored once rather than in every finding
+    that references it; the file is rewritten only when entries changed.
+    The log index, incident detection and per-merchant log digests are
+    cached for as long as the log source is unchanged (the same `logs`
+    object at the same length, or the same `logs_version` passed to run()).
+    """
+
+    def __init__(self, state_path: Path = ANALYSIS_STATE_FILE, rule_engine: Optional[RuleEngine] = None,
+                 reasoner=None):
+        self.state_path = Path(state_path)
+        self.rule_engine = rule_engine if rule_engine is not None else get_rule_engine()
+        self.reasoner = reasoner
+        self.entries: Dict[str, Dict] = self._load_state()
+        self.stats = {"reused": 0, "recalibrated": 0, "redecided": 0, "analyzed": 0}
+        self.last_keys: List[str] = []
+        self._dirty = False
+        self._log_cache: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def _load_state(self) -> Dict[str, Dict]:
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except Exception as e:
+            print(f"Failed to load analysis state: {e}")
+            return {}
+        if state.get("version") != STATE_VERSION:
+            return {}
+
+        # Point every entry back at the one shared copy of its incident
+        incidents = state.get("incidents", {})
+        entries = state.get("entries", {})
+        for entry in entries.values():
+            if entry.get("incident_key"):
+                info = incidents[entry["incident_key"]]
+                entry["finding"]["platform_incident_info"] = info
+                entry["decision"]["platform_incident_info"] = info
+        return entries
+
+    def save(self):
+        """Write the state file if any entry changed since it was loaded or last saved."""
+        if not self._dirty:
+            return
+        entries, incidents = {}, {}
+        for key, entry in self.entries.items():
+            if entry.get("incident_key"):
+                incidents[entry["incident_key"]] = entry["finding"]["platform_incident_info"]
+                entry = dict(entry, finding=dict(entry["finding"], platform_incident_info=None),
+                             decision=dict(entry["decision"], platform_incident_info=None))
+            entries[key] = entry
+        _write_json_atomic(self.state_path, {"version": STATE_VERSION, "entries": entries, "incidents": incidents})
+        self._dirty = False
+
+    def _log_state(self, logs, logs_version) -> Dict:
+        """
+        Log index, incident detection and incident digest for `logs`, plus
+        a per-merchant log digest cache, reused while the log source is
+        unchanged.
+        """
+        cache = self._log_cache
+        if logs_version is not None:
+            unchanged = cache is not None and cache["version"] == logs_version
+        else:
+            unchanged = cache is not None and cache["source"] is logs and cache["length"] == len(logs)
+        if not unchanged:
+            log_index = ensure_index(logs)
+            incident_info = incident_detector.detect_patterns(log_index)
+            cache = self._log_cache = {
+                "version": logs_version,
+                "source": logs,
+                "length": len(logs),
+                "log_index": log_index,
+                "incident_info": incident_info,
+                "incident_key": _digest(incident_info),
+                "merchant_digests": {}
+            }
+        return cache
+
+    def _analysis_key(self, ticket: Dict, log_state: Dict, config_digest: str) -> str:
+        merchant_id = ticket["merchant_id"]
+        digests = log_state["merchant_digests"]
+        if merchant_id not in digests:
+            digests[merchant_id] = _digest(log_state["log_index"].merchant_logs(merchant_id))
+        is_platform = incident_detector.check_merchant_in_incident(merchant_id, log_state["incident_info"])
+        return _digest({
+            "ticket": {k: ticket.get(k) for k in ("merchant_id", "subject", "message")},
+            "logs": digests[merchant_id],
+            "config": config_digest,
+            "incident": log_state["incident_key"] if is_platform else None
+        })
+
+    @staticmethod
+    def _memory_key(finding: Dict, memory_store) -> str:
+        return _digest(memory_store.calibration_view(finding["merchant_id"], finding["suspected_cause"]))
+
+    def run(self, tickets: List[Dict], logs, rules_text: str, memory_store=None, logs_version=None,
+            **analyze_kwargs) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Findings and decisions for every ticket, in ticket order.
+
+        Args:
+            tickets: Tickets to analyze
+            logs: Plain list, LogIndex or LogTable of all logs
+            rules_text: Migration guide rules
+            memory_store: Shared MemoryStore / SqliteMemoryBackend (opened if omitted)
+            logs_version: Anything that changes when the logs do, such as the
+                log file's (mtime, size); when omitted, the logs count as
+                unchanged while the same object keeps the same length
+            **analyze_kwargs: Passed through to brain.analyze_parallel for changed tickets
+
+        Returns:
+            (findings, decisions), identical to decide(analyze(...)) except
+            that unchanged tickets are served from the saved state.
+        """
+        with self._lock:
+            return self._run(tickets, logs, rules_text, memory_store, logs_version, analyze_kwargs)
+
+    def _run(self, tickets: List[Dict], logs, rules_text: str, memory_store, logs_version,
+             analyze_kwargs: Dict) -> Tuple[List[Dict], List[Dict]]:
+        log_state = self._log_state(logs, logs_version)
+        log_index, incident_info = log_state["log_index"], log_state["incident_info"]
+        if memory_store is None:
+            memory_store = confidence_calibrator.open_memory_store()
+        reasoner = self.reasoner if self.reasoner is not None else llm_reasoner.get_reasoner()
+
+        policy = analyze_kwargs.get("policy") or routing_policy.get_routing_policy()
+        batch_size = analyze_kwargs.get("llm_batch_size") or reasoner.batch_size
+
+        config_digest = _digest({
+            "rules_text": rules_text,
+            "rule_table": self.rule_engine.rules,
+            "model": reasoner.backend.name if reasoner.available else None,
+            "prompt_version": llm_reasoner.PROMPT_VERSION,
+            "token_budget": reasoner.token_budget,
+            "batch_size": batch_size,
+            "skip_confidence": policy.skip_confidence,
+            "skip_platform_incidents": policy.skip_platform_incidents
+        })
+
+        keys = [self._analysis_key(ticket, log_state, config_digest) for ticket in tickets]
+
+        # Re-analyze only tickets whose inputs changed, as one batch
+        changed = [i for i, key in enumerate(keys) if key not in self.entries]
+        if changed:
+            fresh = brain.analyze_parallel([tickets[i] for i in changed], log_index, rules_text,
+                                           memory_store=memory_store, rule_engine=self.rule_engine,
+                                           reasoner=reasoner, incident_info=incident_info, **analyze_kwargs)
+            guardrails_key = _digest(get_guardrail_policy().guardrails)
+            for i, finding in zip(changed, fresh):
+                self.entries[keys[i]] = {
+                    "memory_key": self._memory_key(finding, memory_store),
+                    "guardrails_key": guardrails_key,
+                    "incident_key": log_state["incident_key"] if finding["platform_incident_info"] else None,
+                    "finding": finding,
+                    "decision": decide([finding])[0]
+                }
+            self.stats["analyzed"] += len(changed)
+            self._dirty = True
+        findings, decisions = self._collect(keys, set(changed), memory_store)
+
+        # Drop entries for tickets that are no longer in the inbox
+        live = set(keys)
+        if len(live) != len(self.entries):
+            self.entries = {key: entry for key, entry in self.entries.items() if key in live}
+            self._dirty = True
+        self.last_keys = keys
+        self.save()
+
+        return findings, decisions
+
+    def refresh(self, memory_store) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Re-apply memory to the tickets of the last run() without touching
+        tickets, logs or rules: after recording an outcome only findings
+        whose calibration view changed are recalibrated and re-decided.
+        """
+        with self._lock:
+            findings, decisions = self._collect(self.last_keys, set(), memory_store)
+            self.save()
+        return findings, decisions
+
+    def _collect(self, keys: List[str], fresh: set, memory_store) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Findings/decisions for `keys`, recalibrating stale memory for all
+        but the `fresh` positions and re-deciding under changed guardrails.
+        """
+        guardrails_key = _digest(get_guardrail_policy().guardrails)
+        findings, decisions = [], []
+        for i, key in enumerate(keys):
+            entry = self.entries[key]
+            if i not in fresh:
+                memory_key = self._memory_key(entry["finding"], memory_store)
+                if memory_key != entry["memory_key"]:
+                    entry["finding"] = brain.recalibrate(entry["finding"], memory_store)
+                    entry["decision"] = decide([entry["finding"]])[0]
+                    entry["memory_key"] = memory_key
+                    entry["guardrails_key"] = guardrails_key
+                    self.stats["recalibrated"] += 1
+                    self._dirty = True
+                elif entry.get("guardrails_key") != guardrails_key:
+                    entry["decision"] = decide([entry["finding"]])[0]
+                    entry["guardrails_key"] = guardrails_key
+                    self.stats["redecided"] += 1
+                    self._dirty = True
+                else:
+                    self.stats["reused"] += 1
+            findings.append(entry["finding"])
+            decisions.append(entry["decision"])
+        return findings, decisions
+
+
+def analyze_and_decide(tickets: List[Dict], logs, rules_text: str, memory_store=None,
+                       state_path: Path = ANALYSIS_STATE_FILE, **analyze_kwargs) -> Tuple[List[Dict], List[Dict]]:
+    """One incremental run against the state file (see IncrementalAnalyzer.run)."""
+    return IncrementalAnalyzer(state_path).run(tickets, logs, rules_text, memory_store=memory_store,
+                                               **analyze_kwargs)
@@ -0,0 +1,148 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+try:
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+
+DEFAULT_MODEL_NAME = 'gemini-1.5-flash'
+
+
+def prompt_digest(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class GeminiBackend:
+    """
+    Gemini over one long-lived client.
+
+    genai.configure() runs once and a single GenerativeModel is reused for
+    every request, so its underlying HTTP/gRPC connections are pooled and
+    per-ticket overhead is just the request itself.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, api_key: Optional[str] = None):
+        if not GEMINI_AVAILABLE:
+            raise RuntimeError("google-generativeai is not installed")
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY is not set")
+
+        genai.configure(api_key=api_key)
+        self.name = model_name
+        self._api_key = api_key
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        if timeout is not None:
+            response = self._model.generate_content(prompt, request_options={"timeout": timeout})
+        else:
+            response = self._model.generate_content(prompt)
+        return response.text
+
+    def warmup(self):
+        """Open the connection and validate credentials with a cheap token count."""
+        self._model.count_tokens("warmup")
+
+    def reopen(self) -> "GeminiBackend":
+        """Same model and key over a new client, for use after a fork."""
+        return GeminiBackend(self.name, self._api_key)
+
+
+class StubBackend:
+    """
+    Local stand-in model for tests and offline runs.
+
+    `response` is either a fixed result dict or a callable taking the
+    prompt and returning one; it is returned as JSON text like Gemini's.
+    """
+
+    def __init__(self, response: Union[Dict, Callable[[str], Dict]], name: str = "stub"):
+        self.name = name
+        self.response = response
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        with self._lock:
+            self.calls += 1
+        result = self.response(prompt) if callable(self.response) else self.response
+        return json.dumps(result)
+
+    def warmup(self):
+        pass
+
+    def reopen(self) -> "StubBackend":
+        # Holds no connections; a fresh lock is all a forked child needs
+        clone = StubBackend(self.response, self.name)
+        clone.calls = self.calls
+        return clone
+
+
+class ReplayBackend:
+    """
+    Serves recorded responses from a JSON Lines file of
+    {"prompt_sha256": ..., "response": ...} records.
+
+    With a `record_from` backend, prompts missing from the file are sent to
+    that backend and the response is appended, so a live run can produce a
+    replay file for tests. Without one, a missing prompt raises KeyError.
+    """
+
+    def __init__(self, path: Path, record_from=None):
+        self.path = Path(path)
+        self.record_from = record_from
+        self.name = record_from.name if record_from is not None else "replay"
+        self._responses: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._responses[record["prompt_sha256"]] = record["response"]
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        digest = prompt_digest(prompt)
+        with self._lock:
+            if digest in self._responses:
+                return self._responses[digest]
+        if self.record_from is None:
+            raise KeyError(f"No recorded response for prompt {digest[:12]}")
+
+        response = self.record_from.generate(prompt, timeout=timeout)
+        with self._lock:
+            self._responses[digest] = response
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"prompt_sha256": digest, "response": response}) + "\n")
+        return response
+
+    def warmup(self):
+        if self.record_from is not None:
+            self.record_from.warmup()
+
+    def reopen(self) -> "ReplayBackend":
+        """Re-read the replay file, reopening the recording backend if any."""
+        record_from = self.record_from.reopen() if self.record_from is not None else None
+        return ReplayBackend(self.path, record_from=record_from)
+
+
+def backend_from_env():
+    """
+    Build the backend selected by KAVACH_LLM_BACKEND ("gemini" by default,
+    "replay" reads KAVACH_LLM_REPLAY_FILE). Returns None if Gemini is
+    selected but unavailable, in which case callers use rule-based reasoning.
+    """
+    choice = os.getenv("KAVACH_LLM_BACKEND", "gemini").lower()
+    if choice == "replay":
+        return ReplayBackend(Path(os.getenv("KAVACH_LLM_REPLAY_FILE", "llm_replay.jsonl")))
+    if not GEMINI_AVAILABLE or not os.getenv("GEMINI_API_KEY"):
+        return None
+    return GeminiBackend()
@@ -0,0 +1,115 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+
+LLM_CACHE_FILE = Path(".") / "llm_cache.db"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def cache_key(model_name: str, prompt_version: str, ticket: Dict, logs: List[Dict], rules_text: str) -> str:
+    """
+    Content address for one reasoning request.
+
+    Hashes everything that can change the LLM's answer: model, prompt
+    template version, the ticket fields, the merchant's log slice and the
+    rules text. Any change yields a new key, so stale entries are never hit.
+    """
+    payload = json.dumps({
+        "model": model_name,
+        "prompt_version": prompt_version,
+        "ticket": {k: ticket.get(k) for k in ("merchant_id", "subject", "message")},
+        "logs": logs,
+        "rules": rules_text
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent on-disk cache of parsed LLM reasoning results.
+
+    Backed by SQLite so it survives observer runs and Streamlit reruns and is
+    safe to share between the threads of llm_reasoner.reason_many. Entries
+    expire after `ttl_seconds`; once more than `max_entries` are stored the
+    least recently used ones are evicted. Hit/miss counters are kept for
+    the lifetime of the object.
+    """
+
+    def __init__(self, path: Path = LLM_CACHE_FILE, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+        """)
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                metrics.incr("llm_cache_misses")
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                metrics.incr("llm_cache_misses")
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+            metrics.incr("llm_cache_hits")
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        """Drop the least recently used entries beyond max_entries."""
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            self.stats["evictions"] += excess
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
@@ -1,51 +1,69 @@
 import os
 import json
+import time
+import queue
+import threading
 from typing import Dict, List, Optional
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+import metrics
+from llm_backends import backend_from_env
+from llm_cache import LLMCache, cache_key
+from prompt_builder import (MIN_CONTEXT_TOKENS, build_context, error_signature, estimate_tokens, fit_ticket,
+                            get_token_budget)
 
-def reason(ticket: Dict, logs: List[Dict], rules_text: str) -> Optional[Dict]:
+# Bump whenever the prompt template changes so cached responses are not reused
+PROMPT_VERSION = "2"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 30.0
+# Tickets per batched prompt (KAVACH_LLM_BATCH_SIZE); 1 sends one prompt per ticket
+DEFAULT_BATCH_SIZE = 1
+
+REQUIRED_KEYS = ["hypotheses", "selected_cause", "confidence", "reasoning_chain", "evidence_logs", "evidence_docs"]
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Optional[LLMCache]:
+    """Shared on-disk response cache (disabled with KAVACH_LLM_CACHE=off)."""
+    global _cache
+    if os.getenv("KAVACH_LLM_CACHE", "on").lower() == "off":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+    return _cache
+
+
+def get_batch_size() -> int:
+    return max(1, int(os.getenv("KAVACH_LLM_BATCH_SIZE", DEFAULT_BATCH_SIZE)))
+
+
+def build_prompt(ticket: Dict, logs: List[Dict], rules_text: str, token_budget: Optional[int] = None) -> str:
     """
-    LLM-powered reasoning that generates multiple hypotheses and selects the most likely root cause.
-    
-    Args:
-        ticket: Dictionary with merchant_id, subject, message
-        logs: List of log entries for this merchant
-        rules_text: Migration guide rules
-    
-    Returns:
-        Dictionary with:
-        - hypotheses: List of possible causes
-        - selected_cause: Most likely root cause
-        - confidence: 0-1 confidence score
-        - reasoning_chain: Step-by-step logic
-        - evidence_logs: Relevant log entries
-        - evidence_docs: Matching rules from docs
+    Prompt asking the model for hypotheses and a root cause for one ticket.
+
+    Logs are collapsed into per-message counts, only the relevant rules
+    are included and long ticket text, rules and log messages are
+    truncated, so the prompt stays within `token_budget` estimated tokens
+    (KAVACH_LLM_TOKEN_BUDGET by default) however noisy the merchant. The
+    fixed instructions are the one floor: a budget below them can't be met.
     """
-    
-    if not GEMINI_AVAILABLE:
-        return None
-    
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return None
-    
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Prepare context
-        merchant_id = ticket["merchant_id"]
-        issue = ticket["subject"]
-        message = ticket["message"]
-        
-        logs_text = json.dumps(logs, indent=2)
-        
-        prompt = f"""You are an expert AI systems engineer diagnosing headless commerce migration issues.
+    if token_budget is None:
+        token_budget = get_token_budget()
+
+    template = estimate_tokens(_render_prompt(dict(ticket, subject="", message=""), "", ""))
+    ticket = fit_ticket(ticket, token_budget - template - MIN_CONTEXT_TOKENS)
+    skeleton = _render_prompt(ticket, "", "")
+    logs_text, rules_text = build_context(logs, rules_text, token_budget - estimate_tokens(skeleton))
+    return _render_prompt(ticket, logs_text, rules_text)
+
+
+def _render_prompt(ticket: Dict, logs_text: str, rules_text: str) -> str:
+    merchant_id = ticket["merchant_id"]
+    issue = ticket["subject"]
+    message = ticket["message"]
+
+    return f"""You are an expert AI systems engineer diagnosing headless commerce migration issues.
 
 MERCHANT: {merchant_id}
 ISSUE: {issue}
@@ -83,31 +101,493 @@ Respond in JSON format:
 
 Be precise and evidence-based. Only high confidence (>0.8) if evidence is strong and clear."""
 
-        response = model.generate_content(prompt)
-        
-        # Parse JSON response
-        response_text = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        
-        result = json.loads(response_text.strip())
-        
-        # Validate structure
-        required_keys = ["hypotheses", "selected_cause", "confidence", "reasoning_chain", "evidence_logs", "evidence_docs"]
-        if not all(key in result for key in required_keys):
-            return None
-        
-        # Ensure confidence is in valid range
-        result["confidence"] = max(0.0, min(1.0, float(result["confidence"])))
-        
-        return result
-        
-    except Exception as e:
-        print(f"LLM reasoning failed: {e}")
+
+def build_batch_prompt(tickets: List[Dict], logs: List[Dict], rules_text: str,
+                       token_budget: Optional[int] = None) -> str:
+    """
+    One prompt covering several tickets whose merchants share an error
+    signature. The combined logs and rules are included once and the model
+    answers per ticket ID ("T1", "T2", ... in ticket order). Ticket text
+    is truncated like build_prompt's, each ticket getting an equal share.
+    """
+    if token_budget is None:
+        token_budget = get_token_budget()
+
+    def render_tickets(tickets):
+        return "\n".join(
+            f"[T{n}] MERCHANT: {ticket['merchant_id']} | ISSUE: {ticket['subject']} | DESCRIPTION: {ticket['message']}"
+            for n, ticket in enumerate(tickets, 1)
+        )
+
+    empty = render_tickets([dict(ticket, subject="", message="") for ticket in tickets])
+    template = estimate_tokens(_render_batch_prompt(len(tickets), empty, "", ""))
+    share = (token_budget - template - MIN_CONTEXT_TOKENS) // max(1, len(tickets))
+    ticket_lines = render_tickets([fit_ticket(ticket, share) for ticket in tickets])
+    skeleton = _render_batch_prompt(len(tickets), ticket_lines, "", "")
+    logs_text, rules_text = build_context(logs, rules_text, token_budget - estimate_tokens(skeleton))
+    return _render_batch_prompt(len(tickets), ticket_lines, logs_text, rules_text)
+
+
+def _render_batch_prompt(n_tickets: int, ticket_lines: str, logs_text: str, rules_text: str) -> str:
+    return f"""You are an expert AI systems engineer diagnosing headless commerce migration issues.
+
+The {n_tickets} tickets below come from merchants whose logs show the same errors, so they
+may share a root cause. Diagnose each ticket on its own evidence.
+
+TICKETS:
+{ticket_lines}
+
+RELEVANT LOGS (all merchants above combined):
+{logs_text}
+
+MIGRATION RULES:
+{rules_text}
+
+Your task, for every ticket:
+1. Generate 3-5 possible hypotheses for the root cause
+2. Analyze evidence from logs and rules for each hypothesis
+3. Select the most likely root cause
+4. Assign a confidence score (0.0 to 1.0)
+5. Explain your reasoning step-by-step
+
+Respond in JSON format, with exactly one entry per ticket ID:
+{{
+  "results": [
+    {{
+      "ticket_id": "T1",
+      "hypotheses": [
+        {{"cause": "description", "evidence": "what supports this"}},
+        ...
+      ],
+      "selected_cause": "most likely root cause",
+      "confidence": 0.0-1.0,
+      "reasoning_chain": [
+        "Step 1: ...",
+        ...
+      ],
+      "evidence_logs": ["relevant log messages"],
+      "evidence_docs": ["relevant rule numbers or descriptions"]
+    }},
+    ...
+  ]
+}}
+
+Be precise and evidence-based. Only high confidence (>0.8) if evidence is strong and clear."""
+
+
+def strip_code_fence(response_text: str) -> str:
+    """Remove markdown code blocks if present"""
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    return response_text.strip()
+
+
+def validate_result(result) -> Optional[Dict]:
+    """Check a parsed result has every required key and clamp its confidence."""
+    if not isinstance(result, dict) or not all(key in result for key in REQUIRED_KEYS):
         return None
+
+    # Ensure confidence is in valid range
+    result["confidence"] = max(0.0, min(1.0, float(result["confidence"])))
+    return result
+
+
+def parse_response(response_text: str) -> Optional[Dict]:
+    """Parse and validate the model's JSON answer for a single ticket."""
+    return validate_result(json.loads(strip_code_fence(response_text)))
+
+
+def parse_batch_response(response_text: str, n_tickets: int) -> List[Optional[Dict]]:
+    """
+    Split a batched answer back into per-ticket results, in ticket order.
+
+    Each entry is validated on its own; entries that are missing, invalid or
+    carry an unknown/duplicate ticket_id come back as None.
+    """
+    data = json.loads(strip_code_fence(response_text))
+    entries = data.get("results", []) if isinstance(data, dict) else []
+
+    results: List[Optional[Dict]] = [None] * n_tickets
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        ticket_id = str(entry.pop("ticket_id", ""))
+        if not ticket_id.startswith("T") or not ticket_id[1:].isdigit():
+            continue
+        n = int(ticket_id[1:]) - 1
+        if 0 <= n < n_tickets and results[n] is None:
+            try:
+                results[n] = validate_result(entry)
+            except (TypeError, ValueError):
+                pass
+    return results
+
+
+def group_by_signature(tickets: List[Dict], logs_by_merchant: Dict[str, List[Dict]],
+                       batch_size: int) -> List[List[int]]:
+    """
+    Partition ticket indexes into batches of at most `batch_size` whose
+    merchants share an error signature. Batches are ordered by their first
+    ticket; tickets with no logs are never batched.
+    """
+    groups: Dict[tuple, List[List[int]]] = {}
+    batches: List[List[int]] = []
+    for i, ticket in enumerate(tickets):
+        signature = error_signature(logs_by_merchant.get(ticket["merchant_id"], []))
+        if not signature or batch_size <= 1:
+            batches.append([i])
+            continue
+        open_batches = groups.setdefault(signature, [])
+        if not open_batches or len(open_batches[-1]) >= batch_size:
+            open_batches.append([])
+            batches.append(open_batches[-1])
+        open_batches[-1].append(i)
+    return batches
+
+
+class Reasoner:
+    """
+    Long-lived LLM reasoner.
+
+    Owns one configured backend (Gemini, a local StubBackend or a
+    ReplayBackend for tests) plus the response cache, so per-ticket overhead
+    is just the request. With no backend available every call returns None
+    and callers fall back to rule-based reasoning.
+    """
+
+    def __init__(self, backend=None, use_cache: bool = True, cache: Optional[LLMCache] = None,
+                 token_budget: Optional[int] = None, batch_size: Optional[int] = None):
+        self.backend = backend if backend is not None else backend_from_env()
+        self.token_budget = token_budget if token_budget is not None else get_token_budget()
+        self.batch_size = batch_size if batch_size is not None else get_batch_size()
+        if cache is None and use_cache and self.backend is not None:
+            cache = get_cache()
+        self.cache = cache
+
+    @property
+    def available(self) -> bool:
+        return self.backend is not None
+
+    def warmup(self):
+        """Establish the backend connection ahead of the first ticket."""
+        if self.backend is not None:
+            self.backend.warmup()
+
+    def reopen(self) -> "Reasoner":
+        """
+        Same backend config, token budget and batch size over a new client
+        and cache connection, for a forked child that inherited this one.
+        """
+        backend = self.backend.reopen() if self.backend is not None else None
+        cache = LLMCache(self.cache.path, self.cache.ttl_seconds, self.cache.max_entries) \
+            if self.cache is not None else None
+        return Reasoner(backend, use_cache=False, cache=cache,
+                        token_budget=self.token_budget, batch_size=self.batch_size)
+
+    def _cache_key(self, ticket: Dict, logs: List[Dict], rules_text: str) -> str:
+        return cache_key(self.backend.name, f"{PROMPT_VERSION}:{self.token_budget}", ticket, logs, rules_text)
+
+    @metrics.timed("llm_reason")
+    def reason(self, ticket: Dict, logs: List[Dict], rules_text: str,
+               timeout: Optional[float] = None, use_cache: bool = True) -> Optional[Dict]:
+        """
+        LLM-powered reasoning that generates multiple hypotheses and selects the most likely root cause.
+
+        Args:
+            ticket: Dictionary with merchant_id, subject, message
+            logs: List of log entries for this merchant
+            rules_text: Migration guide rules
+            timeout: Per-request timeout in seconds passed to the backend
+            use_cache: Serve/store results in the on-disk response cache
+
+        Returns:
+            Dictionary with:
+            - hypotheses: List of possible causes
+            - selected_cause: Most likely root cause
+            - confidence: 0-1 confidence score
+            - reasoning_chain: Step-by-step logic
+            - evidence_logs: Relevant log entries
+            - evidence_docs: Matching rules from docs
+        """
+        if self.backend is None:
+            return None
+
+        # Unchanged ticket + logs + rules: reuse the previous answer, no API call
+        cache = self.cache if use_cache else None
+        if cache is not None:
+            cached = cache.get(self._cache_key(ticket, logs, rules_text))
+            if cached is not None:
+                return cached
+
+        return self._generate(ticket, logs, rules_text, timeout, cache)
+
+    def _request(self, prompt: str, timeout: Optional[float]) -> str:
+        """One backend call, timed and counted with estimated prompt/response tokens."""
+        metrics.incr("llm_requests")
+        metrics.incr("llm_prompt_tokens", estimate_tokens(prompt))
+        with metrics.timer("llm_request"):
+            text = self.backend.generate(prompt, timeout=timeout)
+        metrics.incr("llm_response_tokens", estimate_tokens(text))
+        return text
+
+    def _generate(self, ticket: Dict, logs: List[Dict], rules_text: str,
+                  timeout: Optional[float], cache: Optional[LLMCache]) -> Optional[Dict]:
+        """One single-ticket request, bypassing the cache lookup."""
+        try:
+            prompt = build_prompt(ticket, logs, rules_text, token_budget=self.token_budget)
+            result = parse_response(self._request(prompt, timeout))
+            if result is None:
+                return None
+
+            if cache is not None:
+                cache.put(self._cache_key(ticket, logs, rules_text), result)
+
+            return result
+
+        except Exception as e:
+            print(f"LLM reasoning failed: {e}")
+            return None
+
+    def _generate_batch(self, tickets: List[Dict], logs_by_merchant: Dict[str, List[Dict]], rules_text: str,
+                        timeout: Optional[float], cache: Optional[LLMCache]) -> List[Optional[Dict]]:
+        """
+        One batched request for tickets sharing an error signature. Tickets
+        the response does not answer validly come back as None.
+        """
+        try:
+            combined_logs = [log for merchant_id in dict.fromkeys(t["merchant_id"] for t in tickets)
+                             for log in logs_by_merchant.get(merchant_id, [])]
+            prompt = build_batch_prompt(tickets, combined_logs, rules_text, token_budget=self.token_budget)
+            results = parse_batch_response(self._request(prompt, timeout), len(tickets))
+        except Exception as e:
+            print(f"LLM batch reasoning failed: {e}")
+            return [None] * len(tickets)
+
+        if cache is not None:
+            for ticket, result in zip(tickets, results):
+                if result is not None:
+                    cache.put(self._cache_key(ticket, logs_by_merchant.get(ticket["merchant_id"], []), rules_text),
+                              result)
+        return results
+
+    def reason_many(self, tickets: List[Dict], logs_by_merchant: Dict[str, List[Dict]], rules_text: str,
+                    max_concurrency: int = DEFAULT_CONCURRENCY,
+                    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                    use_cache: bool = True,
+                    batch_size: Optional[int] = None,
+                    batch_timeout: Optional[float] = None) -> List[Optional[Dict]]:
+        """
+        Runs reason() for a batch of tickets on a bounded thread pool.
+
+        Args:
+            tickets: Tickets to reason about
+            logs_by_merchant: Merchant ID -> that merchant's log entries
+            rules_text: Migration guide rules
+            max_concurrency: Maximum number of LLM calls in flight at once
+            timeout: Per-call limit in seconds, counted from when the call
+                starts running; a call still running after it is abandoned
+                and its worker replaced, so queued calls are not held up
+            use_cache: Serve/store results in the on-disk response cache
+            batch_size: Tickets per prompt (defaults to self.batch_size). Above
+                1, uncached tickets whose merchants share an error signature
+                are sent together, and any ticket the batched answer leaves
+                out or gets wrong is retried on its own.
+            batch_timeout: Optional limit in seconds for the whole batch,
+                counted from submission; calls still running or queued when
+                it passes are abandoned
+
+        Returns:
+            One result per ticket, in ticket order. Calls that fail or exceed a
+            timeout yield None, so callers fall back to rule-based reasoning.
+            Wall-clock time scales with the number of prompts / max_concurrency,
+            and a backend that hangs costs at most `timeout` per call.
+        """
+        results: List[Optional[Dict]] = [None] * len(tickets)
+        if not tickets or self.backend is None:
+            return results
+
+        if batch_size is None:
+            batch_size = self.batch_size
+        cache = self.cache if use_cache else None
+
+        def logs_for(i: int) -> List[Dict]:
+            return logs_by_merchant.get(tickets[i]["merchant_id"], [])
+
+        # Cached tickets are answered up front so they never take a batch slot
+        uncached = []
+        for i in range(len(tickets)):
+            cached = cache.get(self._cache_key(tickets[i], logs_for(i), rules_text)) if cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                uncached.append(i)
+        if not uncached:
+            return results
+
+        by_position = group_by_signature([tickets[i] for i in uncached],
+                                         {tickets[i]["merchant_id"]: logs_for(i) for i in uncached},
+                                         batch_size)
+        jobs = [[uncached[p] for p in batch] for batch in by_position]
+
+        batch_deadline = time.monotonic() + batch_timeout if batch_timeout is not None else None
+        lock = threading.Lock()
+        pending = set(range(len(jobs)))   # neither answered nor abandoned yet
+        started: Dict[int, float] = {}    # job -> when a worker began running it
+        abandoned = set()                 # jobs given up on while running
+        timed_out: List[int] = []         # ticket indexes
+        batch_expired = False
+        work: "queue.Queue" = queue.Queue()
+        done: "queue.Queue" = queue.Queue()
+
+        def run(job_id: int) -> List[Optional[Dict]]:
+            job = jobs[job_id]
+            # One llm_reason sample per prompt, as Reasoner.reason records per ticket
+            with metrics.timer("llm_reason"):
+                if len(job) == 1:
+                    return [self._generate(tickets[job[0]], logs_for(job[0]), rules_text, timeout, cache)]
+                return self._generate_batch([tickets[i] for i in job], logs_by_merchant, rules_text, timeout, cache)
+
+        def worker():
+            while True:
+                job_id = work.get()
+                if job_id is None:
+                    return
+                with lock:
+                    if job_id not in pending:
+                        continue  # abandoned while still queued
+                    started[job_id] = time.monotonic()
+                try:
+                    done.put((job_id, run(job_id), None))
+                except Exception as e:
+                    done.put((job_id, None, e))
+                with lock:
+                    if job_id in abandoned:
+                        return  # a replacement worker already took this one's place
+
+        # Daemon threads: a call that never returns must not keep the process alive
+        workers: List[threading.Thread] = []
+
+        def spawn_worker():
+            thread = threading.Thread(target=worker, name="llm-reason", daemon=True)
+            thread.start()
+            workers.append(thread)
+
+        for _ in range(max(1, min(max_concurrency, len(jobs)))):
+            spawn_worker()
+        for job_id in range(len(jobs)):
+            work.put(job_id)
+
+        try:
+            while pending:
+                now = time.monotonic()
+                with lock:
+                    if batch_deadline is not None and now >= batch_deadline:
+                        expired = sorted(pending)
+                        batch_expired = True
+                    else:
+                        expired = [job_id for job_id, t in started.items()
+                                   if job_id in pending and now - t >= timeout]
+                    running = [job_id for job_id in expired if job_id in started]
+                    pending.difference_update(expired)
+                    abandoned.update(running)
+                    wake = min([started[job_id] + timeout for job_id in pending if job_id in started]
+                               + [now + timeout])
+                for job_id in expired:
+                    timed_out.extend(jobs[job_id])
+                if not pending:
+                    break
+                # A timed-out call keeps its thread; replace it so queued jobs still get max_concurrency
+                for _ in running:
+                    spawn_worker()
+
+                if batch_deadline is not None:
+                    wake = min(wake, batch_deadline)
+                try:
+                    job_id, job_results, error = done.get(timeout=max(0.0, wake - now))
+                except queue.Empty:
+                    continue
+                with lock:
+                    if job_id not in pending:
+                        continue  # answered after it was abandoned
+                    pending.discard(job_id)
+                job = jobs[job_id]
+                if error is not None:
+                    print(f"LLM reasoning failed: {error}")
+                    job_results = [None] * len(job)
+                for i, result in zip(job, job_results):
+                    results[i] = result
+
+                # Retry tickets a batched answer did not cover, one prompt each
+                if len(job) > 1:
+                    for i in job:
+                        if results[i] is None:
+                            with lock:
+                                jobs.append([i])
+                                pending.add(len(jobs) - 1)
+                            work.put(len(jobs) - 1)
+        finally:
+            # Idle workers exit; busy ones exit once their abandoned call returns
+            for _ in workers:
+                work.put(None)
+
+        if timed_out:
+            merchants = ", ".join(tickets[i]["merchant_id"] for i in timed_out[:5])
+            more = f" and {len(timed_out) - 5} more" if len(timed_out) > 5 else ""
+            limit = f"the {batch_timeout}s batch limit" if batch_expired else f"{timeout}s per call"
+            print(f"LLM reasoning timed out for {len(timed_out)} ticket(s) ({merchants}{more}) after {limit}")
+        return results
+
+
+_default_reasoner: Optional[Reasoner] = None
+_reasoner_lock = threading.Lock()
+
+def get_reasoner() -> Reasoner:
+    """Process-wide Reasoner, built from the environment on first use."""
+    global _default_reasoner
+    with _reasoner_lock:
+        if _default_reasoner is None:
+            _default_reasoner = Reasoner()
+    return _default_reasoner
+
+
+def set_reasoner(reasoner: Optional[Reasoner]):
+    """Replace the process-wide Reasoner (None rebuilds it from the environment)."""
+    global _default_reasoner
+    with _reasoner_lock:
+        _default_reasoner = reasoner
+
+
+def reset_after_fork():
+    """
+    Drop the process-wide Reasoner and cache in a forked child so it opens
+    its own LLM client and SQLite connection instead of sharing the parent's.
+    """
+    global _default_reasoner, _cache, _reasoner_lock, _cache_lock
+    _reasoner_lock = threading.Lock()
+    _cache_lock = threading.Lock()
+    _default_reasoner = None
+    _cache = None
+
+
+def reason(ticket: Dict, logs: List[Dict], rules_text: str,
+           timeout: Optional[float] = None, use_cache: bool = True) -> Optional[Dict]:
+    """Reason about one ticket with the process-wide Reasoner (see Reasoner.reason)."""
+    return get_reasoner().reason(ticket, logs, rules_text, timeout=timeout, use_cache=use_cache)
+
+
+def reason_many(tickets: List[Dict], logs_by_merchant: Dict[str, List[Dict]], rules_text: str,
+                max_concurrency: int = DEFAULT_CONCURRENCY,
+                timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                use_cache: bool = True,
+                batch_size: Optional[int] = None,
+                batch_timeout: Optional[float] = None) -> List[Optional[Dict]]:
+    """Reason about a batch with the process-wide Reasoner (see Reasoner.reason_many)."""
+    return get_reasoner().reason_many(tickets, logs_by_merchant, rules_text,
+                                      max_concurrency=max_concurrency, timeout=timeout,
+                                      use_cache=use_cache, batch_size=batch_size,
+                                      batch_timeout=batch_timeout)
@@ -0,0 +1,257 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from collections import defaultdict
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Timestamp column value for log lines whose timestamp could not be parsed
+MISSING_TIMESTAMP = -(1 << 63)
+
+
+@lru_cache(maxsize=65536)
+def _parse_minute(prefix: str, tz: str) -> int:
+    """Epoch minute for a 'YYYY-MM-DDTHH:MM' prefix plus optional UTC offset (naive = UTC)."""
+    timestamp = datetime.fromisoformat(prefix + tz)
+    if timestamp.tzinfo is None:
+        return int((timestamp - _EPOCH).total_seconds()) // 60
+    return int((timestamp - _EPOCH_UTC).total_seconds()) // 60
+
+
+def minute_bucket(timestamp: str) -> Optional[int]:
+    """
+    Epoch-minute bucket for an ISO timestamp, or None if it cannot be parsed.
+
+    Seconds are dropped before parsing, so every log line in the same minute
+    shares one cached datetime parse instead of building its own.
+    """
+    try:
+        if len(timestamp) <= 19:
+            # No fractional seconds or UTC offset: the common case
+            return _parse_minute(timestamp[:16], "")
+        prefix, rest = timestamp[:16], timestamp[16:]
+        tz = ""
+        for i, ch in enumerate(rest):
+            if ch == "Z":
+                tz = "+00:00"
+                break
+            if ch in "+-":
+                tz = rest[i:]
+                break
+        return _parse_minute(prefix, tz)
+    except Exception:
+        return None
+
+
+def epoch_seconds(timestamp: str) -> Optional[int]:
+    """Epoch seconds (naive = UTC) for an ISO timestamp, or None if it cannot be parsed."""
+    minute = minute_bucket(timestamp)
+    if minute is None:
+        return None
+    seconds = timestamp[17:19]
+    return minute * 60 + (int(seconds) if seconds.isdigit() else 0)
+
+
+class LogIndex:
+    """
+    One-pass index over API log entries.
+
+    Groups logs by merchant_id, error_code and (optionally) minute time
+    bucket so that per-ticket lookups cost O(merchant logs) instead of
+    O(all logs). Original log order is preserved inside every group.
+    """
+
+    def __init__(self, logs: Iterable[Dict], bucket_by_time: bool = False):
+        self.logs: List[Dict] = []
+        self.by_merchant: Dict[str, List[Dict]] = defaultdict(list)
+        self.by_error_code: Dict[int, List[Dict]] = defaultdict(list)
+        self.by_time_bucket: Optional[Dict[datetime, List[Dict]]] = defaultdict(list) if bucket_by_time else None
+
+        for log in logs:
+            self.add(log)
+
+    def add(self, log: Dict):
+        """Add a single log entry to every index."""
+        self.logs.append(log)
+        self.by_merchant[log.get("merchant_id", "unknown")].append(log)
+        self.by_error_code[log.get("error_code", 0)].append(log)
+
+        if self.by_time_bucket is not None:
+            try:
+                timestamp = datetime.fromisoformat(log["timestamp"].replace("Z", "+00:00"))
+            except Exception:
+                return
+            self.by_time_bucket[timestamp.replace(second=0, microsecond=0)].append(log)
+
+    def merchant_logs(self, merchant_id: str) -> List[Dict]:
+        """All logs for a merchant, in original order (empty list if none)."""
+        return self.by_merchant.get(merchant_id, [])
+
+    def error_logs(self, error_code: int) -> List[Dict]:
+        """All logs with the given error code, in original order."""
+        return self.by_error_code.get(error_code, [])
+
+    def merchants(self) -> List[str]:
+        return list(self.by_merchant.keys())
+
+    def __len__(self) -> int:
+        return len(self.logs)
+
+    def __iter__(self):
+        return iter(self.logs)
+
+
+class LogTable:
+    """
+    Columnar, memory-compact log store.
+
+    Merchant IDs and messages are interned into lookup lists and stored as
+    integer codes; error codes and epoch-second timestamps live in typed
+    arrays. A million log lines cost a few bytes per column per row instead
+    of a four-key dict each. Exposes the same merchant_logs() query surface
+    as LogIndex, so brain.analyze, incident_detector and the LLM prompt
+    builder accept either; rows are only materialized as dicts on demand.
+
+    Timestamps are normalized to naive UTC at second precision.
+    """
+
+    def __init__(self, logs: Iterable[Dict] = ()):
+        self.merchant_ids: List[str] = []
+        self.messages: List[str] = []
+        self._merchant_codes: Dict[str, int] = {}
+        self._message_codes: Dict[str, int] = {}
+
+        self.merchant = array("I")
+        self.message = array("I")
+        self.error_code = array("i")
+        self.timestamp = array("q")
+
+        self._merchant_rows: Optional[Dict[int, array]] = None
+
+        for log in logs:
+            self.append(log)
+
+    @staticmethod
+    def _intern(value: str, codes: Dict[str, int], values: List[str]) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, log: Dict):
+        """Add one log entry (a dict in the api_activity.json shape)."""
+        seconds = epoch_seconds(log.get("timestamp", ""))
+        merchant = self._intern(log.get("merchant_id", "unknown"), self._merchant_codes, self.merchant_ids)
+        self.merchant.append(merchant)
+        self.message.append(self._intern(log.get("message", ""), self._message_codes, self.messages))
+        self.error_code.append(log.get("error_code", 0))
+        self.timestamp.append(MISSING_TIMESTAMP if seconds is None else seconds)
+        # Keep an already-built merchant index current so a live table never rebuilds it
+        if self._merchant_rows is not None:
+            self._merchant_rows[merchant].append(len(self.merchant) - 1)
+
+    def __len__(self) -> int:
+        return len(self.merchant)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def row(self, i: int) -> Dict:
+        """Materialize one row as a log dict."""
+        seconds = self.timestamp[i]
+        return {
+            "merchant_id": self.merchant_ids[self.merchant[i]],
+            "timestamp": (_EPOCH + timedelta(seconds=seconds)).isoformat() if seconds != MISSING_TIMESTAMP else "",
+            "error_code": self.error_code[i],
+            "message": self.messages[self.message[i]]
+        }
+
+    def rows(self, indices: Iterable[int]) -> List[Dict]:
+        return [self.row(i) for i in indices]
+
+    def merchant_code(self, merchant_id: str) -> Optional[int]:
+        return self._merchant_codes.get(merchant_id)
+
+    def merchant_rows(self, merchant_id: str) -> array:
+        """Row numbers for a merchant, from a per-merchant index built in one pass on first use."""
+        if self._merchant_rows is None:
+            self._merchant_rows = defaultdict(lambda: array("I"))
+            for i, code in enumerate(self.merchant):
+                self._merchant_rows[code].append(i)
+        code = self.merchant_code(merchant_id)
+        if code is None:
+            return array("I")
+        return self._merchant_rows.get(code, array("I"))
+
+    def merchant_logs(self, merchant_id: str) -> List[Dict]:
+        """All logs for a merchant as dicts, in original order."""
+        return self.rows(self.merchant_rows(merchant_id))
+
+    def merchants(self) -> List[str]:
+        return list(self.merchant_ids)
+
+    def select(self, merchant_id: Optional[str] = None, min_error_code: Optional[int] = None,
+               start: Optional[int] = None, end: Optional[int] = None) -> List[int]:
+        """
+        Row numbers matching every given filter (times are epoch seconds, [start, end)).
+
+        Vectorized with NumPy when it is installed; otherwise a merchant filter
+        narrows the scan to that merchant's rows via the per-merchant index.
+        """
+        merchant = None
+        if merchant_id is not None:
+            merchant = self.merchant_code(merchant_id)
+            if merchant is None:
+                return []
+
+        if NUMPY_AVAILABLE:
+            mask = np.ones(len(self), dtype=bool)
+            if merchant is not None:
+                mask &= np.frombuffer(self.merchant, dtype=np.uint32) == merchant
+            if min_error_code is not None:
+                mask &= np.frombuffer(self.error_code, dtype=np.int32) >= min_error_code
+            if start is not None or end is not None:
+                timestamps = np.frombuffer(self.timestamp, dtype=np.int64)
+                mask &= timestamps != MISSING_TIMESTAMP
+                if start is not None:
+                    mask &= timestamps >= start
+                if end is not None:
+                    mask &= timestamps < end
+            return np.flatnonzero(mask).tolist()
+
+        selected = []
+        for i in (self.merchant_rows(merchant_id) if merchant is not None else range(len(self))):
+            if min_error_code is not None and self.error_code[i] < min_error_code:
+                continue
+            if start is not None or end is not None:
+                seconds = self.timestamp[i]
+                if seconds == MISSING_TIMESTAMP:
+                    continue
+                if start is not None and seconds < start:
+                    continue
+                if end is not None and seconds >= end:
+                    continue
+            selected.append(i)
+        return selected
+
+    def nbytes(self) -> int:
+        """Approximate size of the column arrays (excluding the interned strings)."""
+        return sum(column.itemsize * len(column)
+                   for column in (self.merchant, self.message, self.error_code, self.timestamp))
+
+
+def ensure_index(logs):
+    """Return logs as a LogIndex (or LogTable), building an index if a plain list was passed."""
+    if isinstance(logs, (LogIndex, LogTable)):
+        return logs
+    return LogIndex(logs)
@@ -0,0 +1,455 @@
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+class _FileLock:
+    """Exclusive advisory lock on a sidecar file (no-op where fcntl is unavailable)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, "a")
+        if FCNTL_AVAILABLE:
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if FCNTL_AVAILABLE:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+        self._fh = None
+
+
+def _write_json_atomic(path: Path, data: Dict, indent=None):
+    """Write JSON to a temp file, fsync it and rename it over the target."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_memory_json(path: Path) -> Dict:
+    """Read a memory.json style file, returning an empty memory on any error."""
+    if not path.exists():
+        return {"actions": []}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {"actions": []}
+
+
+class JsonMemoryBackend:
+    """
+    Legacy backend: the whole memory lives in one pretty-printed memory.json.
+
+    Every append rewrites the full file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._memory: Dict = {"actions": []}
+
+    def load(self) -> Dict:
+        self._memory = read_memory_json(self.path)
+        self._memory.setdefault("actions", [])
+        return {"actions": list(self._memory["actions"])}
+
+    def append(self, action: Dict):
+        self.append_many([action])
+
+    def append_many(self, actions: List[Dict]):
+        """Append several actions with a single rewrite of the file."""
+        self._memory["actions"].extend(actions)
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self._memory, indent=2, fp=f)
+        except Exception as e:
+            print(f"Failed to save memory: {e}")
+
+
+class JournalMemoryBackend:
+    """
+    Append-only JSON Lines journal of action outcomes plus a compacted snapshot.
+
+    Layout:
+        snapshot  - {"generation": g, "actions": [...]}, replaced atomically
+        journal   - header line {"journal_generation": g}, then one action per line
+
+    Appends take an exclusive lock, write a single line and fsync, so
+    concurrent approvals never lose updates. Once the journal holds
+    `compact_every` entries, whichever process appends next folds it into a
+    new snapshot. A journal whose generation is older
+    than the snapshot was already compacted and is ignored on load, which
+    keeps a crash between the two compaction steps from double-counting.
+    A torn final line left by a crash mid-append is dropped on load.
+    Before appending, a writer replays the journal if it has not read it
+    yet, the snapshot changed or the last line is torn, so new entries never
+    land after a torn line or in a journal a compaction left behind.
+
+    memory.json stays the import/export format: if no snapshot exists yet,
+    `import_path` seeds the store, and export_json() writes it back out.
+    """
+
+    def __init__(self, journal_path: Path, snapshot_path: Path, import_path: Path = None,
+                 compact_every: int = 1000):
+        self.journal_path = Path(journal_path)
+        self.snapshot_path = Path(snapshot_path)
+        self.import_path = Path(import_path) if import_path else None
+        self.lock_path = self.journal_path.with_name(self.journal_path.name + ".lock")
+        self.compact_every = compact_every
+        # (inode, byte offset, entries before it) of the journal as last counted
+        self._journal_count = None
+        # (inode, mtime) of the snapshot as last read
+        self._snapshot_stat = None
+
+    @staticmethod
+    def _stat_key(path: Path):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _torn_tail(self) -> bool:
+        """Whether the journal's last line is missing its newline (a crash mid-append)."""
+        with open(self.journal_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def _read_snapshot(self) -> Dict:
+        self._snapshot_stat = self._stat_key(self.snapshot_path)
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            return {"generation": snapshot.get("generation", 0), "actions": snapshot.get("actions", [])}
+        if self.import_path is not None:
+            return {"generation": 0, "actions": read_memory_json(self.import_path).get("actions", [])}
+        return {"generation": 0, "actions": []}
+
+    def _read_journal(self, generation: int) -> List[Dict]:
+        """Replay journal entries for `generation`, truncating a torn tail if found."""
+        if not self.journal_path.exists():
+            return []
+
+        actions = []
+        journal_generation = 0
+        good_offset = 0
+        lines = 0
+        torn = False
+
+        with open(self.journal_path, "rb") as f:
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    torn = True
+                    break
+                try:
+                    entry = json.loads(raw_line)
+                except ValueError:
+                    torn = True
+                    break
+                good_offset += len(raw_line)
+                lines += 1
+
+                if "journal_generation" in entry:
+                    journal_generation = entry["journal_generation"]
+                else:
+                    actions.append(entry)
+
+        if torn:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_offset)
+        self._journal_count = (self.journal_path.stat().st_ino, good_offset, max(lines - 1, 0))
+
+        if journal_generation < generation:
+            # Already folded into the snapshot by an interrupted compaction: finish it
+            self._reset_journal(generation)
+            return []
+        return actions
+
+    def _load_locked(self) -> Dict:
+        snapshot = self._read_snapshot()
+        actions = snapshot["actions"] + self._read_journal(snapshot["generation"])
+        return {"generation": snapshot["generation"], "actions": actions}
+
+    def load(self) -> Dict:
+        with _FileLock(self.lock_path):
+            state = self._load_locked()
+        return {"actions": state["actions"]}
+
+    def append(self, action: Dict):
+        self.append_many([action])
+
+    def append_many(self, actions: List[Dict]):
+        """Append several actions under one lock with a single write and fsync."""
+        if not actions:
+            return
+        lines = "".join(json.dumps(action) + "\n" for action in actions)
+        with _FileLock(self.lock_path):
+            if self.journal_path.exists() and (
+                    self._journal_count is None
+                    or self._snapshot_stat != self._stat_key(self.snapshot_path)
+                    or self._torn_tail()):
+                self._load_locked()
+            if not self.journal_path.exists():
+                generation = self._read_snapshot()["generation"]
+                with open(self.journal_path, "w") as f:
+                    f.write(json.dumps({"journal_generation": generation}) + "\n")
+            with open(self.journal_path, "a") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            entries = self._journal_entries()
+
+        if self.compact_every and entries >= self.compact_every:
+            self.compact()
+
+    def _journal_entries(self) -> int:
+        """
+        Entries in the journal, by any process, reading only the bytes
+        appended since this instance last counted. Call with the lock held.
+        """
+        stat = self.journal_path.stat()
+        if self._journal_count is None or self._journal_count[0] != stat.st_ino \
+                or self._journal_count[1] > stat.st_size:
+            # First count, or the journal was replaced by a compaction: skip the header line
+            offset, entries = 0, -1
+        else:
+            _, offset, entries = self._journal_count
+
+        with open(self.journal_path, "rb") as f:
+            f.seek(offset)
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                entries += chunk.count(b"\n")
+        self._journal_count = (stat.st_ino, stat.st_size, max(entries, 0))
+        return self._journal_count[2]
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal."""
+        with _FileLock(self.lock_path):
+            state = self._load_locked()
+            generation = state["generation"] + 1
+
+            # Step 1: the snapshot now covers everything; the old journal is stale
+            _write_json_atomic(self.snapshot_path, {"generation": generation, "actions": state["actions"]})
+
+            self._snapshot_stat = self._stat_key(self.snapshot_path)
+
+            # Step 2: start a fresh journal for the new generation
+            self._reset_journal(generation)
+
+    def _reset_journal(self, generation: int):
+        """Atomically replace the journal with an empty one for `generation`. Call with the lock held."""
+        tmp_path = self.journal_path.with_name(self.journal_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"journal_generation": generation}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._journal_count = None
+
+    def export_json(self, path: Path):
+        """Export the full memory in the legacy memory.json format."""
+        _write_json_atomic(Path(path), self.load(), indent=2)
+
+
+class SqliteMemoryBackend:
+    """
+    Embedded SQLite memory for production deployments.
+
+    Besides load()/append() it answers calibration queries directly, so it can
+    stand in for a MemoryStore without ever loading the full history:
+    per-(merchant, cause), per-merchant and per-cause outcome counters are kept
+    in summary tables by an insert trigger, and the "last N" windows are
+    index-backed ORDER BY id DESC LIMIT N queries. WAL mode plus
+    BEGIN IMMEDIATE keeps writes from several dashboard sessions serialized.
+
+    On first open an empty database is seeded from `import_path` (memory.json).
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS actions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        merchant_id TEXT NOT NULL,
+        cause_norm TEXT NOT NULL,
+        outcome TEXT,
+        payload TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_actions_pair ON actions (merchant_id, cause_norm, outcome, id);
+    CREATE INDEX IF NOT EXISTS idx_actions_merchant ON actions (merchant_id, id);
+    CREATE INDEX IF NOT EXISTS idx_actions_cause ON actions (cause_norm, outcome, id);
+
+    CREATE TABLE IF NOT EXISTS pair_stats (
+        merchant_id TEXT NOT NULL,
+        cause_norm TEXT NOT NULL,
+        successes INTEGER NOT NULL DEFAULT 0,
+        failures INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (merchant_id, cause_norm)
+    );
+    CREATE TABLE IF NOT EXISTS merchant_stats (
+        merchant_id TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS cause_stats (
+        cause_norm TEXT PRIMARY KEY,
+        successes INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TRIGGER IF NOT EXISTS actions_stats AFTER INSERT ON actions BEGIN
+        INSERT INTO pair_stats (merchant_id, cause_norm, successes, failures, total)
+        VALUES (NEW.merchant_id, NEW.cause_norm, NEW.outcome = 'success', NEW.outcome = 'failure', 1)
+        ON CONFLICT (merchant_id, cause_norm) DO UPDATE SET
+            successes = successes + excluded.successes,
+            failures = failures + excluded.failures,
+            total = total + 1;
+        INSERT INTO merchant_stats (merchant_id, total) VALUES (NEW.merchant_id, 1)
+        ON CONFLICT (merchant_id) DO UPDATE SET total = total + 1;
+        INSERT INTO cause_stats (cause_norm, successes, total)
+        VALUES (NEW.cause_norm, NEW.outcome = 'success', 1)
+        ON CONFLICT (cause_norm) DO UPDATE SET
+            successes = successes + excluded.successes,
+            total = total + 1;
+    END;
+    """
+
+    def __init__(self, path: Path, import_path: Path = None):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+        if import_path is not None and Path(import_path).exists():
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    empty = self._conn.execute("SELECT NOT EXISTS (SELECT 1 FROM actions)").fetchone()[0]
+                    if empty:
+                        self._insert_many(read_memory_json(Path(import_path)).get("actions", []))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+    def _insert_many(self, actions: List[Dict]):
+        self._conn.executemany(
+            "INSERT INTO actions (merchant_id, cause_norm, outcome, payload) VALUES (?, ?, ?, ?)",
+            [(a["merchant_id"], a["cause"].lower(), a.get("outcome"), json.dumps(a)) for a in actions]
+        )
+
+    def _payloads(self, sql: str, params: tuple) -> List[Dict]:
+        """Run a `SELECT payload ... ORDER BY id DESC LIMIT n` query, returned oldest first."""
+        rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def load(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT payload FROM actions ORDER BY id").fetchall()
+        return {"actions": [json.loads(row[0]) for row in rows]}
+
+    def append(self, action: Dict):
+        self.append_many([action])
+
+    def append_many(self, actions: List[Dict]):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert_many(actions)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # MemoryStore-compatible query surface
+
+    def record(self, action: Dict):
+        self.append(action)
+
+    def record_many(self, actions: List[Dict]):
+        self.append_many(actions)
+
+    def outcome_counts(self, merchant_id: str, cause: str) -> Dict[str, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT successes, failures FROM pair_stats WHERE merchant_id = ? AND cause_norm = ?",
+                (merchant_id, cause.lower())
+            ).fetchone()
+        return {"success": row[0] if row else 0, "failure": row[1] if row else 0}
+
+    def calibration_view(self, merchant_id: str, suspected_cause: str) -> Dict:
+        """Same contract as MemoryStore.calibration_view, answered with SQL aggregates."""
+        cause = suspected_cause.lower()
+        with self._lock:
+            pair = self._conn.execute(
+                "SELECT successes, failures, total FROM pair_stats WHERE merchant_id = ? AND cause_norm = ?",
+                (merchant_id, cause)
+            ).fetchone()
+            if pair and pair[2]:
+                window = "SELECT payload FROM actions WHERE merchant_id = ? AND cause_norm = ? AND outcome = ? ORDER BY id DESC LIMIT 3"
+                return {
+                    "tier": "exact",
+                    "success_count": pair[0],
+                    "failure_count": pair[1],
+                    "total": pair[2],
+                    "recent_successes": self._payloads(window, (merchant_id, cause, "success")),
+                    "recent_failures": self._payloads(window, (merchant_id, cause, "failure")),
+                    "recent": self._payloads(
+                        "SELECT payload FROM actions WHERE merchant_id = ? AND cause_norm = ? ORDER BY id DESC LIMIT 3",
+                        (merchant_id, cause)
+                    ),
+                }
+
+            merchant = self._conn.execute(
+                "SELECT total FROM merchant_stats WHERE merchant_id = ?", (merchant_id,)
+            ).fetchone()
+            if merchant and merchant[0]:
+                return {
+                    "tier": "merchant",
+                    "recent": self._payloads(
+                        "SELECT payload FROM actions WHERE merchant_id = ? ORDER BY id DESC LIMIT 5",
+                        (merchant_id,)
+                    ),
+                }
+
+            by_cause = self._conn.execute(
+                "SELECT successes, total FROM cause_stats WHERE cause_norm = ?", (cause,)
+            ).fetchone()
+            if by_cause and by_cause[1]:
+                return {
+                    "tier": "cause",
+                    "success_count": by_cause[0],
+                    "recent_successes": self._payloads(
+                        "SELECT payload FROM actions WHERE cause_norm = ? AND outcome = 'success' ORDER BY id DESC LIMIT 2",
+                        (cause,)
+                    ),
+                }
+
+        return {"tier": None}
+
+    def export_json(self, path: Path):
+        """Export the full memory in the legacy memory.json format."""
+        _write_json_atomic(Path(path), self.load(), indent=2)
+
+    def close(self):
+        self._conn.close()
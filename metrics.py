@@ -0,0 +1,195 @@
+import os
+import json
+import math
+import time
+import random
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Where observer.py writes the report at the end of a run (KAVACH_METRICS_FILE);
+# a .prom suffix selects Prometheus text format, anything else JSON
+METRICS_FILE_ENV = "KAVACH_METRICS_FILE"
+# Latency samples kept per stage; beyond this a uniform reservoir sample is kept
+DEFAULT_MAX_SAMPLES = 10000
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _quantile(sorted_samples: List[float], q: float) -> float:
+    """Nearest-rank quantile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, math.ceil(q * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+class Metrics:
+    """
+    Per-stage latency timers and named counters for one process.
+
+    Each stage keeps its call count, total seconds, max and a bounded
+    reservoir of latency samples for p50/p95/p99. Counters are plain
+    totals (LLM requests, estimated prompt/response tokens, cache hits).
+    Recording is a perf_counter call plus one short locked append, so the
+    timers can stay on in production runs.
+    """
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages: Dict[str, Dict] = {}
+            self.counters = Counter()
+            self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        """Record one call of `stage` that took `seconds`."""
+        with self._lock:
+            s = self.stages.get(stage)
+            if s is None:
+                s = self.stages[stage] = {"count": 0, "total": 0.0, "max": 0.0, "samples": []}
+            s["count"] += 1
+            s["total"] += seconds
+            if seconds > s["max"]:
+                s["max"] = seconds
+            if len(s["samples"]) < self.max_samples:
+                s["samples"].append(seconds)
+            else:
+                slot = self._rng.randrange(s["count"])
+                if slot < self.max_samples:
+                    s["samples"][slot] = seconds
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def drain(self) -> Dict:
+        """Raw state for merge() in another process, then reset."""
+        with self._lock:
+            raw = {"stages": self.stages, "counters": dict(self.counters)}
+        self.reset()
+        return raw
+
+    def merge(self, raw: Dict):
+        """Fold in the drain() of another process (e.g. a forked analyze worker)."""
+        with self._lock:
+            for stage, other in raw["stages"].items():
+                s = self.stages.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0, "samples": []})
+                s["count"] += other["count"]
+                s["total"] += other["total"]
+                s["max"] = max(s["max"], other["max"])
+                s["samples"].extend(other["samples"])
+                if len(s["samples"]) > self.max_samples:
+                    s["samples"] = self._rng.sample(s["samples"], self.max_samples)
+            self.counters.update(raw["counters"])
+
+    def snapshot(self) -> Dict:
+        """
+        Report of everything recorded since the last reset.
+
+        Returns:
+            Dictionary with:
+            - uptime_seconds: Wall-clock time covered
+            - stages: stage -> count, total_seconds, mean, p50, p95, p99, max
+              (seconds) and throughput_per_second (calls per busy second)
+            - counters: name -> total
+        """
+        with self._lock:
+            stages = {name: dict(s, samples=sorted(s["samples"])) for name, s in self.stages.items()}
+            counters = dict(self.counters)
+            uptime = time.time() - self.started_at
+
+        report = {}
+        for name, s in sorted(stages.items()):
+            entry = {
+                "count": s["count"],
+                "total_seconds": s["total"],
+                "mean": s["total"] / s["count"] if s["count"] else 0.0,
+                "max": s["max"],
+                "throughput_per_second": s["count"] / s["total"] if s["total"] else 0.0
+            }
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = _quantile(s["samples"], q)
+            report[name] = entry
+        return {"uptime_seconds": uptime, "stages": report, "counters": dict(sorted(counters.items()))}
+
+    def to_prometheus(self) -> str:
+        """The snapshot in Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = ["# HELP kavach_stage_seconds Latency of one pipeline stage call",
+                 "# TYPE kavach_stage_seconds summary"]
+        for stage, s in snap["stages"].items():
+            for q in QUANTILES:
+                lines.append(f'kavach_stage_seconds{{stage="{stage}",quantile="{q}"}} {s[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'kavach_stage_seconds_sum{{stage="{stage}"}} {s["total_seconds"]:.6f}')
+            lines.append(f'kavach_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+        for name, value in snap["counters"].items():
+            lines.append(f"# TYPE kavach_{name}_total counter")
+            lines.append(f"kavach_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path: Path):
+        """Write the snapshot to `path`: Prometheus text for *.prom, JSON otherwise."""
+        path = Path(path)
+        if path.suffix == ".prom":
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+_default_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """Process-wide Metrics registry the instrumented stages record into."""
+    return _default_metrics
+
+
+def timer(stage: str):
+    """Context manager timing a block into the process-wide registry."""
+    return _default_metrics.timer(stage)
+
+
+def incr(name: str, n: int = 1):
+    _default_metrics.incr(name, n)
+
+
+def timed(stage: str):
+    """Decorator timing every call of a function as `stage`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _default_metrics.observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def write_report_from_env(path: Optional[str] = None) -> Optional[Path]:
+    """Write the process-wide report to KAVACH_METRICS_FILE, if set."""
+    path = path or os.getenv(METRICS_FILE_ENV)
+    if not path:
+        return None
+    _default_metrics.write_report(Path(path))
+    return Path(path)
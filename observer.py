@@ -1,20 +1,137 @@
-from brain import analyze
-from decision_engine import decide
+from incremental import analyze_and_decide
+from log_index import LogTable
 from action import execute
+import metrics
+import routing_policy
 import json
 import csv
+import gzip
+import itertools
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
 
 BASE = Path(".")
+LOGS_FILE = BASE / "logs" / "api_activity.json"
 
+_READ_CHUNK = 1 << 16
+
+@metrics.timed("load_docs")
 def load_docs():
     with open(BASE / "docs" / "headless_guide.md", "r") as f:
         return f.read()
 
-def load_logs():
-    with open(BASE / "logs" / "api_activity.json", "r") as f:
-        return json.load(f)
+def _open_text(path: Path):
+    """Open a log file as text, transparently decompressing gzip input."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _iter_json_array(f, buffer: str) -> Iterator[Dict]:
+    """Yield the elements of a top-level JSON array one at a time, reading in chunks."""
+    decoder = json.JSONDecoder()
+    pos = buffer.index("[") + 1
+    eof = False
+
+    while True:
+        # Skip whitespace and separators between elements
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer, pos = f.read(_READ_CHUNK), 0
+            eof = not buffer
+
+        if pos >= len(buffer) or buffer[pos] == "]":
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Element straddles the chunk boundary; read more and retry
+            chunk = f.read(_READ_CHUNK)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        yield record
+        pos = end
+
+
+def _iter_ndjson(f, buffer: str) -> Iterator[Dict]:
+    """Yield one record per non-empty line of newline-delimited JSON."""
+    lines = buffer.split("\n")
+    # The last piece of the prefix may be a partial line; complete it from the file
+    tail = lines.pop() + f.readline()
+
+    for line in itertools.chain(lines, [tail], f):
+        if line.strip():
+            yield json.loads(line)
+
+
+def _as_utc_naive(value) -> Optional[datetime]:
+    """Parse an ISO string/datetime for comparison, normalizing aware times to naive UTC."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
+
+def iter_logs(path: Path = LOGS_FILE, start=None, end=None,
+              merchants: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+    """
+    Stream log records lazily from a JSON array or newline-delimited JSON file.
+
+    gzip input is detected automatically. Records can be filtered while
+    reading by [start, end) time range (ISO strings or datetimes) and by a
+    set of merchant IDs, so memory stays flat regardless of file size.
+    """
+    start = _as_utc_naive(start)
+    end = _as_utc_naive(end)
+    merchants = set(merchants) if merchants is not None else None
+
+    with _open_text(Path(path)) as f:
+        buffer = ""
+        while not buffer.strip():
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                return
+            buffer += chunk
+
+        if buffer.lstrip().startswith("["):
+            records = _iter_json_array(f, buffer)
+        else:
+            records = _iter_ndjson(f, buffer)
+
+        for log in records:
+            if merchants is not None and log.get("merchant_id") not in merchants:
+                continue
+            if start is not None or end is not None:
+                try:
+                    timestamp = _as_utc_naive(log["timestamp"])
+                except Exception:
+                    continue
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    continue
+            yield log
+
+
+@metrics.timed("load_logs")
+def load_logs(path: Path = LOGS_FILE, **filters):
+    return list(iter_logs(path, **filters))
+
+@metrics.timed("load_tickets")
 def load_tickets():
     tickets = []
     with open(BASE / "tickets" / "inbox.csv", newline='', encoding="utf-8") as f:
@@ -23,16 +140,48 @@ def load_tickets():
             tickets.append(row)
     return tickets
 
-def main():
+def main(pipeline: bool = False):
     print("\n=== SELF-HEALING SUPPORT AGENT ===\n")
 
     rules = load_docs()
-    logs = load_logs()
+    with metrics.timer("load_logs"):
+        logs = LogTable(iter_logs())
     tickets = load_tickets()
 
-    findings = analyze(tickets, logs, rules)
-    decisions = decide(findings)
+    if pipeline:
+        # Stream each ticket through reason -> decide -> act as soon as it is ready
+        from pipeline import run_pipeline
+        run_pipeline(tickets, logs, rules)
+        print_routing_summary()
+        metrics.write_report_from_env()
+        return
+
+    # Only tickets whose ticket, logs, rules or memory changed are recomputed
+    findings, decisions = analyze_and_decide(tickets, logs, rules)
     execute(decisions)
+    print_routing_summary()
+    metrics.write_report_from_env()
+
+def print_routing_summary():
+    """How many tickets went to the LLM and how many calls routing saved, if any were routed."""
+    stats = routing_policy.route_stats_from_metrics(metrics.get_metrics().snapshot()["counters"])
+    if stats["routes"]:
+        routes = ", ".join(f"{route}: {n}" for route, n in stats["routes"].items())
+        print(f"LLM routing: {stats['llm_calls']} call(s), {stats['llm_calls_saved']} saved ({routes})")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Self-healing support agent")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and process tickets/logs as they are appended")
+    parser.add_argument("--poll", type=float, default=1.0, help="daemon poll interval in seconds")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="act on each decision as soon as it is ready instead of after the whole batch")
+    args = parser.parse_args()
+
+    if args.daemon:
+        from observer_daemon import ObserverDaemon
+        ObserverDaemon(poll_seconds=args.poll).run_forever()
+    else:
+        main(pipeline=args.pipeline)
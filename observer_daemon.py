@@ -0,0 +1,396 @@
+import os
+import csv
+import json
+import time
+import codecs
+import queue
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import llm_reasoner
+import confidence_calibrator
+from action import execute
+from brain import analyze
+from decision_engine import decide
+from incident_detector import IncidentStream
+from log_index import LogIndex, LogTable
+from memory_backends import _write_json_atomic
+from observer import BASE, LOGS_FILE, iter_logs
+from rule_engine import get_rule_engine
+
+INBOX_FILE = BASE / "tickets" / "inbox.csv"
+DOCS_FILE = BASE / "docs" / "headless_guide.md"
+OFFSETS_FILE = BASE / "observer_offsets.json"
+
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_BATCH_SIZE = 16
+# Analysis attempts per batch before its tickets are given up on for this run
+BATCH_ATTEMPTS = 3
+HISTORY_BATCH_SIZE = 10000
+
+
+class FileTail:
+    """
+    Reads what was appended to a file since the last call.
+
+    Tracks a byte offset, so a poll only reads the new bytes. A file that
+    shrank below the offset (truncated or rotated) is read again from the
+    start and `restarted` is set. A replaced file that is at least as long
+    is assumed to keep its prefix, which is how JSON array writers append.
+    """
+
+    def __init__(self, path: Path, offset: int = 0):
+        self.path = Path(path)
+        self.offset = offset
+        self.restarted = False
+
+    def read_new(self) -> bytes:
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return b""
+        self.restarted = size < self.offset
+        if self.restarted:
+            self.offset = 0
+        if size == self.offset:
+            return b""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            return f.read()
+
+    def read_lines(self) -> List[Tuple[str, int]]:
+        """
+        Complete new lines, each with the offset just past it; a trailing
+        partial line is left for the next call.
+        """
+        data = self.read_new()
+        lines = []
+        start = 0
+        while True:
+            end = data.find(b"\n", start) + 1
+            if not end:
+                break
+            lines.append((data[start:end].decode("utf-8").rstrip("\r\n"), self.offset + end))
+            start = end
+        self.offset += start
+        return lines
+
+
+class InboxTail:
+    """New ticket rows appended to the CSV inbox (one row per line)."""
+
+    def __init__(self, path: Path = INBOX_FILE, offset: int = 0):
+        self.tail = FileTail(path, offset)
+        self.header: Optional[List[str]] = None
+
+    def read_tickets(self) -> List[Tuple[Dict, int]]:
+        """
+        New tickets, each paired with the inbox offset just past its row so
+        callers can commit progress once the ticket has been handled.
+        """
+        start = self.tail.offset
+        lines = self.tail.read_lines()
+        if start == 0 or self.tail.restarted:
+            self.header = None  # reading from the top: the first line is the header
+        elif self.header is None:
+            with open(self.tail.path, "r", newline="", encoding="utf-8") as f:
+                self.header = next(csv.reader(f), None)
+
+        tickets = []
+        for row, (_, offset) in zip(csv.reader(line for line, _ in lines), lines):
+            if self.header is None:
+                self.header = row
+                continue
+            if row:
+                tickets.append((dict(zip(self.header, row)), offset))
+        return tickets
+
+
+class LogTail:
+    """
+    New records appended to a log file, either newline-delimited JSON or a
+    JSON array whose writer inserts elements before the closing bracket.
+    For an array the offset sits just past the last complete element, so
+    only elements added since are decoded.
+    """
+
+    def __init__(self, path: Path = LOGS_FILE, offset: int = 0):
+        self.tail = FileTail(path, offset)
+        self.array: Optional[bool] = None
+        self._decoder = json.JSONDecoder()
+
+    def read_records(self) -> List[Dict]:
+        data = self.tail.read_new()
+        if self.tail.restarted:
+            self.array = None
+        if not data.strip():
+            return []
+
+        if self.array is None:
+            stripped = data.lstrip()
+            self.array = stripped.startswith(b"[")
+            if self.array:
+                # Position just past the opening bracket
+                skip = len(data) - len(stripped) + 1
+                self.tail.offset += skip
+                data = data[skip:]
+
+        if not self.array:
+            end = data.rfind(b"\n") + 1
+            self.tail.offset += end
+            return [json.loads(line) for line in data[:end].decode("utf-8").splitlines() if line.strip()]
+
+        text = codecs.getincrementaldecoder("utf-8")().decode(data)
+        records = []
+        pos = consumed = 0
+        while True:
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(text) or text[pos] == "]":
+                break
+            try:
+                record, pos = self._decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                break  # element still being written
+            records.append(record)
+            consumed = pos
+        self.tail.offset += len(text[:consumed].encode("utf-8"))
+        return records
+
+    def read_history(self, batch_size: int = HISTORY_BATCH_SIZE) -> Iterator[List[Dict]]:
+        """
+        Records already in the file, in batches, streamed with
+        observer.iter_logs rather than read into memory at once. Afterwards
+        the tail is positioned past them, so read_records() returns only
+        later additions.
+        """
+        try:
+            size = self.tail.path.stat().st_size
+        except FileNotFoundError:
+            return
+        records = iter_logs(self.tail.path)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            yield batch
+        self._seek_past(size)
+
+    def _seek_past(self, size: int):
+        """Set the offset just past the last complete record within the first `size` bytes."""
+        with open(self.tail.path, "rb") as f:
+            head = f.read(4096).lstrip()
+            if not head:
+                return
+            self.array = head.startswith(b"[")
+            # The closing bracket of an array, or the newline ending the last line
+            marker = b"]" if self.array else b"\n"
+            pos = size
+            while pos > 0:
+                step = min(pos, 4096)
+                f.seek(pos - step)
+                found = f.read(step).rfind(marker)
+                if found >= 0:
+                    self.tail.offset = pos - step + found + (0 if self.array else 1)
+                    return
+                pos -= step
+
+
+class ObserverDaemon:
+    """
+    Long-running observer: watches the inbox and log files and pushes only
+    new tickets through analyze -> decide -> execute.
+
+    A watcher thread polls both files by offset. New log lines are appended
+    to a warm LogTable and IncidentStream. New tickets go onto a bounded
+    queue; when analysis falls behind, put() blocks and the watcher stops
+    reading the inbox (backpressure). An analysis thread takes up to
+    `batch_size` tickets at a time and analyzes them against only their
+    merchants' logs and the live incident state, then hands decisions to
+    the execute thread through a second bounded queue. Memory, the rule
+    engine and the LLM client stay loaded between events. The inbox offset
+    is saved after each batch executes, so a restart resumes where it
+    stopped. A batch whose analysis fails is retried with backoff; if it
+    still fails, the saved offset stops short of its tickets, so the next
+    start retries them rather than skipping them for good.
+    """
+
+    def __init__(self, inbox_path: Path = INBOX_FILE, logs_path: Path = LOGS_FILE,
+                 docs_path: Path = DOCS_FILE, offsets_path: Path = OFFSETS_FILE,
+                 poll_seconds: float = DEFAULT_POLL_SECONDS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_BATCH_SIZE, reasoner=None):
+        self.docs_path = Path(docs_path)
+        self.offsets_path = Path(offsets_path)
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+
+        self._resume_offset = self._load_offset()
+        self.inbox = InboxTail(inbox_path, self._resume_offset)
+        # Inbox offset before the first ticket that could not be analyzed; never saved past
+        self._held_offset: Optional[int] = None
+        self.log_tail = LogTail(logs_path)
+        self.tickets: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.decisions: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.stats = {"logs": 0, "tickets": 0, "batches": 0, "failed_tickets": 0}
+
+        # Warm state shared between events
+        self.logs = LogTable()
+        self.incidents = IncidentStream()
+        self._logs_lock = threading.Lock()
+        self.rule_engine = get_rule_engine()
+        self.reasoner = reasoner if reasoner is not None else llm_reasoner.get_reasoner()
+        self._rules_text, self._rules_mtime = "", None
+        self._memory_store, self._memory_version = None, None
+        self._threads: List[threading.Thread] = []
+
+    def _load_offset(self) -> int:
+        try:
+            with open(self.offsets_path, "r") as f:
+                return json.load(f).get("inbox_offset", 0)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+
+    def _save_offset(self, offset: int):
+        _write_json_atomic(self.offsets_path, {"inbox_offset": offset})
+
+    def rules_text(self) -> str:
+        """Migration guide, re-read only when the file changes."""
+        mtime = os.stat(self.docs_path).st_mtime_ns
+        if mtime != self._rules_mtime:
+            with open(self.docs_path, "r") as f:
+                self._rules_text = f.read()
+            self._rules_mtime = mtime
+        return self._rules_text
+
+    def memory_store(self):
+        """Memory store, reloaded only when memory changed on disk."""
+        version = confidence_calibrator.memory_version()
+        if version != self._memory_version:
+            self._memory_store = confidence_calibrator.open_memory_store()
+            self._memory_version = version
+        return self._memory_store
+
+    def ingest_logs(self, records) -> int:
+        with self._logs_lock:
+            for log in records:
+                self.logs.append(log)
+            for event in self.incidents.ingest_many(records):
+                print(f"[observer] {event['error_code']}: {event['previous_incident_type']} -> "
+                      f"{event['incident_type']} ({event['count']} merchants)")
+        self.stats["logs"] += len(records)
+        return len(records)
+
+    def _put(self, q: "queue.Queue", item):
+        """Blocking put that gives up when the daemon is stopping."""
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=self.poll_seconds)
+                return
+            except queue.Full:
+                continue
+
+    def poll(self) -> int:
+        """One watch cycle: ingest new logs, then enqueue new tickets (blocking when full)."""
+        self.ingest_logs(self.log_tail.read_records())
+
+        tickets = self.inbox.read_tickets()
+        for item in tickets:
+            self._put(self.tickets, item)
+        return len(tickets)
+
+    def analyze_batch(self, batch: List[Tuple[Dict, int]]) -> List[Dict]:
+        tickets = [ticket for ticket, _ in batch]
+        with self._logs_lock:
+            merchants = dict.fromkeys(t["merchant_id"] for t in tickets)
+            merchant_logs = LogIndex([log for m in merchants for log in self.logs.merchant_logs(m)])
+            incident_info = self.incidents.snapshot()
+        findings = analyze(tickets, merchant_logs, self.rules_text(), memory_store=self.memory_store(),
+                           rule_engine=self.rule_engine, reasoner=self.reasoner, incident_info=incident_info)
+        return decide(findings)
+
+    def _watch_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[observer] watch failed: {e}")
+            self.stop_event.wait(self.poll_seconds)
+
+    def _analyze_with_retry(self, batch: List[Tuple[Dict, int]]) -> Optional[List[Dict]]:
+        """Decisions for a batch, retrying with exponential backoff; None if every attempt failed."""
+        for attempt in range(BATCH_ATTEMPTS):
+            try:
+                return self.analyze_batch(batch)
+            except Exception as e:
+                print(f"[observer] analysis failed for {len(batch)} ticket(s) "
+                      f"(attempt {attempt + 1}/{BATCH_ATTEMPTS}): {e}")
+            if attempt + 1 < BATCH_ATTEMPTS and self.stop_event.wait(self.poll_seconds * 2 ** attempt):
+                break
+        return None
+
+    def _analyze_loop(self):
+        batch_start = self._resume_offset
+        while not self.stop_event.is_set():
+            try:
+                batch = [self.tickets.get(timeout=self.poll_seconds)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.tickets.get_nowait())
+                except queue.Empty:
+                    break
+            decisions = self._analyze_with_retry(batch)
+            if decisions is None:
+                if self._held_offset is None:
+                    self._held_offset = batch_start
+                    print(f"[observer] holding the saved inbox offset at {batch_start} so the failed "
+                          "tickets are retried on restart")
+                self.stats["failed_tickets"] += len(batch)
+                batch_start = batch[-1][1]
+                continue
+            batch_start = batch[-1][1]
+            inbox_offset = batch_start if self._held_offset is None else self._held_offset
+            self._put(self.decisions, (decisions, inbox_offset))
+
+    def _execute_loop(self):
+        while not self.stop_event.is_set() or not self.decisions.empty():
+            try:
+                decisions, inbox_offset = self.decisions.get(timeout=self.poll_seconds)
+            except queue.Empty:
+                continue
+            execute(decisions)
+            self._save_offset(inbox_offset)
+            self.stats["tickets"] += len(decisions)
+            self.stats["batches"] += 1
+
+    def start(self):
+        """Load history, warm up the LLM client and start the worker threads."""
+        for records in self.log_tail.read_history():
+            self.ingest_logs(records)
+        self.reasoner.warmup()
+        for target in (self._watch_loop, self._analyze_loop, self._execute_loop):
+            thread = threading.Thread(target=target, name=f"observer-{target.__name__.strip('_')}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        self.stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self):
+        self.start()
+        print(f"[observer] watching {self.inbox.tail.path} and {self.log_tail.tail.path} "
+              f"({self.stats['logs']} log lines loaded)")
+        try:
+            while not self.stop_event.is_set():
+                time.sleep(self.poll_seconds)
+        except KeyboardInterrupt:
+            print("[observer] stopping")
+        finally:
+            self.stop()
@@ -0,0 +1,163 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import brain
+import llm_reasoner
+import routing_policy
+from action import execute_one, print_plan_header, print_plan_footer
+from decision_engine import decide
+
+# Concurrent LLM calls (KAVACH_PIPELINE_LLM_WORKERS); the stage is I/O-bound
+DEFAULT_LLM_WORKERS = llm_reasoner.DEFAULT_CONCURRENCY
+# Threads merging, calibrating and deciding findings (KAVACH_PIPELINE_CPU_WORKERS)
+DEFAULT_CPU_WORKERS = 1
+
+_DONE = object()
+
+
+class Pipeline:
+    """
+    Streams tickets through reason -> decide -> act instead of finishing
+    each stage for the whole batch before starting the next.
+
+    The batch-wide work (log index, incident detection, rule sweep and
+    routing) runs once up front via brain.plan_analysis. After that each
+    ticket moves on as soon as its previous stage is done:
+      - reason: tickets routed to the LLM run on a pool of `llm_workers`
+        threads, sized for network latency rather than CPU count
+      - decide: brain.build_finding + decide on `cpu_workers` threads;
+        tickets that skip the LLM start here immediately
+      - act: a single thread prints each decision as it arrives
+    The first decision is printed after one ticket's latency instead of
+    after the slowest LLM call in the batch. With `ordered=True` the act
+    stage holds decisions back to print them in ticket order.
+
+    Findings and decisions match decide(brain.analyze(...)) for the same
+    inputs, except that LLM batching (KAVACH_LLM_BATCH_SIZE) is not used:
+    every LLM ticket is its own request so it can flow on independently.
+    """
+
+    def __init__(self, llm_workers: Optional[int] = None, cpu_workers: Optional[int] = None,
+                 ordered: bool = False, reasoner=None, rule_engine=None, policy=None,
+                 llm_timeout: float = llm_reasoner.DEFAULT_TIMEOUT_SECONDS, act: bool = True):
+        if llm_workers is None:
+            llm_workers = int(os.getenv("KAVACH_PIPELINE_LLM_WORKERS", DEFAULT_LLM_WORKERS))
+        if cpu_workers is None:
+            cpu_workers = int(os.getenv("KAVACH_PIPELINE_CPU_WORKERS", DEFAULT_CPU_WORKERS))
+        self.llm_workers = max(1, llm_workers)
+        self.cpu_workers = max(1, cpu_workers)
+        self.ordered = ordered
+        self.reasoner = reasoner
+        self.rule_engine = rule_engine
+        self.policy = policy
+        self.llm_timeout = llm_timeout
+        self.act = act
+        self.stats: Dict = {}
+
+    def run(self, tickets: List[Dict], logs, rules_text: str, memory_store=None,
+            incident_info: Optional[Dict] = None) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Analyze, decide and act on every ticket.
+
+        Args:
+            tickets: Tickets to process
+            logs: Plain list, LogIndex or LogTable of all logs
+            rules_text: Migration guide rules
+            memory_store: Shared MemoryStore / SqliteMemoryBackend (opened if omitted)
+            incident_info: Precomputed incident_detector.detect_patterns result
+
+        Returns:
+            (findings, decisions) in ticket order, whatever order they were acted on
+        """
+        start = time.perf_counter()
+        plan = brain.plan_analysis(tickets, logs, memory_store=memory_store, rule_engine=self.rule_engine,
+                                   reasoner=self.reasoner, policy=self.policy, incident_info=incident_info)
+        reasoner = plan["reasoner"]
+
+        findings: List[Optional[Dict]] = [None] * len(tickets)
+        decisions: List[Optional[Dict]] = [None] * len(tickets)
+        acted: "queue.Queue" = queue.Queue()
+        first_decision = []
+
+        def decide_stage(i, llm_result):
+            try:
+                finding = brain.build_finding(plan, i, llm_result)
+                findings[i] = finding
+                decisions[i] = decide([finding])[0]
+            except Exception as e:
+                print(f"Decision failed for {tickets[i]['merchant_id']}: {e}")
+            finally:
+                acted.put(i)
+
+        def act_stage():
+            next_index, ready = 0, set()
+            if self.act:
+                print_plan_header()
+            while True:
+                i = acted.get()
+                if i is _DONE:
+                    break
+                if not first_decision:
+                    first_decision.append(time.perf_counter() - start)
+                if not self.ordered:
+                    self._act(decisions[i])
+                    continue
+                ready.add(i)
+                while next_index in ready:
+                    ready.discard(next_index)
+                    self._act(decisions[next_index])
+                    next_index += 1
+            if self.act:
+                print_plan_footer()
+
+        act_thread = threading.Thread(target=act_stage, name="pipeline-act", daemon=True)
+        act_thread.start()
+
+        cpu_pool = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix="pipeline-decide")
+        llm_pool = ThreadPoolExecutor(max_workers=self.llm_workers, thread_name_prefix="pipeline-reason")
+
+        def reason_stage(i):
+            ticket = tickets[i]
+            try:
+                llm_result = reasoner.reason(ticket, plan["logs_by_merchant"][ticket["merchant_id"]],
+                                             rules_text, timeout=self.llm_timeout)
+            except Exception as e:
+                print(f"LLM reasoning failed for {ticket['merchant_id']}: {e}")
+                llm_result = None
+            cpu_pool.submit(decide_stage, i, llm_result)
+
+        try:
+            # LLM tickets go first so the slow stage starts as early as possible
+            for i, route in enumerate(plan["routes"]):
+                if route == routing_policy.ROUTE_LLM:
+                    llm_pool.submit(reason_stage, i)
+            for i, route in enumerate(plan["routes"]):
+                if route != routing_policy.ROUTE_LLM:
+                    cpu_pool.submit(decide_stage, i, None)
+        finally:
+            llm_pool.shutdown(wait=True)
+            cpu_pool.shutdown(wait=True)
+            acted.put(_DONE)
+            act_thread.join()
+
+        self.stats = {
+            "tickets": len(tickets),
+            "llm_tickets": sum(1 for route in plan["routes"] if route == routing_policy.ROUTE_LLM),
+            "first_decision_seconds": first_decision[0] if first_decision else None,
+            "total_seconds": time.perf_counter() - start
+        }
+        return findings, decisions
+
+    def _act(self, decision: Optional[Dict]):
+        if self.act and decision is not None:
+            execute_one(decision)
+
+
+def run_pipeline(tickets: List[Dict], logs, rules_text: str, memory_store=None,
+                 **pipeline_kwargs) -> Tuple[List[Dict], List[Dict]]:
+    """One streamed run over `tickets` (see Pipeline.run)."""
+    return Pipeline(**pipeline_kwargs).run(tickets, logs, rules_text, memory_store=memory_store)
@@ -0,0 +1,195 @@
+import os
+import re
+import json
+from typing import Dict, List, Tuple
+
+# Upper bound on the whole prompt, in estimated tokens (KAVACH_LLM_TOKEN_BUDGET)
+DEFAULT_TOKEN_BUDGET = 4000
+# Share of the budget kept for the logs + rules context when a long ticket
+# would otherwise eat into it; ticket text is truncated to leave this much
+MIN_CONTEXT_TOKENS = 200
+# Room kept for an "... omitted" line when entries are cut
+_OMITTED_TOKENS = 16
+TRUNCATED = " ...[truncated]"
+
+# Rough chars-per-token ratio for English text and JSON; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+_RULE_HEADER = re.compile(r"^Rule #\d+:", re.MULTILINE)
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9-]{3,}")
+_STOPWORDS = {"error", "errors", "with", "from", "that", "this", "must", "have", "will", "missing", "invalid"}
+
+
+def get_token_budget() -> int:
+    return int(os.getenv("KAVACH_LLM_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """`text` cut to at most `max_tokens` estimated tokens, marked when cut ("" if nothing fits)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = max_tokens * CHARS_PER_TOKEN - len(TRUNCATED)
+    return text[:keep] + TRUNCATED if keep > 0 else ""
+
+
+def fit_ticket(ticket: Dict, max_tokens: int) -> Dict:
+    """
+    Copy of `ticket` whose subject and message together take at most
+    `max_tokens` estimated tokens; the subject gets at most a quarter.
+    """
+    subject = truncate_text(ticket["subject"], max(0, max_tokens // 4))
+    message = truncate_text(ticket["message"], max(0, max_tokens - estimate_tokens(subject)))
+    return dict(ticket, subject=subject, message=message)
+
+
+def summarize_logs(logs: List[Dict]) -> List[Dict]:
+    """
+    Collapse duplicate (error_code, message) log lines into one entry with a
+    count and first/last timestamps, most frequent first.
+    """
+    summary: Dict[Tuple, Dict] = {}
+    for log in logs:
+        key = (log.get("error_code"), log.get("message", ""))
+        timestamp = log.get("timestamp", "")
+        entry = summary.get(key)
+        if entry is None:
+            summary[key] = {
+                "error_code": key[0],
+                "message": key[1],
+                "count": 1,
+                "first_seen": timestamp,
+                "last_seen": timestamp
+            }
+        else:
+            entry["count"] += 1
+            entry["first_seen"] = min(entry["first_seen"], timestamp)
+            entry["last_seen"] = max(entry["last_seen"], timestamp)
+    return sorted(summary.values(), key=lambda e: e["count"], reverse=True)
+
+
+def error_signature(logs: List[Dict]) -> Tuple:
+    """
+    The distinct (error_code, message) pairs in a merchant's logs, sorted.
+    Merchants with equal signatures show the same symptom and can share
+    one batched prompt.
+    """
+    return tuple(sorted({(log.get("error_code"), log.get("message", "")) for log in logs}, key=str))
+
+
+def split_rules(rules_text: str) -> List[str]:
+    """Split the migration guide into its "Rule #N:" sections (text before the first is dropped)."""
+    starts = [m.start() for m in _RULE_HEADER.finditer(rules_text)]
+    return [rules_text[start:end].strip() for start, end in zip(starts, starts[1:] + [len(rules_text)])]
+
+
+def select_rules(rules_text: str, log_summary: List[Dict]) -> List[str]:
+    """
+    Rules relevant to the merchant's logs: those that mention one of the
+    observed error codes or share a keyword with a log message. Falls back
+    to every rule when nothing matches, so the model is never left blind.
+    """
+    sections = split_rules(rules_text)
+    if not sections:
+        return [rules_text.strip()] if rules_text.strip() else []
+
+    codes = {str(entry["error_code"]) for entry in log_summary if entry["error_code"] is not None}
+    keywords = {
+        word.lower()
+        for entry in log_summary
+        for word in _WORD.findall(entry["message"])
+        if word.lower() not in _STOPWORDS
+    }
+
+    selected = []
+    for section in sections:
+        section_lower = section.lower()
+        if any(re.search(rf"\b{code}\b", section) for code in codes) \
+                or any(keyword in section_lower for keyword in keywords):
+            selected.append(section)
+    return selected or sections
+
+
+def _fit_log_entry(entry: Dict, max_tokens: int) -> str:
+    """The entry as a JSON line of at most `max_tokens` tokens, its message truncated if needed ("" if it can't fit)."""
+    line = json.dumps(entry)
+    message_tokens = estimate_tokens(entry["message"])
+    while estimate_tokens(line) > max_tokens:
+        # JSON escaping can make the line longer than the message itself, so shrink until it fits
+        message_tokens -= estimate_tokens(line) - max_tokens
+        if message_tokens <= 0:
+            return ""
+        line = json.dumps(dict(entry, message=truncate_text(entry["message"], message_tokens)))
+    return line
+
+
+def fit_context(log_summary: List[Dict], rules: List[str], token_budget: int) -> Tuple[str, str]:
+    """
+    Render the log summary and rules within `token_budget` tokens.
+
+    Rules are kept whole while they fit in half the budget (in guide
+    order); the remaining budget goes to log summary entries, most frequent
+    first. The first rule or entry that doesn't fit is truncated to the
+    room left, and anything cut after it is reported with an "omitted"
+    line so the model knows the view is partial.
+    """
+    rule_budget = token_budget // 2
+    rules_parts = []
+    used = 0
+    for n, rule in enumerate(rules):
+        reserve = _OMITTED_TOKENS if n + 1 < len(rules) else 0
+        cost = estimate_tokens(rule) + 1
+        if used + cost + reserve > rule_budget:
+            rule = truncate_text(rule, rule_budget - used - _OMITTED_TOKENS - 1)
+            if rule:
+                rules_parts.append(rule)
+                used += estimate_tokens(rule) + 1
+            omitted_line = f"... {len(rules) - len(rules_parts)} more rule(s) omitted"
+            if len(rules_parts) < len(rules) and used + estimate_tokens(omitted_line) + 1 <= rule_budget:
+                rules_parts.append(omitted_line)
+            break
+        rules_parts.append(rule)
+        used += cost
+    rules_out = "\n\n".join(rules_parts)
+
+    log_budget = token_budget - estimate_tokens(rules_out)
+    log_lines = []
+    used = 0
+    for i, entry in enumerate(log_summary):
+        reserve = _OMITTED_TOKENS if i + 1 < len(log_summary) else 0
+        line = json.dumps(entry)
+        cost = estimate_tokens(line) + 1
+        if used + cost + reserve > log_budget:
+            line = _fit_log_entry(entry, log_budget - used - _OMITTED_TOKENS - 1)
+            if line:
+                log_lines.append(line)
+                used += estimate_tokens(line) + 1
+                i += 1
+            omitted = sum(e["count"] for e in log_summary[i:])
+            omitted_line = f"... {len(log_summary) - i} more distinct message(s) ({omitted} lines) omitted"
+            if i < len(log_summary) and used + estimate_tokens(omitted_line) + 1 <= log_budget:
+                log_lines.append(omitted_line)
+            break
+        log_lines.append(line)
+        used += cost
+    logs_out = "\n".join(log_lines) if log_summary else "(no logs)"
+
+    return logs_out, rules_out
+
+
+def build_context(logs: List[Dict], rules_text: str, token_budget: int) -> Tuple[str, str]:
+    """
+    Prompt context for one merchant: its logs collapsed by message and the
+    rules relevant to them, together no larger than `token_budget` tokens.
+
+    Returns (logs_text, rules_text). The logs text opens with a header
+    giving the raw and distinct line counts.
+    """
+    log_summary = summarize_logs(logs)
+    rules = select_rules(rules_text, log_summary)
+    header = f"({len(logs)} log lines, {len(log_summary)} distinct; duplicates collapsed into counts)"
+    logs_out, rules_out = fit_context(log_summary, rules, token_budget - estimate_tokens(header) - 1)
+    return f"{header}\n{logs_out}", rules_out
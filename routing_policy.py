@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+import metrics
+
+ROUTE_LLM = "llm"
+ROUTE_RULE_CONFIDENT = "rule-confident"
+ROUTE_PLATFORM_INCIDENT = "platform-incident"
+# Recorded on findings when no LLM backend is configured; not counted
+ROUTE_LLM_UNAVAILABLE = "llm-unavailable"
+
+# Rule confidence at or above which the LLM is skipped (KAVACH_LLM_SKIP_CONFIDENCE)
+DEFAULT_SKIP_CONFIDENCE = 0.9
+
+# Routes are also counted in the metrics registry as llm_route_<route>
+ROUTE_METRIC_PREFIX = "llm_route_"
+
+
+def route_metric(route: str) -> str:
+    return ROUTE_METRIC_PREFIX + route.replace("-", "_")
+
+
+class RoutingPolicy:
+    """
+    Decides per ticket whether the LLM is worth calling.
+
+    A ticket goes straight to the rule-based result when its rule match is
+    already decisive (confidence >= `skip_confidence`) or when its merchant
+    is part of a detected PLATFORM-WIDE incident, where the action is fixed
+    to escalation whatever the diagnosis. Everything else routes to the LLM.
+    Route counters accumulate across calls so savings can be reported.
+    """
+
+    def __init__(self, skip_confidence: Optional[float] = None, skip_platform_incidents: Optional[bool] = None):
+        if skip_confidence is None:
+            skip_confidence = float(os.getenv("KAVACH_LLM_SKIP_CONFIDENCE", DEFAULT_SKIP_CONFIDENCE))
+        if skip_platform_incidents is None:
+            skip_platform_incidents = os.getenv("KAVACH_LLM_SKIP_PLATFORM", "on").lower() != "off"
+        self.skip_confidence = skip_confidence
+        self.skip_platform_incidents = skip_platform_incidents
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def route(self, rule_result: Dict, is_platform_incident: bool) -> str:
+        """
+        Route for one ticket given its RuleEngine result.
+
+        Returns:
+            ROUTE_PLATFORM_INCIDENT, ROUTE_RULE_CONFIDENT or ROUTE_LLM
+        """
+        if self.skip_platform_incidents and is_platform_incident:
+            route = ROUTE_PLATFORM_INCIDENT
+        elif rule_result.get("rule_hits") and rule_result["confidence"] >= self.skip_confidence:
+            route = ROUTE_RULE_CONFIDENT
+        else:
+            route = ROUTE_LLM
+        with self._lock:
+            self.counters[route] += 1
+        metrics.incr(route_metric(route))
+        return route
+
+    def explain(self, route: str, rule_result: Dict) -> str:
+        """One reasoning-chain line saying why the LLM was skipped."""
+        if route == ROUTE_PLATFORM_INCIDENT:
+            return "LLM skipped: merchant is part of a PLATFORM-WIDE incident"
+        return f"LLM skipped: rule confidence {rule_result['confidence']} >= {self.skip_confidence}"
+
+    def stats(self) -> Dict:
+        """Tickets per route plus the LLM calls saved."""
+        with self._lock:
+            counters = dict(self.counters)
+        return _route_stats(counters)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+
+
+def _route_stats(counters: Dict[str, int]) -> Dict:
+    return {
+        "routes": counters,
+        "llm_calls": counters.get(ROUTE_LLM, 0),
+        "llm_calls_saved": sum(n for route, n in counters.items() if route != ROUTE_LLM)
+    }
+
+
+def route_stats_from_metrics(counters: Dict[str, int]) -> Dict:
+    """RoutingPolicy.stats() rebuilt from a metrics snapshot's counters, across every policy and worker."""
+    routes = {route: counters[route_metric(route)]
+              for route in (ROUTE_LLM, ROUTE_RULE_CONFIDENT, ROUTE_PLATFORM_INCIDENT)
+              if counters.get(route_metric(route))}
+    return _route_stats(routes)
+
+
+_default_policy: Optional[RoutingPolicy] = None
+_policy_lock = threading.Lock()
+
+def get_routing_policy() -> RoutingPolicy:
+    """Process-wide RoutingPolicy, configured from the environment on first use."""
+    global _default_policy
+    with _policy_lock:
+        if _default_policy is None:
+            _default_policy = RoutingPolicy()
+    return _default_policy
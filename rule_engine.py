@@ -0,0 +1,196 @@
+import os
+import re
+import json
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from log_index import LogTable
+
+# Rules are evaluated in priority order: each log line counts toward the
+# first rule it matches, mirroring the original if/elif chain in brain.py.
+#   message_contains: substrings, any of which must appear in the message
+#   case_sensitive:   whether message_contains is matched case-sensitively
+#   min_error_code:   error_code must be >= this value
+#   evidence:         "message" records the log message, "error" prefixes the code
+DEFAULT_RULES = [
+    {
+        "id": "rule-1",
+        "cause": "Merchant missing X-SDK-Version header",
+        "confidence": 0.95,
+        "message_contains": ["X-SDK-Version"],
+        "case_sensitive": True,
+        "evidence": "message",
+        "evidence_doc": "Rule #1: All checkout API requests must include X-SDK-Version header"
+    },
+    {
+        "id": "rule-2",
+        "cause": "Merchant using wrong webhook secret (should be B)",
+        "confidence": 0.9,
+        "message_contains": ["webhook", "secret"],
+        "case_sensitive": False,
+        "evidence": "message",
+        "evidence_doc": "Rule #2: Headless webhooks use Secret Key B (not A)"
+    },
+    {
+        "id": "rule-4",
+        "cause": "Possible platform instability",
+        "confidence": 0.6,
+        "min_error_code": 500,
+        "evidence": "error",
+        "evidence_doc": "Rule #4: Headless API has stricter rate limits, 500 errors may indicate platform issues"
+    }
+]
+
+UNKNOWN_CAUSE = "Unknown"
+UNKNOWN_CONFIDENCE = 0.3
+
+
+def load_rules(path: Optional[Path] = None) -> List[Dict]:
+    """Load a rule table from a JSON file (a list of rule dicts), or the built-in defaults."""
+    if path is None:
+        return DEFAULT_RULES
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class RuleEngine:
+    """
+    Evaluates a declarative rule table over all logs in a single sweep.
+
+    Every rule's substrings are compiled into one combined regex (a
+    zero-width lookahead alternation, so a match is tried at every position
+    rather than consuming the message). The rule a log line resolves to
+    depends only on its (message, error_code) pair, which is memoized, so
+    the sweep costs one counter increment per line and one regex scan per
+    distinct message.
+    """
+
+    def __init__(self, rules: Optional[List[Dict]] = None):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+
+        alternatives = []
+        for i, rule in enumerate(self.rules):
+            needles = rule.get("message_contains")
+            if not needles:
+                continue
+            body = "|".join(re.escape(needle) for needle in needles)
+            if not rule.get("case_sensitive", True):
+                body = f"(?i:{body})"
+            alternatives.append(f"(?P<r{i}>{body})")
+        self._pattern = re.compile("(?=" + "|".join(alternatives) + ")") if alternatives else None
+
+        self._message_cache: Dict[str, frozenset] = {}
+        self._match_cache: Dict[tuple, Optional[int]] = {}
+
+    def _message_matches(self, message: str) -> frozenset:
+        """Indexes of rules whose substrings occur in the message."""
+        matched = self._message_cache.get(message)
+        if matched is None:
+            matched = frozenset()
+            if self._pattern is not None:
+                matched = frozenset(int(m.lastgroup[1:]) for m in self._pattern.finditer(message))
+            self._message_cache[message] = matched
+        return matched
+
+    def match(self, message: str, error_code: int) -> Optional[int]:
+        """Index of the first rule a log line satisfies, or None."""
+        key = (message, error_code)
+        if key in self._match_cache:
+            return self._match_cache[key]
+
+        matched_messages = self._message_matches(message)
+        result = None
+        for i, rule in enumerate(self.rules):
+            if rule.get("message_contains") and i not in matched_messages:
+                continue
+            if "min_error_code" in rule and error_code < rule["min_error_code"]:
+                continue
+            result = i
+            break
+
+        self._match_cache[key] = result
+        return result
+
+    def evaluate(self, logs) -> Dict[str, Dict]:
+        """
+        One pass over every log line (list, LogIndex or LogTable).
+
+        Lines are first counted per distinct (merchant, message, error_code)
+        triple, which for a LogTable is a C-level Counter over the integer
+        columns; rules are then resolved once per distinct triple. Returns,
+        per merchant, rule hit counts plus de-duplicated evidence.
+        """
+        if isinstance(logs, LogTable):
+            merchant_ids, messages = logs.merchant_ids, logs.messages
+            counts = Counter(zip(logs.merchant, logs.message, logs.error_code))
+            lines = ((merchant_ids[m], messages[msg], code, n) for (m, msg, code), n in counts.items())
+        else:
+            counts = Counter(
+                (log.get("merchant_id", "unknown"), log.get("message", ""), log.get("error_code", 0))
+                for log in logs
+            )
+            lines = ((merchant_id, message, code, n) for (merchant_id, message, code), n in counts.items())
+
+        hits: Dict[str, Dict[int, int]] = {}
+        evidence: Dict[str, Dict[str, None]] = {}
+
+        for merchant_id, message, error_code, n in lines:
+            rule_index = self.match(message, error_code)
+            if rule_index is None:
+                continue
+            merchant_hits = hits.setdefault(merchant_id, {})
+            merchant_hits[rule_index] = merchant_hits.get(rule_index, 0) + n
+
+            if self.rules[rule_index].get("evidence") == "error":
+                line = f"Error {error_code}: {message}"
+            else:
+                line = message
+            evidence.setdefault(merchant_id, {})[line] = None
+
+        return {
+            merchant_id: self._score(merchant_hits, list(evidence[merchant_id]))
+            for merchant_id, merchant_hits in hits.items()
+        }
+
+    def _score(self, merchant_hits: Dict[int, int], evidence_logs: List[str]) -> Dict:
+        """Pick the most confident matched rule (more hits breaks ties) as the cause."""
+        best = max(merchant_hits, key=lambda i: (self.rules[i]["confidence"], merchant_hits[i]))
+        matched = sorted(merchant_hits)
+        return {
+            "cause": self.rules[best]["cause"],
+            "confidence": self.rules[best]["confidence"],
+            "rule_hits": {self.rules[i]["id"]: merchant_hits[i] for i in matched},
+            "scored_causes": sorted(
+                ({"cause": self.rules[i]["cause"], "confidence": self.rules[i]["confidence"], "hits": merchant_hits[i]}
+                 for i in matched),
+                key=lambda c: (c["confidence"], c["hits"]), reverse=True
+            ),
+            "evidence_logs": evidence_logs,
+            "evidence_docs": [self.rules[i]["evidence_doc"] for i in matched if self.rules[i].get("evidence_doc")]
+        }
+
+    @staticmethod
+    def no_match() -> Dict:
+        return {
+            "cause": UNKNOWN_CAUSE,
+            "confidence": UNKNOWN_CONFIDENCE,
+            "rule_hits": {},
+            "scored_causes": [],
+            "evidence_logs": [],
+            "evidence_docs": []
+        }
+
+
+_default_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+
+def get_rule_engine() -> RuleEngine:
+    """Process-wide RuleEngine, from KAVACH_RULES_FILE or the built-in table."""
+    global _default_engine
+    with _engine_lock:
+        if _default_engine is None:
+            path = os.getenv("KAVACH_RULES_FILE")
+            _default_engine = RuleEngine(load_rules(Path(path) if path else None))
+    return _default_engine
@@ -0,0 +1,75 @@
+"""
+Guardrail classification: substring parity with the original keyword
+checks in decide(), and opt-in word matching.
+
+Run from the repo root:
+    python -m pytest -q test_decision_engine.py
+"""
+
+import random
+
+from decision_engine import DEFAULT_GUARDRAILS, GuardrailPolicy, decide
+
+PAYMENT = ["payment", "charge", "refund", "transaction", "billing"]
+WEBHOOK = ["webhook", "secret", "callback", "notification"]
+DESTRUCTIVE = ["delete", "remove", "disable", "revoke", "terminate"]
+
+WORDS = ["Merchant", "missing", "X-SDK-Version", "header", "wrong", "webhook", "secret", "Payment",
+         "refunds", "failed", "Disabled", "Callback", "notifications", "transactions", "charged",
+         "discharge", "repayment", "autopayment", "micropayment", "microtransaction", "pretransaction",
+         "autorefund", "precharge", "postbilling", "undelete", "autodelete", "autoremove", "predisable",
+         "Billing", "terminated", "config", "SECRET", "gateway"]
+
+
+def legacy_flags(cause, confidence):
+    """The keyword checks decide() made before the guardrail table existed."""
+    cause_lower = cause.lower()
+    if any(keyword in cause_lower for keyword in PAYMENT):
+        return ["PAYMENT-RELATED"]
+    if any(keyword in cause_lower for keyword in WEBHOOK) and confidence > 0.8:
+        return ["WEBHOOK-RELATED"]
+    if any(keyword in cause_lower for keyword in DESTRUCTIVE):
+        return ["DESTRUCTIVE ACTION"]
+    return []
+
+
+def test_default_guardrails_match_legacy_substring_checks():
+    rng = random.Random(0)
+    policy = GuardrailPolicy()
+    for _ in range(5000):
+        cause = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+        confidence = rng.choice([0.4, 0.75, 0.85, 0.95])
+        guardrail = policy.check(cause, confidence)
+        assert ([guardrail["flag"]] if guardrail else []) == legacy_flags(cause, confidence), cause
+
+
+def test_compound_words_still_trigger_safety_guardrails():
+    policy = GuardrailPolicy()
+    for cause in ["repayment", "autopayment", "micropayment", "microtransaction", "pretransaction",
+                  "autorefund", "precharge", "postbilling"]:
+        assert policy.check(f"Merchant {cause} failed", 0.5)["id"] == "payment", cause
+    for cause in ["undelete", "autodelete", "autoremove", "predisable"]:
+        assert policy.check(f"Merchant {cause} failed", 0.5)["id"] == "destructive", cause
+
+
+def test_word_match_is_opt_in():
+    table = [dict(DEFAULT_GUARDRAILS[0], match="word")]
+    policy = GuardrailPolicy(table)
+
+    assert policy.check("Patient discharge form", 0.5) is None
+    assert policy.check("Refunds stuck", 0.5)["id"] == "payment"
+
+
+def test_decide_flags_payment_compound():
+    finding = {"merchant_id": "M-1", "ticket": "t", "suspected_cause": "Repayment schedule broken",
+               "confidence": 0.95, "evidence_logs": ["a", "b"]}
+
+    assert decide([finding])[0]["safety_flags"] == ["PAYMENT-RELATED"]
+
+
+if __name__ == "__main__":
+    test_default_guardrails_match_legacy_substring_checks()
+    test_compound_words_still_trigger_safety_guardrails()
+    test_word_match_is_opt_in()
+    test_decide_flags_payment_compound()
+    print("guardrail tests passed")
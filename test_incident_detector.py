@@ -0,0 +1,110 @@
+"""
+Regression tests for cross-merchant incident windows, batch
+(detect_patterns) and streaming (IncidentStream).
+
+Run from the repo root:
+    python -m pytest -q test_incident_detector.py
+"""
+
+from incident_detector import IncidentStream, check_merchant_in_incident, detect_patterns
+
+
+def _log(merchant_id, timestamp, error_code=500):
+    return {"merchant_id": merchant_id, "timestamp": timestamp, "error_code": error_code,
+            "message": "Internal Server Error"}
+
+
+def _burst_then_late_merchant():
+    logs = [_log(f"M-{i}", "2026-02-01T10:00:00") for i in range(10)]
+    logs.append(_log("LATE", "2026-02-01T10:30:00"))
+    return logs
+
+
+def test_merchant_after_incident_is_not_included():
+    incident_info = detect_patterns(_burst_then_late_merchant())
+
+    assert incident_info["incident_type"] == "PLATFORM-WIDE"
+    assert "LATE" not in incident_info["affected_merchants"]
+    assert all("LATE" not in incident["merchants"] for incident in incident_info["incidents"])
+    assert not check_merchant_in_incident("LATE", incident_info)
+    assert check_merchant_in_incident("M-0", incident_info)
+
+
+def test_merchant_inside_window_joins_incident():
+    logs = _burst_then_late_merchant()
+    logs.append(_log("NEXT", "2026-02-01T10:05:00"))
+    incident_info = detect_patterns(logs)
+
+    assert check_merchant_in_incident("NEXT", incident_info)
+    assert not check_merchant_in_incident("LATE", incident_info)
+
+
+def test_pattern_counts_merchants_within_one_window():
+    # Ten merchants every 8 minutes: the merged incident spans over an hour,
+    # but no single 10-minute window holds more than 20 merchants
+    logs = []
+    for step in range(8):
+        minute = step * 8
+        logs.extend(_log(f"M-{step}-{i}", f"2026-02-01T10:{minute:02d}:00") for i in range(10))
+    incident_info = detect_patterns(logs)
+
+    incident = incident_info["incidents"][0]
+    assert incident["count"] == 80
+    assert incident["peak_count"] == 20
+    assert incident_info["pattern"] == "20 merchants experiencing error 500 within 10 minutes"
+
+
+def _transitions(events):
+    return [(event["previous_incident_type"], event["incident_type"]) for event in events]
+
+
+def test_stream_escalates_and_drains_back():
+    stream = IncidentStream()
+    events = stream.ingest_many(_log(f"M-{i}", "2026-02-01T10:00:00") for i in range(10))
+
+    assert _transitions(events) == [("MERCHANT-SPECIFIC", "POTENTIAL-PLATFORM-ISSUE"),
+                                    ("POTENTIAL-PLATFORM-ISSUE", "PLATFORM-WIDE")]
+    assert stream.snapshot()["incident_type"] == "PLATFORM-WIDE"
+
+    # The 10-minute window drains first, then the hour-long potential window
+    events = stream.ingest(_log("OTHER", "2026-02-01T10:11:00", error_code=401))
+    assert _transitions(events) == [("PLATFORM-WIDE", "POTENTIAL-PLATFORM-ISSUE")]
+
+    events = stream.ingest(_log("OTHER", "2026-02-01T11:01:00", error_code=401))
+    assert _transitions(events) == [("POTENTIAL-PLATFORM-ISSUE", "MERCHANT-SPECIFIC")]
+    assert stream.snapshot()["incident_type"] == "MERCHANT-SPECIFIC"
+    assert 500 not in stream.windows
+
+
+def test_stream_accepts_late_logs_inside_the_window_only():
+    stream = IncidentStream()
+    stream.ingest_many(_log(f"M-{i}", "2026-02-01T10:05:00") for i in range(9))
+
+    # Out of order but still inside the window: counts, and moves the window start back
+    events = stream.ingest(_log("EARLY", "2026-02-01T10:02:00"))
+    assert _transitions(events) == [("POTENTIAL-PLATFORM-ISSUE", "PLATFORM-WIDE")]
+    assert stream.snapshot()["time_range"]["start"] == "2026-02-01T10:02:00"
+
+    # Older than the window behind the watermark: ignored
+    stream.ingest(_log("STALE", "2026-02-01T09:50:00"))
+    assert "STALE" not in stream.snapshot()["affected_merchants"]
+
+
+def test_stream_window_grows_with_merchants_not_lines():
+    stream = IncidentStream()
+    stream.ingest_many(_log("NOISY", "2026-02-01T10:00:00") for _ in range(1000))
+
+    window = stream.windows[500]
+    assert window.distinct() == 1
+    assert len(window.buckets[window.start()]) == 1
+    assert stream.snapshot()["incident_type"] == "MERCHANT-SPECIFIC"
+
+
+if __name__ == "__main__":
+    test_merchant_after_incident_is_not_included()
+    test_merchant_inside_window_joins_incident()
+    test_pattern_counts_merchants_within_one_window()
+    test_stream_escalates_and_drains_back()
+    test_stream_accepts_late_logs_inside_the_window_only()
+    test_stream_window_grows_with_merchants_not_lines()
+    print("incident window tests passed")
@@ -0,0 +1,134 @@
+"""
+Reasoner.reason_many against a fake model: concurrency, ordering,
+timeouts and batch retries, with no network and no response cache.
+
+Run from the repo root:
+    python -m pytest -q test_llm_reasoner.py
+"""
+
+import time
+
+import metrics
+from llm_backends import StubBackend
+from llm_reasoner import Reasoner
+
+
+def _result(cause):
+    return {
+        "hypotheses": [{"cause": cause, "evidence": "stub", "confidence": 0.7}],
+        "selected_cause": cause,
+        "confidence": 0.7,
+        "reasoning_chain": ["Step 1: stub"],
+        "evidence_logs": [],
+        "evidence_docs": []
+    }
+
+
+def _tickets(n):
+    return [{"merchant_id": f"M-{i}", "subject": "Checkout Broken", "message": "Pay Now does nothing"}
+            for i in range(n)]
+
+
+def _slow_model(seconds):
+    def respond(prompt):
+        time.sleep(seconds)
+        # Echo the merchant back so results can be matched to tickets
+        merchant = prompt.split("MERCHANT: ")[1].split()[0]
+        return _result(f"cause for {merchant}")
+    return respond
+
+
+def test_calls_run_concurrently_and_keep_ticket_order():
+    backend = StubBackend(_slow_model(0.2))
+    reasoner = Reasoner(backend, use_cache=False)
+    tickets = _tickets(8)
+
+    start = time.monotonic()
+    results = reasoner.reason_many(tickets, {}, "", max_concurrency=8, timeout=5)
+    elapsed = time.monotonic() - start
+
+    assert backend.calls == 8
+    assert elapsed < 1.0
+    assert [r["selected_cause"] for r in results] == [f"cause for M-{i}" for i in range(8)]
+
+
+def test_timeout_starts_when_each_call_runs():
+    # 40 calls of 0.1 s on 8 workers take ~0.5 s, longer than the 0.3 s
+    # per-call timeout: none of them may time out while queued
+    backend = StubBackend(_slow_model(0.1))
+    results = Reasoner(backend, use_cache=False).reason_many(_tickets(40), {}, "", max_concurrency=8,
+                                                            timeout=0.3)
+
+    assert all(r is not None for r in results)
+    assert backend.calls == 40
+
+
+def test_hung_calls_do_not_hold_up_the_queue():
+    # One worker and a model slower than the timeout: each call is abandoned
+    # after 0.5 s and a fresh worker picks up the next one
+    reasoner = Reasoner(StubBackend(_slow_model(3)), use_cache=False)
+
+    start = time.monotonic()
+    results = reasoner.reason_many(_tickets(4), {}, "", max_concurrency=1, timeout=0.5)
+    elapsed = time.monotonic() - start
+
+    assert results == [None] * 4
+    assert elapsed < 3.0
+
+
+def test_batch_timeout_bounds_the_whole_batch():
+    reasoner = Reasoner(StubBackend(_slow_model(3)), use_cache=False)
+
+    start = time.monotonic()
+    results = reasoner.reason_many(_tickets(4), {}, "", max_concurrency=1, timeout=2, batch_timeout=0.5)
+    elapsed = time.monotonic() - start
+
+    assert results == [None] * 4
+    assert elapsed < 1.5
+
+
+def test_failed_calls_fall_back_to_none():
+    def respond(prompt):
+        if "M-1" in prompt:
+            raise RuntimeError("model unavailable")
+        return _result("ok")
+
+    results = Reasoner(StubBackend(respond), use_cache=False).reason_many(_tickets(3), {}, "", timeout=5)
+
+    assert results[1] is None
+    assert results[0]["selected_cause"] == results[2]["selected_cause"] == "ok"
+
+
+def test_batch_answer_gaps_are_retried_singly():
+    logs = {f"M-{i}": [{"merchant_id": f"M-{i}", "timestamp": "2026-02-01T10:00:00", "error_code": 401,
+                        "message": "Invalid webhook secret"}] for i in range(3)}
+
+    def respond(prompt):
+        if '"results"' in prompt:
+            # Batched prompt: answer only the first ticket
+            return {"results": [dict(_result("batched"), ticket_id="T1")]}
+        return _result("single")
+
+    backend = StubBackend(respond)
+    results = Reasoner(backend, use_cache=False).reason_many(_tickets(3), logs, "", timeout=5, batch_size=3)
+
+    assert [r["selected_cause"] for r in results] == ["batched", "single", "single"]
+    assert backend.calls == 3
+
+
+def test_each_prompt_is_timed_as_llm_reason():
+    metrics.get_metrics().reset()
+    Reasoner(StubBackend(_result("ok")), use_cache=False).reason_many(_tickets(3), {}, "", timeout=5)
+
+    assert metrics.get_metrics().snapshot()["stages"]["llm_reason"]["count"] == 3
+
+
+if __name__ == "__main__":
+    test_calls_run_concurrently_and_keep_ticket_order()
+    test_timeout_starts_when_each_call_runs()
+    test_hung_calls_do_not_hold_up_the_queue()
+    test_batch_timeout_bounds_the_whole_batch()
+    test_failed_calls_fall_back_to_none()
+    test_batch_answer_gaps_are_retried_singly()
+    test_each_prompt_is_timed_as_llm_reason()
+    print("reasoner tests passed")
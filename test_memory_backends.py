@@ -0,0 +1,119 @@
+"""
+Journal memory backend: compaction, torn-tail recovery and the generation
+check that keeps an interrupted compaction from double-counting.
+
+Run from the repo root:
+    python -m pytest -q test_memory_backends.py
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+from memory_backends import JournalMemoryBackend, _write_json_atomic
+
+
+def action(n):
+    return {"merchant_id": f"M-{n % 3}", "suspected_cause": "Missing header", "outcome": "success", "n": n}
+
+
+def numbers(backend):
+    return [a["n"] for a in backend.load()["actions"]]
+
+
+def journal_lines(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f]
+
+
+def with_paths(check):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        check(tmp / "memory.journal.jsonl", tmp / "memory.snapshot.json")
+
+
+def test_compaction_folds_the_journal_into_a_snapshot():
+    def check(journal, snapshot):
+        # A fresh instance per append, as separate dashboard sessions would be
+        for n in range(7):
+            JournalMemoryBackend(journal, snapshot, compact_every=3).append(action(n))
+
+        with open(snapshot, "r") as f:
+            data = json.load(f)
+        assert data["generation"] == 2
+        assert [a["n"] for a in data["actions"]] == list(range(6))
+        assert journal_lines(journal) == [{"journal_generation": 2}, action(6)]
+        assert numbers(JournalMemoryBackend(journal, snapshot)) == list(range(7))
+
+    with_paths(check)
+
+
+def test_torn_tail_is_dropped_on_load():
+    def check(journal, snapshot):
+        backend = JournalMemoryBackend(journal, snapshot, compact_every=0)
+        backend.append_many([action(n) for n in range(3)])
+        intact_size = journal.stat().st_size
+        with open(journal, "a") as f:
+            f.write(json.dumps(action(99))[:20])
+
+        assert numbers(JournalMemoryBackend(journal, snapshot)) == [0, 1, 2]
+        assert journal.stat().st_size == intact_size
+
+    with_paths(check)
+
+
+def test_append_after_a_torn_tail_is_kept():
+    def check(journal, snapshot):
+        backend = JournalMemoryBackend(journal, snapshot, compact_every=0)
+        backend.append_many([action(n) for n in range(3)])
+        with open(journal, "a") as f:
+            f.write(json.dumps(action(99))[:20])
+
+        backend.append(action(3))
+
+        assert numbers(JournalMemoryBackend(journal, snapshot)) == [0, 1, 2, 3]
+
+    with_paths(check)
+
+
+def test_journal_older_than_the_snapshot_is_ignored():
+    def check(journal, snapshot):
+        backend = JournalMemoryBackend(journal, snapshot, compact_every=0)
+        backend.append_many([action(n) for n in range(3)])
+        # Crash between compaction's two steps: snapshot written, old journal left in place
+        _write_json_atomic(snapshot, {"generation": 1, "actions": backend.load()["actions"]})
+
+        assert numbers(JournalMemoryBackend(journal, snapshot)) == [0, 1, 2]
+
+        # The next writer starts a journal for the snapshot's generation instead of the stale one
+        backend.append(action(3))
+        assert numbers(JournalMemoryBackend(journal, snapshot)) == [0, 1, 2, 3]
+        assert journal_lines(journal)[0] == {"journal_generation": 1}
+
+    with_paths(check)
+
+
+def test_seeds_from_memory_json_until_the_first_snapshot():
+    def check(journal, snapshot):
+        legacy = journal.with_name("memory.json")
+        with open(legacy, "w") as f:
+            json.dump({"actions": [action(0), action(1)]}, f)
+
+        backend = JournalMemoryBackend(journal, snapshot, import_path=legacy, compact_every=2)
+        backend.append(action(2))
+        backend.append(action(3))
+
+        assert numbers(JournalMemoryBackend(journal, snapshot, import_path=legacy)) == [0, 1, 2, 3]
+        with open(snapshot, "r") as f:
+            assert len(json.load(f)["actions"]) == 4
+
+    with_paths(check)
+
+
+if __name__ == "__main__":
+    test_compaction_folds_the_journal_into_a_snapshot()
+    test_torn_tail_is_dropped_on_load()
+    test_append_after_a_torn_tail_is_kept()
+    test_journal_older_than_the_snapshot_is_ignored()
+    test_seeds_from_memory_json_until_the_first_snapshot()
+    print("memory backend tests passed")
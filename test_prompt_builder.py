@@ -0,0 +1,69 @@
+"""
+Prompt token budget: oversized logs, rules and ticket text are truncated
+so every prompt stays within KAVACH_LLM_TOKEN_BUDGET.
+
+Run from the repo root:
+    python -m pytest -q test_prompt_builder.py
+"""
+
+from llm_reasoner import build_batch_prompt, build_prompt
+from prompt_builder import TRUNCATED, estimate_tokens, fit_context, summarize_logs
+
+TICKET = {"merchant_id": "M-1", "subject": "Checkout Broken", "message": "Pay Now does nothing"}
+RULES = "Rule #1: Headless checkout must send X-SDK-Version.\n\nRule #2: Webhook secret B is required."
+
+
+def _log(message, error_code=401):
+    return {"merchant_id": "M-1", "timestamp": "2026-02-01T10:00:00", "error_code": error_code, "message": message}
+
+
+def test_long_log_line_is_truncated_to_budget():
+    prompt = build_prompt(TICKET, [_log("x" * 40_000)], RULES, token_budget=1000)
+
+    assert estimate_tokens(prompt) <= 1000
+    assert TRUNCATED in prompt
+
+
+def test_long_rule_and_ticket_are_truncated_to_budget():
+    ticket = dict(TICKET, subject="S" * 5000, message="M" * 40_000)
+    rules = "Rule #1: " + "r" * 40_000 + "\n\nRule #2: short"
+
+    prompt = build_prompt(ticket, [_log("Missing Header: X-SDK-Version")], rules, token_budget=1000)
+
+    assert estimate_tokens(prompt) <= 1000
+    assert "Missing Header" in prompt
+
+
+def test_batched_prompt_with_long_tickets_stays_within_budget():
+    tickets = [dict(TICKET, merchant_id=f"M-{i}", message="m" * 10_000) for i in range(5)]
+    logs = [_log(f"message {i} " + "y" * 2000, error_code=400 + i) for i in range(50)]
+
+    prompt = build_batch_prompt(tickets, logs, RULES * 20, token_budget=1500)
+
+    assert estimate_tokens(prompt) <= 1500
+    assert all(f"[T{n}] MERCHANT: M-{n - 1}" in prompt for n in range(1, 6))
+
+
+def test_small_context_is_kept_whole():
+    logs = [_log("Missing Header: X-SDK-Version")] * 3
+    prompt = build_prompt(TICKET, logs, RULES, token_budget=4000)
+
+    assert TRUNCATED not in prompt and "omitted" not in prompt
+    assert "Rule #1: Headless checkout must send X-SDK-Version." in prompt and "Pay Now does nothing" in prompt
+
+
+def test_fit_context_reports_omitted_entries():
+    summary = summarize_logs([_log(f"distinct message {i} " + "z" * 200, error_code=400 + i) for i in range(40)])
+    logs_out, rules_out = fit_context(summary, ["Rule #1: a"], 300)
+
+    assert estimate_tokens(logs_out) + estimate_tokens(rules_out) <= 300
+    assert logs_out.endswith("omitted")
+
+
+if __name__ == "__main__":
+    test_long_log_line_is_truncated_to_budget()
+    test_long_rule_and_ticket_are_truncated_to_budget()
+    test_batched_prompt_with_long_tickets_stays_within_budget()
+    test_small_context_is_kept_whole()
+    test_fit_context_reports_omitted_entries()
+    print("prompt budget tests passed")
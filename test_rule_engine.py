@@ -0,0 +1,96 @@
+"""
+Rule table loading: KAVACH_RULES_FILE replaces the built-in rules for the
+process-wide engine that analyze(), the incremental analyzer and the
+daemon use by default.
+
+Run from the repo root:
+    python -m pytest -q test_rule_engine.py
+"""
+
+import json
+import os
+import tempfile
+
+import brain
+import rule_engine
+from confidence_calibrator import MemoryStore
+from rule_engine import DEFAULT_RULES, RuleEngine, get_rule_engine
+
+CUSTOM_RULES = [
+    {
+        "id": "rule-tls",
+        "cause": "Merchant TLS certificate expired",
+        "confidence": 0.85,
+        "message_contains": ["certificate expired"],
+        "case_sensitive": False,
+        "evidence": "message",
+        "evidence_doc": "Rule #7: Merchant endpoints must present a valid TLS certificate"
+    }
+]
+
+LOGS = [
+    {"merchant_id": "M-1", "message": "Webhook failed: Certificate expired", "error_code": 400},
+    {"merchant_id": "M-2", "message": "Missing X-SDK-Version", "error_code": 400},
+]
+
+
+def with_rules_file(rules, check):
+    """Run check() with KAVACH_RULES_FILE pointing at `rules` and a fresh default engine."""
+    previous = os.environ.get("KAVACH_RULES_FILE")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rules.json")
+        with open(path, "w") as f:
+            json.dump(rules, f)
+        os.environ["KAVACH_RULES_FILE"] = path
+        rule_engine._default_engine = None
+        try:
+            check()
+        finally:
+            if previous is None:
+                os.environ.pop("KAVACH_RULES_FILE", None)
+            else:
+                os.environ["KAVACH_RULES_FILE"] = previous
+            rule_engine._default_engine = None
+
+
+def test_default_engine_uses_built_in_rules():
+    previous = os.environ.pop("KAVACH_RULES_FILE", None)
+    rule_engine._default_engine = None
+    try:
+        assert get_rule_engine().rules == DEFAULT_RULES
+        assert get_rule_engine() is get_rule_engine()
+    finally:
+        if previous is not None:
+            os.environ["KAVACH_RULES_FILE"] = previous
+        rule_engine._default_engine = None
+
+
+def test_rules_file_replaces_the_built_in_table():
+    def check():
+        results = get_rule_engine().evaluate(LOGS)
+
+        assert get_rule_engine().rules == CUSTOM_RULES
+        assert results["M-1"]["cause"] == "Merchant TLS certificate expired"
+        assert results["M-1"]["evidence_docs"] == [CUSTOM_RULES[0]["evidence_doc"]]
+        # The built-in X-SDK-Version rule is gone with the table it lived in
+        assert "M-2" not in results or results["M-2"]["cause"] == RuleEngine.no_match()["cause"]
+
+    with_rules_file(CUSTOM_RULES, check)
+
+
+def test_analysis_picks_up_the_rules_file():
+    tickets = [{"merchant_id": "M-1", "ticket": "Webhooks stopped arriving"}]
+
+    def check():
+        plan = brain.plan_analysis(tickets, LOGS, memory_store=MemoryStore({"actions": []}))
+
+        assert plan["rule_by_ticket"][0]["cause"] == "Merchant TLS certificate expired"
+
+    with_rules_file(CUSTOM_RULES, check)
+
+
+if __name__ == "__main__":
+    test_default_engine_uses_built_in_rules()
+    test_rules_file_replaces_the_built_in_table()
+    test_analysis_picks_up_the_rules_file()
+    print("rule table tests passed")